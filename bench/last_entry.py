@@ -0,0 +1,87 @@
+# bench/last_entry.py
+# Benchmark: Latenz von last_entry() bei wachsender Tabelle entries.
+# Aufruf (im Projekt-Hauptordner):
+#   python -m bench.last_entry [--sizes 1000,10000,100000,500000] [--lookups 2000]
+#
+# Erwartung: mit den Indizes aus init_db() bleibt die Latenz pro Scan
+# praktisch konstant, die alte Abfrage (ohne Index) wächst linear.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db.database import init_db, last_entry, to_ms
+
+# Alte Abfrage vor den Indizes (zum Vergleich, sortiert nach ISO-Text)
+LEGACY_QUERY = """
+    SELECT timestamp, allowed, reason
+    FROM entries NOT INDEXED
+    WHERE uid=?
+    ORDER BY timestamp DESC
+    LIMIT 1
+"""
+
+
+def _fill(conn, start, count, uids):
+    """Hängt `count` zufällige Scans an entries an."""
+    base = datetime(2025, 7, 1)
+    rows = []
+    for i in range(start, start + count):
+        ts = base + timedelta(seconds=i * 7)
+        rows.append((random.choice(uids), ts.isoformat(), to_ms(ts), random.random() < 0.8, "OK"))
+    conn.executemany(
+        "INSERT INTO entries(uid, timestamp, ts_ms, allowed, reason) VALUES(?,?,?,?,?)",
+        rows,
+    )
+    conn.commit()
+
+
+def _measure(fn, uids, lookups):
+    """Führt `lookups` Abfragen aus und gibt (p50, p99) in Mikrosekunden zurück."""
+    samples = []
+    for _ in range(lookups):
+        uid = random.choice(uids)
+        t0 = time.perf_counter()
+        fn(uid)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark für last_entry()")
+    parser.add_argument("--sizes", default="1000,10000,100000,500000")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--legacy", action="store_true", help="alte Abfrage ohne Index mitmessen")
+    args = parser.parse_args()
+
+    random.seed(1)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    uids = [f"{random.getrandbits(32):08X}" for _ in range(args.cards)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = init_db(os.path.join(tmp, "bench.db"))
+        rows = 0
+        print(f"{'Zeilen':>10} {'p50 µs':>10} {'p99 µs':>10}" + (f" {'alt p50 µs':>12}" if args.legacy else ""))
+        for size in sizes:
+            _fill(conn, rows, size - rows, uids)
+            rows = size
+            p50, p99 = _measure(lambda uid: last_entry(conn, uid), uids, args.lookups)
+            line = f"{rows:>10} {p50:>10.1f} {p99:>10.1f}"
+            if args.legacy:
+                legacy, _ = _measure(
+                    lambda uid: conn.execute(LEGACY_QUERY, (uid,)).fetchone(),
+                    uids, max(20, args.lookups // 100),
+                )
+                line += f" {legacy:>12.1f}"
+            print(line)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# bench/replay.py
+# Headless Replay- und Lasttest für den Gate-Kern (ohne Kivy, ohne Hardware).
+# Spielt einen aufgezeichneten oder synthetischen Strom von UIDs durch den
+# kompletten Pfad Lookup -> Entscheidung -> Log (GateCore) und misst
+# Entscheidungs-Latenz (p50/p95/p99), Durchsatz und DB-Wachstum.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m bench.replay                           # synthetischer Anpfiff-Ansturm
+#   python -m bench.replay --cards 50000 --scans 200000
+#   python -m bench.replay --replay alte/cards.db    # echte Scans aus entries
+#   python -m bench.replay --replay scans.csv        # CSV: uid;timestamp
+#   python -m bench.replay --speed 60                # 60x Echtzeit statt so schnell wie möglich
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from db.database import Database, from_ms, import_from_csv
+from decision import DecisionEngine
+from gate_core import GateCore
+
+TEAMS = ["1. Herren", "2. Herren", "Damen"]
+CARD_TYPES = ["Dauerkarte", "Partnerkarte", "Ehrenkarte"]
+
+
+def generate_cards_csv(path, count, seed=1):
+    """
+    Schreibt eine cards.csv mit `count` Karten.
+    ~5 % abgelaufen, ~5 % nur für ein anderes Team. Rückgabe: Liste der UIDs
+    """
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    uids = []
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["uid", "name", "card_type", "valid_from", "valid_until", "teams", "notes"])
+        for i in range(count):
+            uid = f"{rng.getrandbits(32):08X}"
+            uids.append(uid)
+            r = rng.random()
+            until = today - timedelta(days=30) if r < 0.05 else today + timedelta(days=300)
+            teams = "2.Herren" if 0.05 <= r < 0.10 else rng.choice(["*", "1.Herren", "1.Herren,Damen"])
+            writer.writerow([
+                uid, f"Fan {i}", rng.choice(CARD_TYPES),
+                (today - timedelta(days=60)).isoformat(), until.isoformat(), teams, "",
+            ])
+    return uids
+
+
+def synthetic_stream(uids, scans, minutes, unknown_rate, repeat_rate, seed=2):
+    """
+    Erzeugt (zeitpunkt, uid) für einen Anpfiff-Ansturm:
+    - Ankunftsrate steigt zum Anpfiff hin an (Dreiecksverteilung)
+    - Gruppen kommen in Schüben (1-6 Fans fast gleichzeitig)
+    - jede Karte kommt einmal (bei mehr Scans als Karten reihum erneut)
+    - `repeat_rate`: Anteil doppelter Scans (Sekunden später bzw. Minuten später)
+    - `unknown_rate`: Anteil fremder Karten (Bankkarte, Handy, ...)
+    """
+    rng = random.Random(seed)
+    start = datetime.now()
+    window = minutes * 60
+    # Jeder Fan kommt einmal; erst wenn alle Karten durch sind, wieder von vorn
+    pool = list(uids)
+    rng.shuffle(pool)
+    next_card = 0
+    events = []
+    while len(events) < scans:
+        # Gruppe trifft ein, kurz vor Anpfiff (Ende des Fensters) am dichtesten
+        t = rng.triangular(0, window, window)
+        for _ in range(rng.randint(1, 6)):
+            t += rng.expovariate(1.0)   # ~1 s zwischen zwei Fans einer Gruppe
+            if rng.random() < unknown_rate:
+                uid = f"{rng.getrandbits(56):014X}"
+            else:
+                uid = pool[next_card % len(pool)]
+                next_card += 1
+            events.append((t, uid))
+            if rng.random() < repeat_rate:
+                # nochmal gescannt: meist sofort (Schutzfrist), sonst später (Sperre)
+                delay = rng.uniform(2, 40) if rng.random() < 0.7 else rng.uniform(120, 1800)
+                events.append((t + delay, uid))
+    events = events[:scans]
+    events.sort()
+    return [(start + timedelta(seconds=t), uid) for t, uid in events]
+
+
+def recorded_stream(path):
+    """Liest aufgezeichnete Scans aus einer cards.db (entries) oder CSV (uid;timestamp)."""
+    if path.endswith(".db"):
+        import sqlite3
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        rows = conn.execute(
+            "SELECT ts_ms, uid FROM entries WHERE ts_ms IS NOT NULL ORDER BY ts_ms"
+        ).fetchall()
+        conn.close()
+        events = [(from_ms(ts), uid) for ts, uid in rows]
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            events = [
+                (datetime.fromisoformat(row["timestamp"]), row["uid"].strip().upper())
+                for row in csv.DictReader(f, delimiter=";")
+            ]
+    # Zeitlich an "jetzt" verschieben, damit Sperrfenster wie live wirken
+    if events:
+        shift = datetime.now() - events[0][0]
+        events = [(ts + shift, uid) for ts, uid in events]
+    return events
+
+
+def percentile(sorted_values, p):
+    """p-Perzentil einer sortierten Liste (nächster Rang)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def db_size(path):
+    """Größe der DB inkl. WAL-Datei in Bytes."""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def run(core, events, speed=0.0, team=TEAMS[0]):
+    """
+    Spielt die Scans durch den GateCore.
+    speed=0: so schnell wie möglich, sonst Faktor gegenüber Echtzeit.
+    Rückgabe: (Latenzen in µs, Verdict-Codes, Laufzeit in s)
+    """
+    core.team = team
+    latencies = []
+    codes = Counter()
+    wall_start = time.perf_counter()
+    first = events[0][0] if events else None
+    for ts, uid in events:
+        if speed:
+            due = (ts - first).total_seconds() / speed
+            delay = due - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        verdict = core.process(uid, reader="replay", now=ts)
+        latencies.append((time.perf_counter() - t0) * 1e6)
+        codes[verdict.code] += 1
+    return latencies, codes, time.perf_counter() - wall_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Replay-/Lasttest für den Gate-Kern")
+    parser.add_argument("--cards", type=int, default=20000, help="Anzahl erzeugter Karten")
+    parser.add_argument("--scans", type=int, default=50000, help="Anzahl synthetischer Scans")
+    parser.add_argument("--minutes", type=int, default=90, help="Länge des Einlass-Fensters")
+    parser.add_argument("--unknown-rate", type=float, default=0.05)
+    parser.add_argument("--repeat-rate", type=float, default=0.08)
+    parser.add_argument("--replay", help="aufgezeichnete Scans: cards.db oder CSV (uid;timestamp)")
+    parser.add_argument("--db", help="Pfad der Test-DB (Standard: temporär)")
+    parser.add_argument("--durability", default="normal")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = so schnell wie möglich")
+    parser.add_argument("--team", default=TEAMS[0])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "replay.db")
+        csv_path = os.path.join(tmp, "cards.csv")
+
+        t0 = time.perf_counter()
+        uids = generate_cards_csv(csv_path, args.cards)
+        db = Database(db_path, durability=args.durability)
+        with db.writer() as conn:
+            report = import_from_csv(conn, csv_path, force=True)
+        print(f"Karten: {report}  ({time.perf_counter() - t0:.2f} s)")
+
+        if args.replay and args.replay.endswith(".db"):
+            # Karten der aufgezeichneten DB übernehmen, damit die UIDs bekannt sind
+            with db.writer() as conn:
+                conn.execute("ATTACH DATABASE ? AS src", (args.replay,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO cards(uid, name, card_type, valid_from, valid_until, teams, notes) "
+                    "SELECT uid, name, card_type, valid_from, valid_until, teams, notes FROM src.cards"
+                )
+            with db.writer() as conn:
+                conn.execute("DETACH DATABASE src")
+
+        if args.replay:
+            events = recorded_stream(args.replay)
+        else:
+            events = synthetic_stream(
+                uids, args.scans, args.minutes, args.unknown_rate, args.repeat_rate
+            )
+
+        core = GateCore(db, engine=DecisionEngine())
+        core.start()
+        size_before = db_size(db_path)
+
+        latencies, codes, elapsed = run(core, events, speed=args.speed, team=args.team)
+        t_drain = time.perf_counter()
+        core.close()
+        drain = time.perf_counter() - t_drain
+        size_after = db_size(db_path)
+        db.close()
+
+        latencies.sort()
+        n = len(latencies)
+        print(f"Scans:        {n}")
+        print(f"Latenz (µs):  p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+              f"p99 {percentile(latencies, 99):.1f}  max {latencies[-1] if n else 0:.1f}")
+        print(f"Durchsatz:    {n / elapsed:.0f} Scans/s (Log geleert nach weiteren {drain:.2f} s)")
+        print(f"DB-Wachstum:  {(size_after - size_before) / 1024:.0f} KiB "
+              f"({(size_after - size_before) / max(n, 1):.0f} Bytes/Scan)")
+        print("Ergebnisse:   " + ", ".join(f"{code} {count}" for code, count in codes.most_common()))
+
+
+if __name__ == "__main__":
+    main()
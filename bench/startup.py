@@ -0,0 +1,119 @@
+# bench/startup.py
+# Startzeit-Benchmark ohne Kivy und Lesegerät: misst die Phasen, die
+# GateApp beim Start durchläuft, mit einer erzeugten cards.csv beliebiger
+# Größe, und vergleicht die Zeit bis zur Startseite
+# - alt:  alles vor dem ersten Frame (Import, Index, Lesegeräte-Suche)
+# - neu:  nur DB öffnen vor dem ersten Frame, der Rest im Hintergrund
+# Die Importzeit der Module wird in frischen Python-Prozessen gemessen.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m bench.startup
+#   python -m bench.startup --cards 50000 --runs 5
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.replay import generate_cards_csv
+from db.database import Database, import_from_csv
+from gate_core import GateCore
+from startup import StartupTrace
+
+# Module, deren Importzeit gemessen wird (Kivy/pyscard nur, wenn installiert)
+IMPORTS = ["gate_core", "db.retention", "metrics", "sync", "smartcard.System", "kivy.app"]
+
+
+def import_time(module):
+    """Importzeit eines Moduls in einem frischen Prozess (Sekunden) oder None, wenn nicht installiert."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, "KIVY_NO_ARGS": "1", "KIVY_NO_CONSOLELOG": "1"},
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def reader_status_time():
+    """Dauer der Lesegeräte-Suche (pyscard) oder None ohne pyscard."""
+    try:
+        from smartcard.System import readers
+    except ImportError:
+        return None
+    start = time.perf_counter()
+    try:
+        readers()
+    except Exception:
+        pass
+    return time.perf_counter() - start
+
+
+def run_once(db_path, csv_path, first_start):
+    """
+    Ein Start wie in GateApp: DB öffnen, CSV-Import, Index laden.
+    first_start=True: leere DB (erster Start nach neuer cards.csv).
+    Rückgabe: StartupTrace
+    """
+    if first_start:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    trace = StartupTrace()
+    with trace.phase("db_open"):
+        db = Database(db_path)
+    with trace.phase("csv_import"):
+        with db.writer() as conn:
+            import_from_csv(conn, csv_path)
+    core = GateCore(db)
+    with trace.phase("card_index"):
+        core.start()
+    core.close()
+    db.close()
+    return trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startzeit-Benchmark für GateApp (ohne Kivy)")
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print("Importzeit (frischer Prozess):")
+    for module in IMPORTS:
+        t = import_time(module)
+        print(f"  {module:<18} {'nicht installiert' if t is None else f'{t * 1000:8.1f} ms'}")
+    scan = reader_status_time()
+    print(f"  Lesegeräte-Suche   {'pyscard fehlt' if scan is None else f'{scan * 1000:8.1f} ms'}")
+    scan = scan or 0.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "cards.csv")
+        db_path = os.path.join(tmp, "cards.db")
+        generate_cards_csv(csv_path, args.cards)
+        for first_start, title in ((True, "Erster Start (neue cards.csv)"), (False, "Neustart (CSV unverändert)")):
+            phases = {}
+            for _ in range(args.runs):
+                trace = run_once(db_path, csv_path, first_start)
+                for name, _, duration, _ in trace.phases:
+                    phases.setdefault(name, []).append(duration)
+            median = {name: statistics.median(values) for name, values in phases.items()}
+            print(f"\n{title}, {args.cards} Karten, Median aus {args.runs} Läufen:")
+            for name, value in median.items():
+                print(f"  {name:<12} {value * 1000:8.1f} ms")
+            old = sum(median.values()) + scan
+            new = median["db_open"]
+            print(f"  bis Startseite: alt {old * 1000:.1f} ms, neu {new * 1000:.1f} ms "
+                  f"(Rest im Hintergrund, Start-Button danach frei)")
+
+
+if __name__ == "__main__":
+    main()
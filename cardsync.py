@@ -0,0 +1,296 @@
+# cardsync.py
+# Verteilung der Kartenliste an alle Gates im lokalen Netz: ein Kartenserver
+# (z.B. der Kassen-PC, der cards.csv pflegt) stellt versionierte Snapshots
+# und kleine Deltas bereit, die Gates holen Änderungen im Hintergrund ab.
+# - Stand = Sequenznummer aus card_changes (pro UID die letzte Änderung,
+#   gepflegt per Trigger, siehe db/database.py)
+# - Gates warten per Long-Poll auf die nächste Änderung (oder fragen in
+#   festen Abständen) und übernehmen sie in einer Transaktion; der
+#   Karten-Index gleicht sich danach ab, Scans laufen ohne Pause weiter
+# - Server nicht erreichbar -> das Gate arbeitet mit dem zuletzt
+#   übernommenen Stand in seiner cards.db weiter
+# - die Kartenliste enthält Namen: im Netz (nicht nur 127.0.0.1) antwortet
+#   der Server nur mit gemeinsamem Token (Header X-Gate-Token, wie sync.py)
+#
+# Lokal testen (je ein Terminal):
+#   python cardsync.py --db /tmp/kasse.db serve --csv cards.csv
+#   python cardsync.py --db /tmp/gate.db follow --server http://127.0.0.1:8710
+#   python cardsync.py --db /tmp/gate.db pull --server http://127.0.0.1:8710   # einmalig
+# Im Netz:
+#   python cardsync.py --db /tmp/kasse.db serve --csv cards.csv --host 0.0.0.0 --token geheim
+#   python cardsync.py --db /tmp/gate.db follow --server http://kasse.local:8710 --token geheim
+
+import argparse
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from http.client import HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+from db.database import (
+    CARD_FIELDS, apply_card_changes, card_changes_since, card_cursor, card_seq, card_snapshot,
+    connect,
+)
+from sync import check_listen, node_id, token_headers, token_ok
+
+# Standard-Port des Kartenservers
+CARD_PORT = 8710
+
+# Max. Änderungen pro Delta-Abruf
+CARD_DELTA_LIMIT = 5000
+
+# Max. Wartezeit eines Long-Polls (Sekunden) und Prüfabstand im Server
+CARD_WAIT_MAX = 30.0
+CARD_WAIT_STEP = 0.25
+
+# Antworten ab dieser Größe werden gzip-komprimiert (falls der Client es kann)
+GZIP_MIN_BYTES = 1024
+
+
+class CardServer(threading.Thread):
+    """
+    Stellt die Kartenliste der eigenen DB bereit:
+      GET /cards/snapshot
+        -> {"node": "...", "seq": n, "fields": [...], "cards": [[uid, name, ...], ...]}
+      GET /cards/delta?since=<seq>&wait=<s>
+        -> {"node": "...", "seq": n, "upserts": [[uid, ...], ...], "deletes": [uid, ...],
+            "more": true/false}
+        -> {"node": "...", "snapshot": true}, wenn `since` nicht zu diesem Server passt
+    wait > 0: Antwort erst bei einer Änderung (höchstens wait Sekunden, Long-Poll).
+    Jede Anfrage läuft in einem eigenen Thread mit kurzlebiger Leseverbindung.
+    Standardmäßig nur lokal erreichbar; im Netz (host="0.0.0.0") nur mit
+    `token`, Anfragen ohne passendes Token bekommen 403.
+    """
+
+    def __init__(self, db, port=CARD_PORT, host="127.0.0.1", token=None):
+        check_listen(host, token)
+        super().__init__(daemon=True, name="CardServer")
+        self.db = db
+        self.node = node_id(db)
+        self.token = token
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not token_ok(self.headers, server.token):
+                    self.send_error(403)
+                    return
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                with closing(connect(server.db.path, readonly=True)) as conn:
+                    if url.path == "/cards/snapshot":
+                        seq, cards = card_snapshot(conn)
+                        self._send({"node": server.node, "seq": seq,
+                                    "fields": list(CARD_FIELDS), "cards": cards})
+                    elif url.path == "/cards/delta":
+                        try:
+                            since = int(query.get("since", ["0"])[0])
+                            wait = min(float(query.get("wait", ["0"])[0]), CARD_WAIT_MAX)
+                        except ValueError:
+                            self.send_error(400)
+                            return
+                        self._send(server.delta(conn, since, wait))
+                    else:
+                        self.send_error(404)
+
+            def _send(self, data):
+                body = json.dumps(data, separators=(",", ":")).encode()
+                gzipped = (len(body) >= GZIP_MIN_BYTES
+                           and "gzip" in self.headers.get("Accept-Encoding", ""))
+                if gzipped:
+                    body = gzip.compress(body, compresslevel=5)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keine Zugriffslogs auf der Konsole
+
+        return Handler
+
+    def delta(self, conn, since, wait=0.0):
+        """Antwort für /cards/delta (siehe oben)."""
+        current = card_seq(conn)
+        if since > current:
+            # Gate kennt einen Stand, den es hier nie gab (DB neu aufgesetzt)
+            return {"node": self.node, "snapshot": True}
+        deadline = time.monotonic() + wait
+        while current == since and time.monotonic() < deadline:
+            time.sleep(CARD_WAIT_STEP)
+            current = card_seq(conn)
+        seq, upserts, deletes = card_changes_since(conn, since, CARD_DELTA_LIMIT)
+        return {"node": self.node, "seq": seq, "upserts": upserts, "deletes": deletes,
+                "more": seq < current}
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class CardSyncWorker(threading.Thread):
+    """
+    Hält die Kartenliste eines Gates auf dem Stand des Kartenservers.
+    - url:          Adresse des Kartenservers (z.B. "http://kasse:8710")
+    - on_change():  Callback nach übernommenen Änderungen (z.B. Index abgleichen);
+                    läuft im Thread des Workers
+    - wait:         Long-Poll-Dauer in Sekunden (0 = Abfrage alle `interval` Sekunden)
+    - token:        gemeinsames Token (siehe CardServer)
+    Nicht erreichbarer Server und DB-Fehler (z.B. gesperrt) werden mit
+    wachsender Pause erneut versucht, bis dahin gilt der zuletzt übernommene
+    Stand in der DB.
+    """
+
+    def __init__(self, db, url, on_change=None, interval=5.0, wait=25.0, timeout=5.0,
+                 max_backoff=60.0, token=None):
+        super().__init__(daemon=True, name="CardSyncWorker")
+        self.db = db
+        self.url = url.rstrip("/")
+        self.on_change = on_change
+        self.interval = interval
+        self.wait = wait
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.token = token
+        self.stop_event = threading.Event()
+        self.status = "unbekannt"       # für Anzeige/Diagnose
+        self.seq = None                 # zuletzt bestätigter Stand (für status)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        backoff = self.interval
+        while not self.stop_event.is_set():
+            try:
+                written, deleted = self.pull(wait=self.wait)
+                if (written or deleted) and self.on_change:
+                    self.on_change()
+                self.seq = card_cursor(self.db.reader())[1]
+                self.status = f"ok (Stand {self.seq})"
+                backoff = self.interval
+                if not self.wait:
+                    self.stop_event.wait(self.interval)
+            except (URLError, OSError, ValueError, KeyError, HTTPException, sqlite3.Error) as e:
+                # Status ohne DB-Zugriff (die DB kann gerade die Ursache sein)
+                problem = "nicht übernommen (DB)" if isinstance(e, sqlite3.Error) else "nicht erreichbar"
+                self.status = f"{problem}: {e} (letzter Stand {self.seq if self.seq is not None else '?'})"
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def pull(self, wait=0.0):
+        """
+        Holt alle Änderungen seit dem letzten Stand (bzw. einen Snapshot, wenn
+        der Stand nicht zum Server passt) und übernimmt sie.
+        Rückgabe: (geschriebene Karten, gelöschte Karten)
+        """
+        source, seq = card_cursor(self.db.reader())
+        data = self._get(f"/cards/delta?since={seq}&wait={wait:g}", timeout=self.timeout + wait)
+        if data.get("snapshot") or data["node"] != source:
+            return self._apply_snapshot()
+        written = deleted = 0
+        while True:
+            if data["seq"] != seq:
+                with self.db.writer() as conn:
+                    w, d = apply_card_changes(conn, data["node"], data["seq"],
+                                              data["upserts"], data["deletes"])
+                written += w
+                deleted += d
+                seq = data["seq"]
+            if not data["more"]:
+                return written, deleted
+            data = self._get(f"/cards/delta?since={seq}")
+
+    def _apply_snapshot(self):
+        data = self._get("/cards/snapshot")
+        if data["fields"] != list(CARD_FIELDS):
+            raise ValueError(f"Kartenserver liefert andere Felder: {data['fields']}")
+        with self.db.writer() as conn:
+            return apply_card_changes(conn, data["node"], data["seq"], data["cards"], [],
+                                      replace=True)
+
+    def _get(self, path, timeout=None):
+        request = Request(self.url + path,
+                          headers={"Accept-Encoding": "gzip", **token_headers(self.token)})
+        with urlopen(request, timeout=timeout or self.timeout) as resp:
+            body = resp.read()
+            if resp.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+        return json.loads(body)
+
+
+def main():
+    """Kartenserver bzw. Gate-Seite ohne App (zum Testen und für den Kassen-PC)."""
+    from db.database import Database, import_from_csv
+
+    parser = argparse.ArgumentParser(description="Verteilung der Kartenliste an die Gates")
+    parser.add_argument("--db", required=True, help="Pfad zur SQLite-DB")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="Kartenliste dieser DB bereitstellen")
+    p.add_argument("--port", type=int, default=CARD_PORT)
+    p.add_argument("--host", default="127.0.0.1", help="0.0.0.0 = im Netz (nur mit --token)")
+    p.add_argument("--csv", help="diese CSV importieren und auf Änderungen überwachen")
+    p.add_argument("--interval", type=float, default=5.0, help="Prüfabstand der CSV (Sekunden)")
+    for name, help_text in (("pull", "Änderungen einmalig übernehmen"),
+                            ("follow", "Änderungen laufend übernehmen")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--server", required=True, help="URL des Kartenservers")
+    for p in sub.choices.values():
+        p.add_argument("--token", help="gemeinsames Token von Kartenserver und Gates")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    try:
+        if args.command == "serve":
+            server = CardServer(db, port=args.port, host=args.host, token=args.token)
+            server.start()
+            print(f"Kartenserver {server.node} auf Port {args.port}")
+            try:
+                while True:
+                    if args.csv:
+                        with db.writer() as conn:
+                            report = import_from_csv(conn, args.csv)
+                        if not report.skipped:
+                            print(f"{report} -> Stand {card_seq(db.reader())}")
+                    time.sleep(args.interval)
+            except KeyboardInterrupt:
+                server.stop()
+        elif args.command == "pull":
+            worker = CardSyncWorker(db, args.server, token=args.token)
+            written, deleted = worker.pull()
+            print(f"{written} Karten geschrieben, {deleted} gelöscht, "
+                  f"Stand {card_cursor(db.reader())[1]}")
+        else:
+            worker = CardSyncWorker(
+                db, args.server,
+                on_change=lambda: print(f"Stand {card_cursor(db.reader())[1]} übernommen"),
+                token=args.token,
+            )
+            worker.start()
+            try:
+                while worker.is_alive():
+                    worker.join(1.0)
+            except KeyboardInterrupt:
+                worker.stop()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
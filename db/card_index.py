@@ -0,0 +1,224 @@
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from db.database import cards_version, recent_allowed_entries
+
+# Platzhalter für ein Datum, das in der DB steht, aber nicht lesbar ist
+INVALID_DATE = object()
+
+# Team-Maske einer Karte, die für alle Teams gilt ("*"): alle Bits gesetzt
+ALL_TEAMS = -1
+
+# Kompakter, vorverarbeiteter Kartendatensatz:
+# - valid_from / valid_until: Originaltext (für die Anzeige)
+# - vf / vu: Datum als Ordinalzahl (date.toordinal()), None oder INVALID_DATE
+# - teams: frozenset normalisierter Team-Namen ("*" = alle Teams)
+# - team_mask: dieselben Teams als Bitmaske (team_bit(), ALL_TEAMS für "*")
+IndexedCard = namedtuple(
+    "IndexedCard",
+    "uid name card_type valid_from valid_until vf vu teams notes team_mask",
+)
+
+# Normalisierter Team-Name -> Bit (wird beim ersten Auftreten vergeben)
+_team_bits = {}
+_team_bits_lock = threading.Lock()
+
+
+def norm_team(s: str) -> str:
+    """Team-Namen vereinheitlichen: ohne Leerzeichen/Punkte, Kleinschreibung."""
+    if not s:
+        return ""
+    return s.replace(" ", "").replace(".", "").strip().lower()
+
+
+def team_bit(team_norm):
+    """Bit eines (normalisierten) Team-Namens für IndexedCard.team_mask."""
+    bit = _team_bits.get(team_norm)
+    if bit is None:
+        with _team_bits_lock:
+            bit = _team_bits.setdefault(team_norm, 1 << len(_team_bits))
+    return bit
+
+
+# Viele Karten teilen sich dieselben Daten und Team-Listen: jeder Text wird
+# nur einmal geparst, gleiche Ergebnisse sind dasselbe Objekt (spart Speicher)
+
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    """ISO-Datum einmalig parsen: Ordinalzahl, None (kein Datum) oder INVALID_DATE."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date().toordinal()
+    except (TypeError, ValueError):
+        return INVALID_DATE
+
+
+@lru_cache(maxsize=4096)
+def _compile_teams(teams):
+    """Team-Text der DB -> (frozenset normalisierter Namen, Bitmaske)."""
+    names = frozenset(norm_team(t) for t in teams.split(",")) if teams else frozenset()
+    mask = 0
+    for name in names:
+        mask |= ALL_TEAMS if name == "*" else team_bit(name)
+    return names, mask
+
+
+def _make_card(row):
+    """Erzeugt aus einer Zeile der Tabelle cards einen IndexedCard."""
+    uid, name, card_type, valid_from, valid_until, teams, notes = row
+    team_names, team_mask = _compile_teams(teams)
+    return IndexedCard(
+        uid=uid,
+        name=name,
+        card_type=card_type,
+        valid_from=valid_from,
+        valid_until=valid_until,
+        vf=_parse_date(valid_from),
+        vu=_parse_date(valid_until),
+        teams=team_names,
+        notes=notes,
+        team_mask=team_mask,
+    )
+
+
+class CardIndex:
+    """
+    Hält alle Karten aus der Tabelle cards im Speicher, damit ein Scan
+    ohne DB-Zugriff entschieden werden kann.
+    - Teams und Gültigkeitsdaten werden beim Laden vorverarbeitet
+    - Pro UID wird der Zeitpunkt des letzten erlaubten Zutritts gemerkt
+      (nur innerhalb des Sperrfensters, ältere Werte sind irrelevant),
+      getrennt nach diesem Gate und anderen Gates (sync.py)
+    - refresh() gleicht den Index inkrementell mit der DB ab
+    """
+
+    def __init__(self, conn, reuse_window=timedelta(hours=1)):
+        """
+        Parameter:
+        - conn:          DB-Verbindung, aus der gelesen wird
+        - reuse_window:  wie lange ein erlaubter Zutritt für die
+                         Doppel-Scan-Prüfung gemerkt werden muss
+        """
+        self.conn = conn
+        self.reuse_window = reuse_window
+        self._cards = {}            # uid -> IndexedCard
+        self._row_hashes = {}       # uid -> hash der DB-Zeile (für den Abgleich)
+        self._last_allowed = {}     # uid -> datetime des letzten erlaubten Zutritts
+        self._last_remote = {}      # dito, aber an einem anderen Gate
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._cards_version = None
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __contains__(self, uid):
+        return uid in self._cards
+
+    def load(self, conn=None):
+        """
+        Baut den Index vollständig auf (Karten + letzte Zutritte).
+        conn: andere Leseverbindung, z.B. um den Index in einem Hintergrund-
+        Thread aufzubauen (Standard: die Verbindung des Index).
+        """
+        conn = conn or self.conn
+        self.refresh(conn)
+        since = datetime.now() - self.reuse_window
+        last_allowed = {}
+        last_remote = {}
+        for uid, ts, remote in recent_allowed_entries(conn, since):
+            (last_remote if remote else last_allowed)[uid] = ts
+        with self._lock:
+            self._last_allowed = last_allowed
+            self._last_remote = last_remote
+
+    def db_changed(self):
+        """
+        True, wenn sich die Tabelle cards seit dem letzten refresh() geändert hat.
+        PRAGMA data_version ist billig und filtert Zeiten ohne jeden Schreib-
+        zugriff heraus, cards_version unterscheidet Karten- von Log-Änderungen.
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        return cards_version(self.conn) != self._cards_version
+
+    def refresh(self, conn=None):
+        """
+        Gleicht den Index mit der Tabelle cards ab.
+        Nur neue, geänderte und entfernte Karten werden neu verarbeitet.
+        conn: wie bei load()
+        Rückgabe: (hinzugefügt, geändert, entfernt)
+        """
+        conn = conn or self.conn
+        # data_version ist nur innerhalb einer Verbindung vergleichbar
+        self._data_version = (
+            conn.execute("PRAGMA data_version").fetchone()[0] if conn is self.conn else None
+        )
+        self._cards_version = cards_version(conn)
+        cur = conn.execute(
+            "SELECT uid, name, card_type, valid_from, valid_until, teams, notes FROM cards"
+        )
+        seen = set()
+        updates = {}
+        added = changed = 0
+        for row in cur:
+            uid = row[0]
+            seen.add(uid)
+            h = hash(row)
+            old = self._row_hashes.get(uid)
+            if old == h:
+                continue
+            if old is None:
+                added += 1
+            else:
+                changed += 1
+            updates[uid] = (h, _make_card(row))
+
+        removed = [uid for uid in self._cards if uid not in seen]
+        with self._lock:
+            for uid, (h, card) in updates.items():
+                self._row_hashes[uid] = h
+                self._cards[uid] = card
+            for uid in removed:
+                self._row_hashes.pop(uid, None)
+                self._cards.pop(uid, None)
+            self._prune(datetime.now())
+        return added, changed, len(removed)
+
+    def get(self, uid):
+        """Gibt den IndexedCard zur UID zurück oder None, wenn unbekannt."""
+        return self._cards.get(uid)
+
+    def last_allowed(self, uid):
+        """Zeitpunkt des letzten erlaubten Zutritts innerhalb des Sperrfensters oder None."""
+        return self._last_allowed.get(uid)
+
+    def last_remote(self, uid):
+        """Wie last_allowed(), aber für Zutritte an anderen Gates."""
+        return self._last_remote.get(uid)
+
+    def note_entry(self, uid, timestamp, allowed, remote=False):
+        """
+        Merkt einen gerade geloggten Scan vor (nur erlaubte Zutritte zählen).
+        remote=True: Scan stammt von einem anderen Gate.
+        """
+        if not allowed:
+            return
+        target = self._last_remote if remote else self._last_allowed
+        with self._lock:
+            last = target.get(uid)
+            if last is None or timestamp > last:
+                target[uid] = timestamp
+
+    def _prune(self, now):
+        """Entfernt Zutritte, die älter als das Sperrfenster sind (Lock wird gehalten)."""
+        limit = now - self.reuse_window
+        for last in (self._last_allowed, self._last_remote):
+            stale = [uid for uid, ts in last.items() if ts < limit]
+            for uid in stale:
+                del last[uid]
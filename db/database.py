@@ -1,20 +1,131 @@
 import sqlite3
 import os
 import csv
+import hashlib
+import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
 
 # Pfad zur SQLite-Datenbank (liegt im selben Ordner wie diese Datei)
 DB_PATH = os.path.join(os.path.dirname(__file__), "cards.db")
 
+# Haltbarkeitsmodi (Abwägung fsync-Häufigkeit gegen Schutz bei Stromausfall).
+# Im WAL-Modus ist die DB in allen Modi gegen Korruption geschützt, es geht
+# höchstens um die zuletzt geschriebenen Transaktionen.
+DURABILITY_MODES = {
+    # jeder Commit sofort per fsync auf der SD-Karte -> nichts geht verloren
+    "safe": {"synchronous": "FULL", "wal_autocheckpoint": 1000},
+    # fsync nur bei Checkpoints -> Stromausfall kann die letzten Commits kosten
+    "normal": {"synchronous": "NORMAL", "wal_autocheckpoint": 1000},
+    # wie normal, aber seltenere Checkpoints -> noch weniger Schreiblast
+    "fast": {"synchronous": "NORMAL", "wal_autocheckpoint": 4000},
+}
+DEFAULT_DURABILITY = "normal"
 
-def init_db():
+# Gemeinsame Pragmas für alle Verbindungen (auf SD-Karten abgestimmt)
+CACHE_SIZE_KB = 8192                # Page-Cache pro Verbindung
+MMAP_SIZE = 64 * 1024 * 1024        # Lesen per mmap statt read()-Syscalls
+BUSY_TIMEOUT_MS = 5000              # bei Sperren warten statt sofort Fehler
+
+
+def connect(path=DB_PATH, readonly=False, durability=DEFAULT_DURABILITY):
+    """
+    Öffnet eine neue, abgestimmte SQLite-Verbindung.
+    - readonly=True: reine Leseverbindung (kann nie Schreibsperren halten)
+    - durability: Schlüssel aus DURABILITY_MODES (nur für Schreibverbindungen)
+    Schreibverbindungen dürfen von mehreren Threads benutzt werden,
+    der Aufrufer muss den Zugriff dann selbst serialisieren (siehe Database).
+    """
+    if readonly:
+        uri = Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        mode = DURABILITY_MODES[durability]
+        # Freie Seiten schrittweise zurückgeben (PRAGMA incremental_vacuum,
+        # siehe db/retention.py). Greift nur bei einer neuen Datei (muss vor
+        # dem WAL-Umschalten stehen), bestehende DBs erst nach einem VACUUM.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={mode['synchronous']}")
+        conn.execute(f"PRAGMA wal_autocheckpoint={mode['wal_autocheckpoint']}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class Database:
+    """
+    Verbindungsschicht für die ganze App:
+    - genau eine Schreibverbindung, Zugriff über writer() (mit Lock)
+    - pro Thread eine eigene Leseverbindung über reader()
+    Dank WAL blockieren lange Lesezugriffe (Export, Statistik) weder
+    Schreibzugriffe noch die Scans am Gate.
+    """
+
+    def __init__(self, path=DB_PATH, durability=DEFAULT_DURABILITY):
+        """
+        Parameter:
+        - path:       Pfad zur SQLite-Datenbank
+        - durability: Haltbarkeitsmodus, siehe DURABILITY_MODES
+        """
+        self.path = path
+        self.durability = durability
+        self._write_conn = init_db(path, durability)
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    @contextmanager
+    def writer(self):
+        """
+        Exklusiver Zugriff auf die Schreibverbindung als Transaktion:
+            with db.writer() as conn:
+                conn.execute(...)
+        Commit am Ende, Rollback bei Exception.
+        """
+        with self._write_lock:
+            with self._write_conn:
+                yield self._write_conn
+
+    def reader(self):
+        """Leseverbindung des aufrufenden Threads (wird bei Bedarf geöffnet)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, readonly=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self):
+        """Schließt alle Verbindungen (WAL wird dabei zurückgeschrieben)."""
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Verbindung gehört einem anderen (evtl. beendeten) Thread
+                    pass
+            self._readers.clear()
+        with self._write_lock:
+            self._write_conn.close()
+
+
+def init_db(path=DB_PATH, durability=DEFAULT_DURABILITY):
     """
     Erstellt (falls nicht vorhanden):
       - Tabelle cards: enthält alle NFC-Karten
       - Tabelle entries: Log für alle Zutrittsversuche
-    Gibt eine aktive DB-Verbindung zurück.
+    und führt ausstehende Schema-Migrationen aus.
+    Gibt eine aktive (Schreib-)Verbindung zurück.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(path, durability=durability)
     cur = conn.cursor()
     # Haupttabelle für Karten
     cur.execute(
@@ -44,41 +155,503 @@ def init_db():
         """
     )
     conn.commit()
+    migrate(conn)
     return conn
 
 
-def import_from_csv(conn, csv_path):
+def to_ms(dt):
+    """datetime -> Epoch-Millisekunden (kompakt und sortierbar)."""
+    return int(dt.timestamp() * 1000)
+
+
+def from_ms(ms):
+    """Epoch-Millisekunden -> datetime (lokale Zeit)."""
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def _iso_to_ms(value):
+    """SQL-Hilfsfunktion für Migrationen: ISO-Text -> Epoch-ms (oder NULL)."""
+    try:
+        return to_ms(datetime.fromisoformat(value))
+    except Exception:
+        return None
+
+
+def _migrate_entries_ts_ms(conn):
     """
-    Liest Karten aus einer CSV-Datei (Semicolon-getrennt) und schreibt sie in die DB.
-    Bei doppelten UIDs werden die Daten aktualisiert (Upsert).
+    entries bekommt eine Spalte ts_ms (Epoch-ms) neben dem ISO-Text,
+    bestehende Zeilen werden nachgetragen. Dazu Indizes für
+    last_entry (uid, ts_ms) und Zeitbereichsabfragen (ts_ms).
     """
-    cur = conn.cursor()
+    conn.create_function("iso_to_ms", 1, _iso_to_ms)
+    conn.execute("ALTER TABLE entries ADD COLUMN ts_ms INTEGER")
+    conn.execute("UPDATE entries SET ts_ms = iso_to_ms(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_uid_ts ON entries(uid, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(ts_ms)")
+
+
+def _migrate_cards_version(conn):
+    """
+    Tabelle meta für Schlüssel/Wert-Angaben und ein Zähler cards_version,
+    den Trigger bei jeder Änderung an cards erhöhen. So erkennt der
+    CardIndex Kartenänderungen, ohne bei jedem Log-Eintrag neu zu laden.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES('cards_version', '0')")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS cards_version_{event.lower()}
+            AFTER {event} ON cards
+            BEGIN
+                UPDATE meta SET value = CAST(value AS INTEGER) + 1
+                WHERE key = 'cards_version';
+            END
+            """
+        )
+
+
+def _migrate_entries_reader(conn):
+    """entries merkt sich, an welchem Lesegerät (Drehkreuz) gescannt wurde."""
+    conn.execute("ALTER TABLE entries ADD COLUMN reader TEXT")
+
+
+def _migrate_entries_sync(conn):
+    """
+    Abgleich zwischen Gates (sync.py):
+    - entries.node / origin_id: Herkunft übernommener Scans (NULL = lokal)
+    - sync_peers: pro Gegenstelle die zuletzt übernommene Sequenznummer
+    """
+    conn.execute("ALTER TABLE entries ADD COLUMN node TEXT")
+    conn.execute("ALTER TABLE entries ADD COLUMN origin_id INTEGER")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_origin "
+        "ON entries(node, origin_id) WHERE node IS NOT NULL"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            url TEXT PRIMARY KEY,   -- Adresse der Gegenstelle
+            node TEXT,              -- Knoten-ID der Gegenstelle
+            last_seq INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+# Ergebnis-Code aus dem Text in entries.reason (für Scans vor der Spalte code)
+REASON_CODE_SQL = """
+    CASE
+        WHEN reason = 'OK' THEN 'ok'
+        WHEN reason = 'Schutzfrist erneuter Scan' THEN 'grace'
+        WHEN reason = 'Karte nicht registriert' THEN 'unknown'
+        WHEN reason LIKE 'Schon vor %' THEN 'reused'
+        WHEN reason LIKE 'Karte abgelaufen%' THEN 'expired'
+        WHEN reason LIKE 'Karte noch nicht gültig%' THEN 'not_yet_valid'
+        WHEN reason LIKE 'Ungültiges%' THEN 'invalid_date'
+        WHEN reason LIKE 'Keine Berechtigung%' THEN 'team'
+        ELSE 'other'
+    END
+"""
+
+# Schlüsselspalten der Tabelle entry_rollup, berechnet aus einer entries-Zeile
+# (Tag und Stunde aus dem lokalen ISO-Zeitstempel)
+_ROLLUP_KEY_SQL = """
+    substr({p}timestamp, 1, 10), CAST(substr({p}timestamp, 12, 2) AS INTEGER),
+    COALESCE({p}team, ''), COALESCE({p}card_type, ''), COALESCE({p}reader, ''),
+    COALESCE({p}code, ''), {p}allowed
+"""
+ROLLUP_COLUMNS = "day, hour, team, card_type, reader, code, allowed"
+
+
+def _migrate_entry_rollup(conn):
+    """
+    entries bekommt team (gewähltes Team), card_type und code (Ergebnis-Code),
+    dazu die vorverdichtete Tabelle entry_rollup (Anzahl Scans pro Tag,
+    Stunde, Team, Kartentyp, Lesegerät, Ergebnis). Ein Trigger zählt jeden
+    neuen Eintrag sofort mit; bestehende Scans werden einmalig nachgetragen.
+    """
+    conn.execute("ALTER TABLE entries ADD COLUMN team TEXT")
+    conn.execute("ALTER TABLE entries ADD COLUMN card_type TEXT")
+    conn.execute("ALTER TABLE entries ADD COLUMN code TEXT")
+    conn.execute(f"UPDATE entries SET code = {REASON_CODE_SQL}")
+    conn.execute(
+        "UPDATE entries SET card_type = (SELECT c.card_type FROM cards c WHERE c.uid = entries.uid)"
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS entry_rollup (
+            day TEXT NOT NULL,          -- Spieltag (YYYY-MM-DD)
+            hour INTEGER NOT NULL,      -- Stunde 0-23
+            team TEXT NOT NULL,         -- am Gate gewähltes Team
+            card_type TEXT NOT NULL,
+            reader TEXT NOT NULL,       -- Lesegerät / Drehkreuz
+            code TEXT NOT NULL,         -- Ergebnis-Code (decision.py)
+            allowed INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY ({ROLLUP_COLUMNS})
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entries_rollup AFTER INSERT ON entries
+        BEGIN
+            INSERT INTO entry_rollup({ROLLUP_COLUMNS}, count)
+            VALUES({_ROLLUP_KEY_SQL.format(p="NEW.")}, 1)
+            ON CONFLICT({ROLLUP_COLUMNS}) DO UPDATE SET count = count + 1;
+        END
+        """
+    )
+    rebuild_rollups(conn)
+
+
+def _migrate_unknown_scans(conn):
+    """
+    unknown_scans zählt Scans unbekannter Karten pro UID, Zeitfenster und
+    Lesegerät. In entries landet pro UID und Fenster nur der erste Scan
+    (siehe GateCore), eine liegengebliebene Karte füllt das Log nicht.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS unknown_scans (
+            uid TEXT NOT NULL,
+            window_ms INTEGER NOT NULL,     -- Beginn des Zeitfensters (ms seit Epoche)
+            reader TEXT NOT NULL,           -- Lesegerät ('' = unbekannt)
+            count INTEGER NOT NULL,         -- Scans im Fenster
+            last_ms INTEGER NOT NULL,       -- letzter Scan im Fenster
+            PRIMARY KEY (uid, window_ms, reader)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_card_changes(conn):
+    """
+    card_changes: Änderungsprotokoll der Tabelle cards für die Verteilung an
+    andere Gates (cardsync.py). Pro UID eine Zeile mit der Sequenznummer der
+    letzten Änderung (AUTOINCREMENT -> nie wiederverwendet) und ob die Karte
+    gelöscht wurde; Trigger pflegen sie. Bestehende Karten werden einmalig
+    eingetragen.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS card_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL UNIQUE,
+            deleted INTEGER NOT NULL        -- 1 = Karte gelöscht
+        )
+        """
+    )
+    # Kein INSERT OR REPLACE: im Trigger gilt die Konfliktbehandlung der
+    # äußeren Anweisung (z.B. UPSERT beim Import), daher erst löschen
+    def change(uid, deleted):
+        return (f"DELETE FROM card_changes WHERE uid = {uid}; "
+                f"INSERT INTO card_changes(uid, deleted) VALUES({uid}, {deleted});")
+
+    for event, statements in (
+        ("INSERT", change("NEW.uid", 0)),
+        ("UPDATE", "DELETE FROM card_changes WHERE uid = OLD.uid AND OLD.uid IS NOT NEW.uid; "
+                   "INSERT INTO card_changes(uid, deleted) "
+                   "SELECT OLD.uid, 1 WHERE OLD.uid IS NOT NEW.uid; " + change("NEW.uid", 0)),
+        ("DELETE", change("OLD.uid", 1)),
+    ):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS card_changes_{event.lower()}
+            AFTER {event} ON cards
+            BEGIN
+                {statements}
+            END
+            """
+        )
+    conn.execute("INSERT OR IGNORE INTO card_changes(uid, deleted) SELECT uid, 0 FROM cards ORDER BY id")
+
+
+def _migrate_fraud_alerts(conn):
+    """
+    fraud_alerts: Auffälligkeiten aus der Missbrauchserkennung (fraud.py) zur
+    Nachkontrolle; reviewed = 1, sobald sie jemand angesehen hat.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fraud_alerts (
+            id INTEGER PRIMARY KEY,
+            ts_ms INTEGER NOT NULL,
+            rule TEXT NOT NULL,             -- Regel, siehe fraud.py
+            uid TEXT,
+            reader TEXT,
+            card_type TEXT,
+            detail TEXT NOT NULL,
+            reviewed INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fraud_alerts_ts ON fraud_alerts(ts_ms)")
+
+
+# Schema-Migrationen in Reihenfolge. Migration i hebt PRAGMA user_version
+# von i auf i+1; neue Migrationen werden nur hinten angehängt.
+MIGRATIONS = [
+    _migrate_entries_ts_ms,
+    _migrate_cards_version,
+    _migrate_entries_reader,
+    _migrate_entries_sync,
+    _migrate_entry_rollup,
+    _migrate_unknown_scans,
+    _migrate_card_changes,
+    _migrate_fraud_alerts,
+]
+
+
+def migrate(conn):
+    """
+    Bringt eine (evtl. ältere) cards.db auf den aktuellen Schema-Stand.
+    Jede Migration läuft in einer eigenen Transaktion.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            conn.execute("BEGIN")  # auch ALTER TABLE in dieselbe Transaktion
+            migration(conn)
+            conn.execute(f"PRAGMA user_version={number}")
+
+
+def rebuild_rollups(conn, day_from=None):
+    """
+    Berechnet entry_rollup aus entries neu (alles oder ab Tag `day_from`),
+    z.B. nach einer Reparatur. Commit durch den Aufrufer.
+    Tage vor meta.archived_until bleiben unangetastet: deren Scans liegen
+    nur noch in den Archiv-Dateien (db/retention.py), die Zähler in
+    entry_rollup sind dort die einzige Quelle.
+    """
+    archived_until = get_meta(conn, "archived_until")
+    if archived_until and (day_from is None or str(day_from) < archived_until):
+        day_from = archived_until
+    where = "WHERE timestamp >= ?" if day_from else ""
+    params = (day_from,) if day_from else ()
+    conn.execute(f"DELETE FROM entry_rollup {'WHERE day >= ?' if day_from else ''}", params)
+    conn.execute(
+        f"""
+        INSERT INTO entry_rollup({ROLLUP_COLUMNS}, count)
+        SELECT {_ROLLUP_KEY_SQL.format(p="")}, COUNT(*)
+        FROM entries {where}
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+        """,
+        params,
+    )
+
+
+def get_meta(conn, key, default=None):
+    """Liest einen Wert aus der Tabelle meta."""
+    row = conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    """Schreibt einen Wert in die Tabelle meta (Commit durch den Aufrufer)."""
+    conn.execute(
+        "INSERT INTO meta(key, value) VALUES(?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (key, str(value)),
+    )
+
+
+def cards_version(conn):
+    """Änderungszähler der Tabelle cards (wird per Trigger gepflegt)."""
+    return int(get_meta(conn, "cards_version", 0))
+
+
+# Spalten der Tabelle cards in der Reihenfolge der CSV
+CARD_FIELDS = ("uid", "name", "card_type", "valid_from", "valid_until", "teams", "notes")
+
+# Zeilen pro executemany beim Import
+IMPORT_BATCH_SIZE = 1000
+
+# Gültige UID: 4-10 Bytes als Hex (ACR122U liefert 4 oder 7 Bytes)
+UID_PATTERN = re.compile(r"^(?:[0-9A-F]{2}){4,10}$")
+
+UPSERT_CARD_SQL = """
+    INSERT INTO cards(uid, name, card_type, valid_from, valid_until, teams, notes)
+    VALUES(?,?,?,?,?,?,?)
+    ON CONFLICT(uid) DO UPDATE SET
+        name=excluded.name,
+        card_type=excluded.card_type,
+        valid_from=excluded.valid_from,
+        valid_until=excluded.valid_until,
+        teams=excluded.teams,
+        notes=excluded.notes
+"""
+
+
+class ImportReport:
+    """
+    Ergebnis eines CSV-Imports.
+    - skipped: True, wenn die Datei unverändert war und nichts getan wurde
+    - added / changed / removed / unchanged: Anzahl Karten (Modus "diff")
+    - written: Anzahl geschriebener Zeilen
+    - errors: Liste von (Zeilennummer, UID, Meldung) für abgelehnte Zeilen
+    - rejected_uids: UIDs abgelehnter Zeilen (werden im Diff nicht gelöscht)
+    """
+
+    def __init__(self):
+        self.skipped = False
+        self.added = 0
+        self.changed = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.written = 0
+        self.errors = []
+        self.rejected_uids = set()
+
+    def __str__(self):
+        if self.skipped:
+            return "Import übersprungen (cards.csv unverändert)"
+        return (
+            f"Import: {self.added} neu, {self.changed} geändert, {self.removed} entfernt, "
+            f"{self.unchanged} unverändert, {len(self.errors)} Fehler"
+        )
+
+
+def _file_stamp(path):
+    """Billiger Änderungs-Stempel einer Datei: mtime + Größe."""
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def _file_hash(path):
+    """SHA-256 des Dateiinhalts (blockweise gelesen)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _validate_card_row(row):
+    """
+    Prüft eine CSV-Zeile und bringt sie in die Form der Tabelle cards.
+    Rückgabe: (Tupel in CARD_FIELDS-Reihenfolge, None) oder (None, Fehlermeldung)
+    """
+    missing = [f for f in CARD_FIELDS if row.get(f) is None]
+    if missing:
+        return None, "Spalte fehlt: " + ", ".join(missing)
+    uid = row["uid"].strip().upper()
+    if not UID_PATTERN.match(uid):
+        return None, f"Ungültige UID '{row['uid']}'"
+    for field in ("valid_from", "valid_until"):
+        value = row[field].strip()
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                return None, f"Ungültiges Datum in {field}: '{value}'"
+    return (
+        uid,
+        row["name"],
+        row["card_type"],
+        row["valid_from"].strip() or None,
+        row["valid_until"].strip() or None,
+        row["teams"],
+        row["notes"],
+    ), None
+
+
+def _read_cards_csv(csv_path, report):
+    """
+    Liest die CSV zeilenweise (Generator) und liefert nur gültige Zeilen.
+    Fehler und doppelte UIDs landen im Report; ungültige UIDs werden zusätzlich
+    in report.rejected_uids gemerkt, damit der Diff sie nicht löscht.
+    """
+    seen = set()
     with open(csv_path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f, delimiter=";")
         for row in reader:
-            try:
-                cur.execute("""
-                    INSERT INTO cards(uid, name, card_type, valid_from, valid_until, teams, notes)
-                    VALUES(?,?,?,?,?,?,?)
-                    ON CONFLICT(uid) DO UPDATE SET
-                        name=excluded.name,
-                        card_type=excluded.card_type,
-                        valid_from=excluded.valid_from,
-                        valid_until=excluded.valid_until,
-                        teams=excluded.teams,
-                        notes=excluded.notes
-                """, (
-                    row["uid"].strip().upper(),
-                    row["name"],
-                    row["card_type"],
-                    row["valid_from"] or None,
-                    row["valid_until"] or None,
-                    row["teams"],
-                    row["notes"]
-                ))
-            except Exception as e:
-                print(f"Fehler bei UID {row['uid']}: {e}")
-    conn.commit()
+            card, error = _validate_card_row(row)
+            raw_uid = (row.get("uid") or "").strip().upper()
+            if error:
+                report.errors.append((reader.line_num, raw_uid, error))
+                report.rejected_uids.add(raw_uid)
+                continue
+            if card[0] in seen:
+                report.errors.append((reader.line_num, card[0], "Doppelte UID, Zeile ignoriert"))
+                continue
+            seen.add(card[0])
+            yield card
+
+
+def _batched(rows, size):
+    """Teilt einen Iterator in Listen der Länge `size`."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_from_csv(conn, csv_path, mode="diff", force=False):
+    """
+    Liest Karten aus einer CSV-Datei (Semicolon-getrennt) und schreibt sie in die DB.
+    - Unveränderte Datei (mtime/Größe bzw. Hash wie beim letzten Import)
+      -> kein Import, außer force=True
+    - mode="diff":   nur neue und geänderte Karten schreiben, Karten, die nicht
+                     mehr in der CSV stehen, löschen
+    - mode="upsert": alle Zeilen einfügen/aktualisieren, nichts löschen
+    Geschrieben wird in Batches (executemany) in einer einzigen Transaktion.
+    Fehlerhafte Zeilen werden übersprungen und im Report gesammelt.
+    Rückgabe: ImportReport
+    """
+    report = ImportReport()
+    stamp = _file_stamp(csv_path)
+    if not force and get_meta(conn, "csv_stamp") == stamp:
+        report.skipped = True
+        return report
+    digest = _file_hash(csv_path)
+    if not force and get_meta(conn, "csv_hash") == digest:
+        # Nur mtime geändert (z.B. Datei neu kopiert), Inhalt gleich
+        with conn:
+            set_meta(conn, "csv_stamp", stamp)
+        report.skipped = True
+        return report
+
+    with conn:
+        if mode == "diff":
+            existing = {
+                row[0]: row
+                for row in conn.execute(
+                    "SELECT uid, name, card_type, valid_from, valid_until, teams, notes FROM cards"
+                )
+            }
+            changes = []
+            for card in _read_cards_csv(csv_path, report):
+                old = existing.pop(card[0], None)
+                if old is None:
+                    report.added += 1
+                elif old != card:
+                    report.changed += 1
+                else:
+                    report.unchanged += 1
+                    continue
+                changes.append(card)
+            for batch in _batched(changes, IMPORT_BATCH_SIZE):
+                conn.executemany(UPSERT_CARD_SQL, batch)
+                report.written += len(batch)
+            removed = [(uid,) for uid in existing if uid not in report.rejected_uids]
+            for batch in _batched(removed, IMPORT_BATCH_SIZE):
+                conn.executemany("DELETE FROM cards WHERE uid=?", batch)
+            report.removed = len(removed)
+        elif mode == "upsert":
+            for batch in _batched(_read_cards_csv(csv_path, report), IMPORT_BATCH_SIZE):
+                conn.executemany(UPSERT_CARD_SQL, batch)
+                report.written += len(batch)
+        else:
+            raise ValueError(f"Unbekannter Import-Modus: {mode}")
+        set_meta(conn, "csv_stamp", stamp)
+        set_meta(conn, "csv_hash", digest)
+    return report
 
 
 def lookup_card(conn, uid_hex):
@@ -105,51 +678,83 @@ def lookup_card(conn, uid_hex):
     return None
 
 
-def is_valid_date_range(valid_from, valid_until):
+# --- Logging-Funktionen --- #
+
+def entry_row(uid, allowed, reason="", timestamp=None, reader=None, team=None,
+              card_type=None, code=None):
+    """Baut die Parameter-Zeile für INSERT INTO entries (siehe log_entries)."""
+    ts = timestamp or datetime.now()
+    return (uid, ts.isoformat(), to_ms(ts), 1 if allowed else 0, reason, reader,
+            team, card_type, code)
+
+
+def log_entries(conn, rows):
     """
-    Prüft, ob eine Karte aktuell gültig ist.
-    - Noch nicht gültig -> False
-    - Abgelaufen -> False
-    - Sonst -> True
+    Schreibt mehrere mit entry_row() erzeugte Einträge. entry_rollup wird per
+    Trigger mitgezählt. Commit durch den Aufrufer (z.B. db.writer()): so
+    landet ein ganzer Batch samt unknown_scans in einer Transaktion mit
+    einem fsync.
     """
-    now = datetime.now().date()
-    try:
-        if valid_from:
-            vf = datetime.fromisoformat(valid_from).date()
-            if now < vf:
-                return False
-        if valid_until:
-            vu = datetime.fromisoformat(valid_until).date()
-            if now > vu:
-                return False
-        return True
-    except Exception:
-        return False
+    conn.executemany(
+        """
+        INSERT INTO entries(uid, timestamp, ts_ms, allowed, reason, reader, team, card_type, code)
+        VALUES(?,?,?,?,?,?,?,?,?)
+        """,
+        rows,
+    )
 
 
-# --- Logging-Funktionen --- #
+# Länge eines Zählfensters für unbekannte Karten (Sekunden)
+UNKNOWN_WINDOW_SECONDS = 60
+
+
+def unknown_row(uid, timestamp=None, reader=None):
+    """Baut die Parameter-Zeile für count_unknown_scans()."""
+    ts_ms = to_ms(timestamp or datetime.now())
+    window_ms = ts_ms - ts_ms % (UNKNOWN_WINDOW_SECONDS * 1000)
+    return (uid, window_ms, reader or "", ts_ms)
+
 
-def log_entry(conn, uid, allowed, reason=""):
+def count_unknown_scans(conn, rows):
+    """Zählt Scans unbekannter Karten (mit unknown_row() erzeugt) in unknown_scans."""
+    conn.executemany(
+        """
+        INSERT INTO unknown_scans(uid, window_ms, reader, count, last_ms) VALUES(?,?,?,1,?)
+        ON CONFLICT(uid, window_ms, reader) DO UPDATE
+        SET count = count + 1, last_ms = MAX(last_ms, excluded.last_ms)
+        """,
+        rows,
+    )
+
+
+def log_alerts(conn, alerts):
+    """Speichert Auffälligkeiten (fraud.Alert) in fraud_alerts."""
+    conn.executemany(
+        "INSERT INTO fraud_alerts(ts_ms, rule, uid, reader, card_type, detail) VALUES(?,?,?,?,?,?)",
+        [(to_ms(a.ts), a.rule, a.uid, a.reader, a.card_type, a.detail) for a in alerts],
+    )
+
+
+def log_entry(conn, uid, allowed, reason="", timestamp=None, reader=None, team=None,
+              card_type=None, code=None):
     """
     Fügt einen Eintrag in die Tabelle entries ein.
     - uid: Karten-ID
     - allowed: True/False (1/0)
     - reason: Grund für die Entscheidung (z.B. "OK", "abgelaufen")
+    - timestamp: Zeitpunkt des Scans (datetime), Standard: jetzt
+    - reader: Name des Lesegeräts (bei mehreren Drehkreuzen)
+    - team / card_type: gewähltes Team und Kartentyp (für Auswertungen)
+    - code: Ergebnis-Code der Entscheidung (siehe decision.py)
+    Commit durch den Aufrufer (siehe log_entries).
     """
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO entries(uid, timestamp, allowed, reason)
-        VALUES(?,?,?,?)
-        """,
-        (uid, datetime.now().isoformat(), 1 if allowed else 0, reason),
-    )
-    conn.commit()
+    log_entries(conn, [entry_row(uid, allowed, reason, timestamp, reader, team, card_type, code)])
 
 
 def last_entry(conn, uid):
     """
     Gibt den letzten Eintrag einer Karte zurück.
+    Nutzt den Index (uid, ts_ms) -> kein Full-Table-Scan, keine Sortierung.
     Rückgabe-Dict:
       { "timestamp": datetime|None, "allowed": bool, "reason": str }
     oder None, wenn kein Eintrag vorhanden ist.
@@ -160,7 +765,7 @@ def last_entry(conn, uid):
         SELECT timestamp, allowed, reason
         FROM entries
         WHERE uid=?
-        ORDER BY timestamp DESC
+        ORDER BY ts_ms DESC
         LIMIT 1
         """,
         (uid,),
@@ -177,3 +782,151 @@ def last_entry(conn, uid):
             "reason": row[2]
         }
     return None
+
+
+def recent_allowed_entries(conn, since):
+    """
+    Liefert für jede Karte den letzten erlaubten Zutritt seit `since`,
+    getrennt nach eigenen und von anderen Gates übernommenen Scans.
+    Rückgabe: Liste von (uid, datetime, remote)
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT uid, MAX(ts_ms), node IS NOT NULL
+        FROM entries
+        WHERE ts_ms >= ? AND allowed=1
+        GROUP BY uid, node IS NOT NULL
+        """,
+        (to_ms(since),),
+    )
+    return [(uid, from_ms(ts), bool(remote)) for uid, ts, remote in cur.fetchall()]
+
+
+# --- Abgleich zwischen Gates (siehe sync.py) --- #
+
+def local_entries_since(conn, seq, limit):
+    """
+    Lokale Scans (node IS NULL) mit id > seq, aufsteigend, höchstens `limit`.
+    Rückgabe: Liste von (id, uid, ts_ms, allowed, reason, reader, team, card_type, code)
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, uid, ts_ms, allowed, reason, reader, team, card_type, code
+        FROM entries
+        WHERE id > ? AND node IS NULL AND ts_ms IS NOT NULL
+        ORDER BY id
+        LIMIT ?
+        """,
+        (seq, limit),
+    )
+    return cur.fetchall()
+
+
+def apply_remote_entries(conn, url, node, rows):
+    """
+    Übernimmt Scans eines anderen Gates (Zeilen wie local_entries_since)
+    und merkt sich die höchste Sequenznummer – beides in einer Transaktion.
+    Bereits vorhandene Zeilen werden ignoriert.
+    """
+    with conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO entries(uid, timestamp, ts_ms, allowed, reason, reader,
+                                          team, card_type, code, node, origin_id)
+            VALUES(?,?,?,?,?,?,?,?,?,?,?)
+            """,
+            [
+                (uid, from_ms(ts_ms).isoformat(), ts_ms, allowed, reason, reader,
+                 team, card_type, code, node, seq)
+                for seq, uid, ts_ms, allowed, reason, reader, team, card_type, code in rows
+            ],
+        )
+        conn.execute(
+            """
+            INSERT INTO sync_peers(url, node, last_seq) VALUES(?,?,?)
+            ON CONFLICT(url) DO UPDATE SET node=excluded.node, last_seq=excluded.last_seq
+            """,
+            (url, node, max(row[0] for row in rows)),
+        )
+
+
+def sync_cursor(conn, url):
+    """(node, last_seq) einer Gegenstelle oder (None, 0), wenn noch nie abgeglichen."""
+    row = conn.execute("SELECT node, last_seq FROM sync_peers WHERE url=?", (url,)).fetchone()
+    return row if row else (None, 0)
+
+
+# --- Verteilung der Kartenliste (siehe cardsync.py) --- #
+
+CARD_COLUMNS_SQL = ", ".join(CARD_FIELDS)
+
+
+def card_seq(conn):
+    """Sequenznummer der letzten Kartenänderung (0 = keine)."""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM card_changes").fetchone()[0]
+
+
+def card_snapshot(conn):
+    """
+    Alle Karten mit dem zugehörigen Stand, in einer Lesetransaktion.
+    Rückgabe: (seq, Liste von Zeilen in der Reihenfolge von CARD_FIELDS)
+    """
+    with conn:
+        conn.execute("BEGIN")
+        seq = card_seq(conn)
+        cards = conn.execute(f"SELECT {CARD_COLUMNS_SQL} FROM cards ORDER BY uid").fetchall()
+    return seq, cards
+
+
+def card_changes_since(conn, seq, limit):
+    """
+    Kartenänderungen mit seq > `seq`, aufsteigend, höchstens `limit`.
+    Rückgabe: (letzte seq, geänderte/neue Karten, gelöschte UIDs)
+    """
+    with conn:
+        conn.execute("BEGIN")
+        rows = conn.execute(
+            f"""
+            SELECT ch.seq, ch.deleted, ch.uid, {", ".join("c." + f for f in CARD_FIELDS[1:])}
+            FROM card_changes ch LEFT JOIN cards c ON c.uid = ch.uid
+            WHERE ch.seq > ?
+            ORDER BY ch.seq
+            LIMIT ?
+            """,
+            (seq, limit),
+        ).fetchall()
+    upserts = [row[2:] for row in rows if not row[1]]
+    deletes = [row[2] for row in rows if row[1]]
+    return (rows[-1][0] if rows else seq), upserts, deletes
+
+
+def apply_card_changes(conn, source, seq, upserts, deletes, replace=False):
+    """
+    Übernimmt Karten von der Verteilung und merkt sich Quelle und Stand
+    (meta card_source / card_seq) – alles in einer Transaktion, Scans laufen
+    dank WAL weiter. replace=True: `upserts` ist die vollständige Liste,
+    alle anderen Karten werden gelöscht (Snapshot).
+    Rückgabe: (geschrieben, gelöscht)
+    """
+    with conn:
+        if replace:
+            keep = {row[0] for row in upserts}
+            deletes = [uid for (uid,) in conn.execute("SELECT uid FROM cards") if uid not in keep]
+            existing = {
+                row[0]: row for row in conn.execute(f"SELECT {CARD_COLUMNS_SQL} FROM cards")
+            }
+            upserts = [row for row in upserts if existing.get(row[0]) != tuple(row)]
+        for batch in _batched([tuple(row) for row in upserts], IMPORT_BATCH_SIZE):
+            conn.executemany(UPSERT_CARD_SQL, batch)
+        for batch in _batched([(uid,) for uid in deletes], IMPORT_BATCH_SIZE):
+            conn.executemany("DELETE FROM cards WHERE uid=?", batch)
+        set_meta(conn, "card_source", source)
+        set_meta(conn, "card_seq", seq)
+    return len(upserts), len(deletes)
+
+
+def card_cursor(conn):
+    """(Quelle, seq) der zuletzt übernommenen Kartenliste oder (None, 0)."""
+    return get_meta(conn, "card_source"), int(get_meta(conn, "card_seq", 0))
@@ -0,0 +1,209 @@
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+
+from db.database import count_unknown_scans, entry_row, log_entries, unknown_row
+from db.journal import JournalError, ScanJournal
+from metrics import DB_DEGRADED, JOURNAL_ROWS, LOG_FLUSH_SECONDS, LOG_QUEUE, LOG_ROWS
+
+# Markiert das Ende der Warteschlange (close())
+_STOP = object()
+
+
+class _UnknownScan(tuple):
+    """Eintrag der Warteschlange für unknown_scans statt entries (siehe count_unknown())."""
+    __slots__ = ()
+
+
+class EntryWriter(threading.Thread):
+    """
+    Write-Behind-Logger für die Tabelle entries.
+    - log() legt Scans nur in eine Warteschlange (blockiert den UI-Thread nicht)
+    - ein eigener Thread schreibt sie gesammelt per executemany in einer
+      Transaktion, spätestens nach flush_interval Sekunden oder sobald
+      batch_size Einträge vorliegen
+    - close() schreibt alle noch offenen Einträge und beendet den Thread
+    - count_unknown() zählt Scans unbekannter Karten in unknown_scans mit
+    - Notbetrieb: schlägt das Schreiben fehl (DB gesperrt, schreibgeschützt,
+      defekt), gehen die Batches in ein Journal (db/journal.py); alle
+      probe_interval Sekunden wird versucht, es in die DB einzuspielen
+
+    Die Doppel-Scan-Prüfung läuft über den CardIndex im Speicher und sieht
+    Scans sofort, auch wenn sie hier noch nicht geschrieben wurden.
+    """
+
+    def __init__(self, db, flush_interval=0.5, batch_size=100, journal_path=None,
+                 probe_interval=2.0):
+        """
+        Parameter:
+        - db:             Database (geschrieben wird über db.writer())
+        - flush_interval: max. Wartezeit (Sekunden) bis ein Scan geschrieben wird
+        - batch_size:     ab so vielen Einträgen wird sofort geschrieben
+        - journal_path:   Journal für den Notbetrieb (None = kein Journal, Scans
+                          bleiben bis zum nächsten Versuch im Speicher)
+        - probe_interval: Abstand (Sekunden) der Einspielversuche im Notbetrieb
+        """
+        super().__init__(daemon=True, name="EntryWriter")
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.journal_path = journal_path
+        self.probe_interval = probe_interval
+        self.journal = None         # wird erst im Notbetrieb angelegt
+        self.degraded = False       # True: DB nicht beschreibbar, Scans gehen ins Journal
+        self._next_probe = 0.0
+        self.queue = queue.Queue()
+        LOG_QUEUE.set_function(self.queue.qsize)
+        JOURNAL_ROWS.set_function(lambda: len(self.journal) if self.journal else 0)
+
+    def log(self, uid, allowed, reason="", timestamp=None, reader=None, team=None,
+            card_type=None, code=None):
+        """Nimmt einen Scan entgegen (gleiche Parameter wie log_entry)."""
+        self.queue.put(entry_row(uid, allowed, reason, timestamp, reader, team, card_type, code))
+
+    def count_unknown(self, uid, timestamp=None, reader=None):
+        """Zählt einen Scan einer unbekannten Karte in unknown_scans (gleicher Batch wie log())."""
+        self.queue.put(_UnknownScan(unknown_row(uid, timestamp, reader)))
+
+    def wait_idle(self):
+        """Blockiert, bis alle bisher übergebenen Scans geschrieben sind."""
+        self.queue.join()
+
+    def close(self, timeout=None):
+        """Schreibt die Warteschlange leer und beendet den Thread."""
+        if self.is_alive():
+            self.queue.put(_STOP)
+            self.join(timeout)
+
+    def run(self):
+        """Hauptschleife: Scans sammeln und gebündelt schreiben."""
+        if self.journal_path and os.path.exists(self.journal_path):
+            # Scans aus einem früheren Notbetrieb (z.B. Neustart vor dem Einspielen)
+            self._open_journal()
+            if self.journal is not None and len(self.journal) and not self._replay():
+                self._set_degraded(True)
+        batch = []
+        deadline = None
+        while True:
+            if batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            elif self.degraded:
+                timeout = max(0.0, self._next_probe - time.monotonic())
+            else:
+                timeout = None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self.queue.task_done()
+                # Restliche Einträge ohne Wartezeit schreiben (mit wenigen Versuchen)
+                for _ in range(3):
+                    if not batch or self._write(batch):
+                        break
+                    time.sleep(self.flush_interval)
+                else:
+                    print(f"{len(batch)} Einträge konnten nicht geschrieben werden")
+                if self.degraded:
+                    self._replay()
+                if self.journal is not None:
+                    self.journal.close()
+                break
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                if not self._write(batch):
+                    # Nochmal versuchen, sobald das nächste Intervall abläuft
+                    deadline = time.monotonic() + self.flush_interval
+
+            if self.degraded and time.monotonic() >= self._next_probe:
+                self._replay()
+
+    def _write(self, batch):
+        """
+        Schreibt einen Batch in die DB oder im Notbetrieb ins Journal; bei
+        Erfolg wird er geleert. Rückgabe: True/False.
+        """
+        start = time.perf_counter()
+        entries = [row for row in batch if not isinstance(row, _UnknownScan)]
+        unknown = [row for row in batch if isinstance(row, _UnknownScan)]
+        if self.degraded:
+            # Reihenfolge halten: erst nach dem Journal wieder direkt in die DB
+            return self._to_journal(batch, entries, unknown)
+        try:
+            with self.db.writer() as conn:
+                if entries:
+                    log_entries(conn, entries)
+                if unknown:
+                    count_unknown_scans(conn, unknown)
+        except sqlite3.Error as e:
+            print(f"Fehler beim Schreiben von {len(batch)} Einträgen: {e}")
+            if self.journal_path is None:
+                return False
+            self._set_degraded(True)
+            return self._to_journal(batch, entries, unknown)
+        LOG_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        LOG_ROWS.inc(len(entries))
+        self._done(batch)
+        return True
+
+    def _done(self, batch):
+        for _ in batch:
+            self.queue.task_done()
+        batch.clear()
+
+    def _open_journal(self):
+        if self.journal is None:
+            try:
+                self.journal = ScanJournal(self.journal_path)
+            except OSError as e:
+                print(f"Journal {self.journal_path} nicht nutzbar: {e}")
+        return self.journal
+
+    def _to_journal(self, batch, entries, unknown):
+        """Hängt einen Batch ans Journal; geht auch das nicht, bleibt er im Speicher."""
+        if self._open_journal() is None:
+            return False
+        try:
+            self.journal.append(entries, unknown)
+        except (OSError, struct.error) as e:
+            print(f"Fehler beim Schreiben ins Journal: {e}")
+            return False
+        self._done(batch)
+        return True
+
+    def _set_degraded(self, degraded):
+        if degraded and not self.degraded:
+            print("DB nicht beschreibbar: Notbetrieb, Scans gehen ins Journal")
+            self._next_probe = time.monotonic() + self.probe_interval
+        self.degraded = degraded
+        DB_DEGRADED.set(1 if degraded else 0)
+
+    def _replay(self):
+        """Versucht, das Journal in die DB einzuspielen; bei Erfolg endet der Notbetrieb."""
+        try:
+            count = self.journal.replay(self.db) if self.journal is not None else 0
+        except (sqlite3.Error, OSError):
+            self._next_probe = time.monotonic() + self.probe_interval
+            return False
+        except JournalError as e:
+            # Neu öffnen schneidet den defekten Rest ab (Kopie: .bad), der
+            # lesbare Teil wird beim nächsten Versuch eingespielt
+            print(f"Journal beschädigt: {e}")
+            self.journal.close()
+            self.journal = None
+            self._open_journal()
+            self._next_probe = time.monotonic() + self.probe_interval
+            return False
+        if count:
+            print(f"DB wieder beschreibbar: {count} Scans aus dem Journal eingespielt")
+        self._set_degraded(False)
+        return True
@@ -0,0 +1,271 @@
+# db/export.py
+# Streaming-Export des Scan-Logs (entries + Kartendaten aus cards).
+# - liest in festen Blöcken per Keyset-Paginierung (id > letzte id), jede
+#   Abfrage ist kurz -> der Speicherbedarf bleibt konstant und die Lesesperre
+#   hält keinen WAL-Checkpoint über den ganzen Export auf
+# - schreibt CSV, ein eigenes kompaktes Spaltenformat (.colz, ohne
+#   Zusatzpakete) oder Parquet (nur wenn pyarrow installiert ist)
+# - Filter: Zeitraum, Team, erlaubt/verweigert
+# - Fortsetzen: mit --resume NAME merkt sich die DB die zuletzt exportierte
+#   id, der nächste Lauf exportiert nur neue Scans (nächtlicher Export)
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m db.export csv scans.csv --from 2026-03-01 --to 2026-03-31
+#   python -m db.export csv scans.csv --resume nacht          # hängt Neues an
+#   python -m db.export colz scans.colz --team "1. Herren" --denied
+#   python -m db.export parquet scans-2026-03-14.parquet --from 2026-03-14 --to 2026-03-14
+#   python -m db.export csv saison-2024-25.csv --archive 2024-25   # archivierte Saison
+
+import argparse
+import csv
+import json
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+from db.database import DB_PATH, Database, connect, get_meta, set_meta, to_ms
+
+# Zeilen pro Block (ein Block = eine Abfrage = ein Parquet-Row-Group)
+EXPORT_CHUNK_SIZE = 5000
+
+# Exportierte Spalten (entries + Kartendaten)
+EXPORT_COLUMNS = [
+    "id", "uid", "timestamp", "allowed", "code", "reason", "reader", "team", "node",
+    "name", "card_type", "card_teams",
+]
+
+EXPORT_SQL = """
+    SELECT e.id, e.uid, e.timestamp, e.allowed, e.code, e.reason, e.reader, e.team, e.node,
+           c.name, COALESCE(e.card_type, c.card_type), c.teams
+    FROM entries e LEFT JOIN cards c ON c.uid = e.uid
+"""
+
+# Kennung am Anfang einer .colz-Datei
+COLZ_MAGIC = b"GATECOLZ1\n"
+
+
+def iter_entry_chunks(conn, since_id=0, day_from=None, day_to=None, team=None,
+                      allowed=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Liefert die Scans blockweise als Listen von Zeilen (siehe EXPORT_COLUMNS),
+    aufsteigend nach id.
+    Parameter:
+    - since_id:  nur Scans mit id > since_id (Fortsetzen)
+    - day_from / day_to: Zeitraum (date oder "YYYY-MM-DD", jeweils inklusive)
+    - team:      nur Scans mit diesem am Gate gewählten Team
+    - allowed:   True/False = nur erlaubte/verweigerte, None = alle
+    """
+    clauses = ["e.id > ?"]
+    params = []
+    if day_from:
+        clauses.append("e.ts_ms >= ?")
+        params.append(to_ms(datetime.fromisoformat(str(day_from))))
+    if day_to:
+        clauses.append("e.ts_ms < ?")
+        params.append(to_ms(datetime.fromisoformat(str(day_to)) + timedelta(days=1)))
+    if team is not None:
+        clauses.append("e.team = ?")
+        params.append(team)
+    if allowed is not None:
+        clauses.append("e.allowed = ?")
+        params.append(1 if allowed else 0)
+    sql = f"{EXPORT_SQL} WHERE {' AND '.join(clauses)} ORDER BY e.id LIMIT ?"
+
+    last_id = since_id
+    while True:
+        rows = conn.execute(sql, [last_id, *params, chunk_size]).fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+class CsvSink:
+    """Schreibt Blöcke als CSV (Semikolon wie cards.csv). append=True hängt ohne Kopfzeile an."""
+
+    def __init__(self, path, append=False):
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file, delimiter=";")
+        if write_header:
+            self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ColzSink:
+    """
+    Eigenes Spaltenformat ohne Zusatzpakete: nach COLZ_MAGIC und einer
+    JSON-Kopfzeile (Spaltennamen) folgt pro Block eine 4-Byte-Länge und der
+    zlib-komprimierte JSON-Block {spalte: [werte...]}. Spaltenweise
+    komprimiert sich das Log auf einen Bruchteil der CSV-Größe; neue Blöcke
+    lassen sich einfach anhängen. Lesen: read_colz().
+    """
+
+    def __init__(self, path, append=False):
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "ab" if append else "wb")
+        if not exists:
+            self.file.write(COLZ_MAGIC)
+            self.file.write(json.dumps({"columns": EXPORT_COLUMNS}).encode() + b"\n")
+
+    def write(self, rows):
+        block = {name: list(values) for name, values in zip(EXPORT_COLUMNS, zip(*rows))}
+        data = zlib.compress(json.dumps(block, separators=(",", ":")).encode(), 6)
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def read_colz(path):
+    """Liest eine .colz-Datei blockweise. Rückgabe: Generator von dicts {spalte: [werte...]}."""
+    with open(path, "rb") as f:
+        if f.readline() != COLZ_MAGIC:
+            raise ValueError(f"{path} ist keine .colz-Datei")
+        f.readline()  # Kopfzeile (Spaltennamen stehen auch in jedem Block)
+        while True:
+            head = f.read(4)
+            if len(head) < 4:
+                return
+            (length,) = struct.unpack(">I", head)
+            yield json.loads(zlib.decompress(f.read(length)))
+
+
+class ParquetSink:
+    """Parquet über pyarrow (optional), ein Row-Group pro Block. Immer neue Datei."""
+
+    def __init__(self, path, append=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(
+                "Parquet-Export braucht pyarrow (pip install pyarrow), sonst 'colz' nutzen"
+            ) from None
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.int64()), ("uid", pa.string()), ("timestamp", pa.string()),
+            ("allowed", pa.int8()), ("code", pa.string()), ("reason", pa.string()),
+            ("reader", pa.string()), ("team", pa.string()), ("node", pa.string()),
+            ("name", pa.string()), ("card_type", pa.string()), ("card_teams", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.table(
+            [self.pa.array(col, type=field.type) for col, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+SINKS = {"csv": CsvSink, "colz": ColzSink, "parquet": ParquetSink}
+
+
+def export_entries(db, path, fmt="csv", resume=None, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    Exportiert Scans nach `path`.
+    Parameter:
+    - db:       Database
+    - fmt:      "csv", "colz" oder "parquet"
+    - resume:   Name eines Export-Laufs; ab der beim letzten Lauf gemerkten
+                id weitermachen und danach die neue id speichern. CSV/colz
+                werden dabei angehängt, Parquet immer neu geschrieben.
+    - filters:  day_from, day_to, team, allowed (siehe iter_entry_chunks)
+    Rückgabe: (anzahl exportierter Zeilen, letzte id)
+    """
+    key = f"export_cursor:{resume}" if resume else None
+    since_id = int(get_meta(db.reader(), key, 0)) if key else 0
+    sink = SINKS[fmt](path, append=bool(resume))
+    count = 0
+    last_id = since_id
+    try:
+        for rows in iter_entry_chunks(db.reader(), since_id, chunk_size=chunk_size, **filters):
+            sink.write(rows)
+            count += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        sink.close()
+    if key and last_id != since_id:
+        with db.writer() as conn:
+            set_meta(conn, key, last_id)
+    return count, last_id
+
+
+def export_archive(archive, path, fmt="csv", chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    Exportiert Scans aus einer Archiv-DB (siehe db/retention.py) nach `path`.
+    Archive enthalten dieselben Tabellen entries und cards wie die Live-DB.
+    Rückgabe: (anzahl exportierter Zeilen, letzte id)
+    """
+    conn = connect(archive, readonly=True)
+    sink = SINKS[fmt](path)
+    count = 0
+    last_id = 0
+    try:
+        for rows in iter_entry_chunks(conn, chunk_size=chunk_size, **filters):
+            sink.write(rows)
+            count += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        sink.close()
+        conn.close()
+    return count, last_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan-Log exportieren (streamend)")
+    parser.add_argument("format", choices=sorted(SINKS))
+    parser.add_argument("path", help="Zieldatei")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    parser.add_argument("--from", dest="day_from", help="ab Tag (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="day_to", help="bis Tag (inklusive)")
+    parser.add_argument("--team", help="nur Scans mit diesem Team")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--allowed", dest="allowed", action="store_const", const=True)
+    group.add_argument("--denied", dest="allowed", action="store_const", const=False)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--resume", metavar="NAME", help="ab dem letzten Lauf NAME fortsetzen")
+    source.add_argument("--archive", metavar="SAISON", help="aus der Archiv-DB einer Saison (z.B. 2024-25)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    filters = dict(day_from=args.day_from, day_to=args.day_to, team=args.team, allowed=args.allowed)
+    if args.archive:
+        from db.retention import ARCHIVE_DIR, archive_path
+        source = archive_path(args.archive, os.path.join(os.path.dirname(args.db), os.path.basename(ARCHIVE_DIR)))
+        if not os.path.exists(source):
+            parser.error(f"Archiv {source} nicht gefunden")
+        try:
+            count, last_id = export_archive(source, args.path, args.format, args.chunk_size, **filters)
+        except RuntimeError as e:
+            parser.error(str(e))
+        print(f"{count} Scans exportiert nach {args.path} (bis id {last_id})")
+        return
+
+    db = Database(args.db)
+    try:
+        count, last_id = export_entries(
+            db, args.path, args.format, resume=args.resume, chunk_size=args.chunk_size, **filters
+        )
+    except RuntimeError as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+    print(f"{count} Scans exportiert nach {args.path} (bis id {last_id})")
+
+
+if __name__ == "__main__":
+    main()
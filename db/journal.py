@@ -0,0 +1,318 @@
+# db/journal.py
+# Notbetrieb des Scan-Logs: ist die DB gesperrt, schreibgeschützt oder
+# defekt, schreibt der EntryWriter die Scans in ein Journal neben der DB
+# (db/cards.journal) und spielt sie in entries ein, sobald die DB wieder
+# schreibbar ist. Die Entscheidungen laufen derweil mit dem Karten-Index im
+# Speicher weiter.
+# - nur Anhängen, Datensätze fester Größe (RECORD_SIZE Bytes) mit CRC32:
+#   ein beim Stromausfall halb geschriebener Datensatz am Ende wird beim
+#   nächsten Öffnen erkannt und abgeschnitten
+# - ein write() + fsync pro Batch des EntryWriters; schlägt es fehl (z.B.
+#   Karte voll), wird das Journal auf den Stand davor zurückgeschnitten
+# - Datensätze, die nicht mehr lesbar sind (Ende eines defekten Bereichs),
+#   werden beim Öffnen abgeschnitten; die Datei bleibt vorher als
+#   <journal>.bad erhalten
+# - Texte (Grund, Lesegerät, Team, Kartentyp, Code) stehen nur einmal als
+#   eigener Datensatz im Journal, Scans verweisen per Nummer darauf
+# - der eingespielte Stand steht in derselben Transaktion in meta
+#   (journal = "<id>:<offset>") -> ein Absturz beim Einspielen erzeugt
+#   keine doppelten Scans
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m db.journal                 # Inhalt des Journals anzeigen
+#   python -m db.journal --replay        # Journal jetzt einspielen (App beendet)
+
+import argparse
+import os
+import struct
+import uuid
+import zlib
+from datetime import datetime
+
+from db.database import (
+    DB_PATH, UNKNOWN_WINDOW_SECONDS, count_unknown_scans, get_meta, log_entries, set_meta,
+)
+
+# Größe eines Datensatzes (Bytes); Texte belegen mehrere davon
+RECORD_SIZE = 48
+
+# Datensätze pro Transaktion beim Einspielen
+REPLAY_CHUNK = 2000
+
+_MAGIC = b"GATEJRN1"
+_TEXT, _SCAN, _UNKNOWN = 1, 2, 3
+# Scan: Typ, UID-Länge (0xFF = UID als Text), UID, erlaubt, Zeit (µs), Textnummern
+# für Grund, Lesegerät, Team, Kartentyp, Code
+_SCAN_RECORD = struct.Struct("<BB10sBq5H")
+# Text: Typ, Nummer, Länge in Bytes; der Text folgt in den nächsten Datensätzen
+_TEXT_RECORD = struct.Struct("<BHH")
+_CRC_AT = RECORD_SIZE - 4
+
+
+class JournalError(Exception):
+    """Journal enthält nicht lesbare Datensätze (siehe ScanJournal.pending)."""
+
+
+def journal_path(db_path=DB_PATH):
+    """Pfad des Journals neben der DB (cards.db -> cards.journal)."""
+    return os.path.splitext(db_path)[0] + ".journal"
+
+
+def _to_us(iso):
+    ts = datetime.fromisoformat(iso)
+    return int(ts.timestamp()) * 1_000_000 + ts.microsecond
+
+
+def _from_us(us):
+    return datetime.fromtimestamp(us // 1_000_000).replace(microsecond=us % 1_000_000)
+
+
+class ScanJournal:
+    """
+    Journal für Scans, die (noch) nicht in entries stehen.
+    append() nimmt Zeilen wie entry_row() bzw. unknown_row() entgegen,
+    replay() spielt sie in die DB ein und leert das Journal danach.
+    Nicht thread-sicher: wird nur vom Thread des EntryWriters benutzt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0            # Scans im Journal
+        self._texts = {None: 0}     # Text -> Nummer (0 = None)
+        self._file = None
+        self._open()
+
+    def __len__(self):
+        return self.records
+
+    def _open(self):
+        """Öffnet bzw. legt das Journal an und liest Texte und Anzahl Scans ein."""
+        self.records = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if data[:8] == _MAGIC:
+                self.id = data[8:40].decode("ascii")
+                end = RECORD_SIZE
+                for end, kind, _ in self._records(data):
+                    if kind is not None:
+                        self.records += 1
+                if len(data) - end >= RECORD_SIZE:
+                    # mehr als ein halber Datensatz: defekt, nicht nur abgebrochen
+                    with open(self.path + ".bad", "wb") as f:
+                        f.write(data)
+                    print(f"Journal ab Byte {end} nicht lesbar, Kopie unter {self.path}.bad")
+                self._file = open(self.path, "r+b", buffering=0)
+                self._file.truncate(end)        # halb geschriebenen Rest abschneiden
+                self._file.seek(end)
+                return
+        self._create()
+
+    def _create(self):
+        self.id = uuid.uuid4().hex
+        header = (_MAGIC + self.id.encode("ascii")).ljust(RECORD_SIZE, b"\0")
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "r+b", buffering=0)
+        self._file.seek(RECORD_SIZE)
+        self._texts = {None: 0}
+        self.records = 0
+
+    def _records(self, data):
+        """
+        Liest alle gültigen Datensätze ab dem Kopf und baut die Texttabelle auf.
+        Liefert (Ende, Typ, Zeile) je Scan, für Texte (Ende, None, None).
+        Endet beim ersten ungültigen Datensatz (CRC falsch, unbekannter Text).
+        """
+        texts = {0: None}
+        self._texts = {None: 0}
+        pos = RECORD_SIZE
+        while pos + RECORD_SIZE <= len(data):
+            slot = data[pos:pos + RECORD_SIZE]
+            kind = slot[0]
+            if kind == _TEXT:
+                _, number, length = _TEXT_RECORD.unpack_from(slot)
+                size = -(-length // RECORD_SIZE) * RECORD_SIZE
+                body = data[pos + RECORD_SIZE:pos + RECORD_SIZE + size]
+                if len(body) < size or zlib.crc32(slot[:_CRC_AT] + body) != _crc(slot):
+                    return
+                try:
+                    text = body[:length].decode("utf-8")
+                except UnicodeDecodeError:
+                    return
+                texts[number] = text
+                self._texts[text] = number
+                pos += RECORD_SIZE + size
+                yield pos, None, None
+            elif kind in (_SCAN, _UNKNOWN):
+                if zlib.crc32(slot[:_CRC_AT]) != _crc(slot):
+                    return
+                _, uid_len, uid_raw, allowed, ts_us, *ids = _SCAN_RECORD.unpack_from(slot)
+                uid_ref = int.from_bytes(uid_raw[:2], "little") if uid_len == 0xFF else None
+                if any(i not in texts for i in ids) or (uid_ref is not None and uid_ref not in texts):
+                    return
+                uid = texts[uid_ref] if uid_ref is not None else uid_raw[:uid_len].hex().upper()
+                reason, reader, team, card_type, code = (texts[i] for i in ids)
+                pos += RECORD_SIZE
+                yield pos, kind, (uid, allowed, ts_us, reason, reader, team, card_type, code)
+            else:
+                return
+
+    def _text(self, value, out):
+        """Nummer eines Textes; neue Texte werden als Datensatz an `out` angehängt."""
+        number = self._texts.get(value)
+        if number is None:
+            number = len(self._texts)
+            body = str(value).encode("utf-8")
+            padded = body.ljust(-(-len(body) // RECORD_SIZE) * RECORD_SIZE, b"\0")
+            head = _TEXT_RECORD.pack(_TEXT, number, len(body)).ljust(_CRC_AT, b"\0")
+            out += head + struct.pack("<I", zlib.crc32(head + padded)) + padded
+            self._texts[value] = number
+        return number
+
+    def _scan(self, kind, uid, allowed, ts_us, texts, out):
+        try:
+            raw = bytes.fromhex(uid)
+        except (TypeError, ValueError):
+            raw = b""
+        if 0 < len(raw) <= 10:
+            uid_len, uid_raw = len(raw), raw
+        else:
+            uid_len, uid_raw = 0xFF, self._text(uid, out).to_bytes(2, "little")
+        ids = [self._text(t, out) for t in texts]
+        head = _SCAN_RECORD.pack(kind, uid_len, uid_raw, allowed, ts_us, *ids).ljust(_CRC_AT, b"\0")
+        out += head + struct.pack("<I", zlib.crc32(head))
+
+    def append(self, entries=(), unknown=()):
+        """
+        Hängt Scans an und schreibt sie per fsync auf die Karte (ein Aufruf pro Batch).
+        - entries: Zeilen wie entry_row()
+        - unknown: Zeilen wie unknown_row()
+        Schlägt das fehl, wird die Exception weitergereicht und das Journal
+        ist wieder auf dem Stand vor dem Aufruf (auch die Texttabelle).
+        """
+        if self._file is None:
+            self._open()        # nach einem fehlgeschlagenen Zurückschneiden
+        pos = self._file.tell()
+        known = len(self._texts)
+        try:
+            out = bytearray()
+            for uid, iso, _ts_ms, allowed, reason, reader, team, card_type, code in entries:
+                self._scan(_SCAN, uid, allowed, _to_us(iso), (reason, reader, team, card_type, code), out)
+            for uid, _window_ms, reader, ts_ms in unknown:
+                self._scan(_UNKNOWN, uid, 0, ts_ms * 1000, (None, reader, None, None, None), out)
+            view = memoryview(out)
+            while view:
+                view = view[self._file.write(view):]   # ungepuffert: evtl. nur teilweise
+            os.fsync(self._file.fileno())
+        except BaseException:
+            self._rollback(pos, known)
+            raise
+        self.records += len(entries) + len(unknown)
+
+    def _rollback(self, pos, known):
+        """Nimmt einen fehlgeschlagenen append() zurück (Datei ab `pos`, neue Texte)."""
+        self._texts = {text: n for text, n in self._texts.items() if n < known}
+        try:
+            self._file.truncate(pos)
+            self._file.seek(pos)
+        except OSError as e:
+            # Datei beim nächsten append() neu einlesen (_open schneidet den Rest ab)
+            print(f"Journal nicht zurückgeschnitten: {e}")
+            self.close()
+
+    def pending(self):
+        """
+        Liest alle Scans im Journal. Rückgabe: Liste von (Ende, Typ, Zeile)
+        JournalError, wenn hinter den lesbaren Datensätzen noch Daten stehen
+        (Datei beschädigt, seit sie geöffnet wurde).
+        """
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = RECORD_SIZE
+        records = []
+        for record in self._records(data):
+            end = record[0]
+            if record[1] is not None:
+                records.append(record)
+        if end < len(data):
+            raise JournalError(f"{self.path}: nicht lesbar ab Byte {end}")
+        return records
+
+    def replay(self, db, chunk=REPLAY_CHUNK):
+        """
+        Spielt das Journal blockweise in entries/unknown_scans ein und legt
+        danach ein neues, leeres Journal an. Bricht bei einem DB-Fehler ab
+        (sqlite3.Error wird weitergereicht), bereits eingespielte Blöcke
+        werden beim nächsten Versuch übersprungen. JournalError siehe pending().
+        Rückgabe: Anzahl eingespielter Scans
+        """
+        records = self.pending()
+        with db.writer() as conn:
+            done_id, _, done = (get_meta(conn, "journal") or "::").partition(":")
+        start = int(done) if done_id == self.id and done else 0
+        records = [r for r in records if r[0] > start]
+        window = UNKNOWN_WINDOW_SECONDS * 1000
+        for i in range(0, len(records), chunk):
+            block = records[i:i + chunk]
+            entries = []
+            unknown = []
+            for _, kind, (uid, allowed, ts_us, reason, reader, team, card_type, code) in block:
+                ts = _from_us(ts_us)
+                ts_ms = int(ts.timestamp() * 1000)
+                if kind == _SCAN:
+                    entries.append((uid, ts.isoformat(), ts_ms, allowed, reason, reader,
+                                    team, card_type, code))
+                else:
+                    unknown.append((uid, ts_ms - ts_ms % window, reader or "", ts_ms))
+            with db.writer() as conn:
+                if entries:
+                    log_entries(conn, entries)
+                if unknown:
+                    count_unknown_scans(conn, unknown)
+                set_meta(conn, "journal", f"{self.id}:{block[-1][0]}")
+        self.close()
+        self._create()
+        return len(records)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _crc(slot):
+    return struct.unpack_from("<I", slot, _CRC_AT)[0]
+
+
+def main():
+    from db.database import Database
+
+    parser = argparse.ArgumentParser(description="Journal des Notbetriebs anzeigen/einspielen")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    parser.add_argument("--replay", action="store_true", help="Journal in die DB einspielen")
+    args = parser.parse_args()
+
+    path = journal_path(args.db)
+    if not os.path.exists(path):
+        print(f"kein Journal unter {path}")
+        return
+    journal = ScanJournal(path)
+    if args.replay:
+        db = Database(args.db)
+        print(f"{journal.replay(db)} Scans eingespielt")
+        db.close()
+    else:
+        for _, kind, (uid, allowed, ts_us, reason, reader, *_rest) in journal.pending():
+            label = "unbekannt" if kind == _UNKNOWN else ("erlaubt" if allowed else "verweigert")
+            print(f"{_from_us(ts_us).isoformat(sep=' ')}  {uid:<20} {label:<10} {reader or '-'}  {reason or ''}")
+        print(f"{len(journal)} Scans im Journal {journal.id}")
+    journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# db/reports.py
+# Auswertungen über das Scan-Log (entries), z.B. "wie viele Dauerkarten-
+# Inhaber waren beim Spiel am Samstag da?".
+# Grundlage ist die vorverdichtete Tabelle entry_rollup (Anzahl Scans pro
+# Tag, Stunde, Team, Kartentyp, Lesegerät und Ergebnis), die ein Trigger bei
+# jedem neuen Eintrag mitzählt -> Abfragen lesen wenige hundert Zeilen statt
+# der ganzen Saison und laufen über eine eigene Leseverbindung, ohne die
+# Scans am Gate zu bremsen.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m db.reports attendance --day 2026-03-14 --card-type Dauerkarte
+#   python -m db.reports attendance --day 2026-03-14 --team "1. Herren" --distinct
+#   python -m db.reports summary --from 2026-03-14
+#   python -m db.reports hourly --day 2026-03-14
+#   python -m db.reports denials --from 2026-03-01 --to 2026-03-31
+#   python -m db.reports unknown --from 2026-03-14     # häufigste unbekannte Karten
+#   python -m db.reports alerts --from 2026-03-14 --open   # Auffälligkeiten (fraud.py)
+#   python -m db.reports review 12 13       # Auffälligkeiten als erledigt markieren
+#   python -m db.reports rebuild            # entry_rollup aus entries neu berechnen
+
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from db.database import DB_PATH, Database, from_ms, get_meta, rebuild_rollups, to_ms
+from db.retention import ARCHIVE_DIR, archive_path, season_name
+
+# Ergebnis-Code eines regulären Zutritts (siehe decision.CODE_OK). Erneute
+# Scans in der Schutzfrist (grace) zählen nicht als weiterer Besucher.
+ADMISSION_CODE = "ok"
+
+
+def _filters(day_from, day_to, team=None, card_type=None, reader=None):
+    """Baut WHERE-Klausel und Parameter für Abfragen auf entry_rollup."""
+    clauses = ["day BETWEEN ? AND ?"]
+    params = [str(day_from), str(day_to or day_from)]
+    for column, value in (("team", team), ("card_type", card_type), ("reader", reader)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+def attendance(conn, day, team=None, card_type=None, reader=None, distinct=False,
+               archive_dir=ARCHIVE_DIR):
+    """
+    Anzahl Zutritte an einem Spieltag.
+    Parameter:
+    - day:       Spieltag (date oder "YYYY-MM-DD")
+    - team / card_type / reader: optional filtern (None = alle)
+    - distinct:  True -> verschiedene Karten zählen statt Zutritte (wer in
+                 der Halbzeit raus und nach Ablauf des Sperrfensters wieder
+                 rein geht, zählt dann nur einmal). Liest die Scans des
+                 Tages über den Zeit-Index statt entry_rollup, bei
+                 archivierten Tagen zusätzlich aus dem Saison-Archiv.
+    - archive_dir: Ordner der Archiv-DBs (siehe db/retention.py)
+    Rückgabe: int
+    ValueError, wenn der Tag archiviert ist und das Archiv fehlt.
+    """
+    if distinct:
+        start = datetime.fromisoformat(str(day))
+        where = "ts_ms >= ? AND ts_ms < ? AND allowed = 1 AND code = ?"
+        params = [to_ms(start), to_ms(start + timedelta(days=1)), ADMISSION_CODE]
+        for column, value in (("team", team), ("card_type", card_type), ("reader", reader)):
+            if value is not None:
+                where += f" AND {column} = ?"
+                params.append(value)
+        if str(start.date()) >= (get_meta(conn, "archived_until") or ""):
+            return conn.execute(
+                f"SELECT COUNT(DISTINCT uid) FROM entries WHERE {where}", params
+            ).fetchone()[0]
+        # Archivierter Tag: Scans liegen im Archiv (während eines Laufs evtl.
+        # noch teilweise in entries)
+        path = archive_path(season_name(start.date()), archive_dir)
+        if not os.path.exists(path):
+            raise ValueError(f"{start.date()} ist archiviert, Archiv {path} fehlt")
+        conn.execute("ATTACH DATABASE ? AS season", (path,))
+        try:
+            return conn.execute(
+                f"""
+                SELECT COUNT(DISTINCT uid) FROM (
+                    SELECT uid FROM entries WHERE {where}
+                    UNION ALL
+                    SELECT uid FROM season.entries WHERE {where}
+                )
+                """,
+                params + params,
+            ).fetchone()[0]
+        finally:
+            conn.execute("DETACH DATABASE season")
+
+    where, params = _filters(day, day, team, card_type, reader)
+    row = conn.execute(
+        f"SELECT COALESCE(SUM(count), 0) FROM entry_rollup WHERE {where} AND code = ?",
+        params + [ADMISSION_CODE],
+    ).fetchone()
+    return row[0]
+
+
+def summary(conn, day_from, day_to=None, team=None, card_type=None, reader=None):
+    """
+    Scans pro Tag, Team, Kartentyp und Lesegerät im Zeitraum.
+    Rückgabe: Liste von (day, team, card_type, reader, zutritte, verweigert, scans)
+    """
+    where, params = _filters(day_from, day_to, team, card_type, reader)
+    return conn.execute(
+        f"""
+        SELECT day, team, card_type, reader,
+               SUM(CASE WHEN code = ? THEN count ELSE 0 END),
+               SUM(CASE WHEN allowed = 0 THEN count ELSE 0 END),
+               SUM(count)
+        FROM entry_rollup WHERE {where}
+        GROUP BY day, team, card_type, reader
+        ORDER BY day, team, card_type, reader
+        """,
+        [ADMISSION_CODE] + params,
+    ).fetchall()
+
+
+def hourly(conn, day, team=None, card_type=None, reader=None):
+    """
+    Zutritte und Verweigerungen pro Stunde an einem Tag (Einlass-Verlauf).
+    Rückgabe: Liste von (stunde, zutritte, verweigert)
+    """
+    where, params = _filters(day, day, team, card_type, reader)
+    return conn.execute(
+        f"""
+        SELECT hour,
+               SUM(CASE WHEN code = ? THEN count ELSE 0 END),
+               SUM(CASE WHEN allowed = 0 THEN count ELSE 0 END)
+        FROM entry_rollup WHERE {where}
+        GROUP BY hour ORDER BY hour
+        """,
+        [ADMISSION_CODE] + params,
+    ).fetchall()
+
+
+def denials(conn, day_from, day_to=None, team=None, card_type=None, reader=None):
+    """
+    Verweigerungen nach Ergebnis-Code im Zeitraum, häufigste zuerst.
+    Rückgabe: Liste von (code, anzahl)
+    """
+    where, params = _filters(day_from, day_to, team, card_type, reader)
+    return conn.execute(
+        f"""
+        SELECT code, SUM(count) AS n FROM entry_rollup
+        WHERE {where} AND allowed = 0
+        GROUP BY code ORDER BY n DESC
+        """,
+        params,
+    ).fetchall()
+
+
+def unknown_cards(conn, day_from, day_to=None, reader=None, limit=20):
+    """
+    Häufigste unbekannte Karten im Zeitraum aus unknown_scans (dort zählt
+    jeder Scan, in entries/entry_rollup nur der erste pro UID und Minute).
+    Rückgabe: Liste von (uid, scans, letzter Scan als datetime)
+    """
+    start = to_ms(datetime.combine(date.fromisoformat(str(day_from)), datetime.min.time()))
+    end = to_ms(datetime.combine(date.fromisoformat(str(day_to or day_from)) + timedelta(days=1),
+                                 datetime.min.time()))
+    clauses = "window_ms >= ? AND window_ms < ?" + (" AND reader = ?" if reader is not None else "")
+    params = [start, end] + ([reader] if reader is not None else [])
+    rows = conn.execute(
+        f"""
+        SELECT uid, SUM(count) AS n, MAX(last_ms) FROM unknown_scans
+        WHERE {clauses}
+        GROUP BY uid ORDER BY n DESC LIMIT ?
+        """,
+        params + [limit],
+    ).fetchall()
+    return [(uid, n, from_ms(last)) for uid, n, last in rows]
+
+
+def fraud_alerts(conn, day_from, day_to=None, rule=None, open_only=False):
+    """
+    Auffälligkeiten aus fraud_alerts im Zeitraum (neueste zuerst).
+    Rückgabe: Liste von (id, Zeitpunkt als datetime, Regel, UID, Lesegerät,
+    Kartentyp, Beschreibung, erledigt)
+    """
+    start = to_ms(datetime.combine(date.fromisoformat(str(day_from)), datetime.min.time()))
+    end = to_ms(datetime.combine(date.fromisoformat(str(day_to or day_from)) + timedelta(days=1),
+                                 datetime.min.time()))
+    clauses = ["ts_ms >= ?", "ts_ms < ?"]
+    params = [start, end]
+    if rule is not None:
+        clauses.append("rule = ?")
+        params.append(rule)
+    if open_only:
+        clauses.append("reviewed = 0")
+    rows = conn.execute(
+        f"""
+        SELECT id, ts_ms, rule, uid, reader, card_type, detail, reviewed FROM fraud_alerts
+        WHERE {" AND ".join(clauses)} ORDER BY ts_ms DESC
+        """,
+        params,
+    ).fetchall()
+    return [(i, from_ms(ts), *rest) for i, ts, *rest in rows]
+
+
+def _print_table(header, rows):
+    rows = [[("-" if v in ("", None) else str(v)) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(r[i]) for r in rows]) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auswertungen über das Scan-Log")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_filters(p, period):
+        if period:
+            p.add_argument("--from", dest="day_from", default=date.today().isoformat())
+            p.add_argument("--to", dest="day_to")
+        else:
+            p.add_argument("--day", default=date.today().isoformat())
+        p.add_argument("--team")
+        p.add_argument("--card-type")
+        p.add_argument("--reader")
+
+    p = sub.add_parser("attendance", help="Zutritte an einem Spieltag")
+    add_filters(p, period=False)
+    p.add_argument("--distinct", action="store_true", help="verschiedene Karten zählen")
+    p = sub.add_parser("summary", help="Scans pro Tag/Team/Kartentyp/Lesegerät")
+    add_filters(p, period=True)
+    p = sub.add_parser("hourly", help="Einlass-Verlauf pro Stunde")
+    add_filters(p, period=False)
+    p = sub.add_parser("denials", help="Verweigerungen nach Grund")
+    add_filters(p, period=True)
+    p = sub.add_parser("unknown", help="häufigste unbekannte Karten")
+    p.add_argument("--from", dest="day_from", default=date.today().isoformat())
+    p.add_argument("--to", dest="day_to")
+    p.add_argument("--reader")
+    p.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("alerts", help="Auffälligkeiten der Missbrauchserkennung")
+    p.add_argument("--from", dest="day_from", default=date.today().isoformat())
+    p.add_argument("--to", dest="day_to")
+    p.add_argument("--rule")
+    p.add_argument("--open", action="store_true", help="nur noch nicht erledigte")
+    p = sub.add_parser("review", help="Auffälligkeiten als erledigt markieren")
+    p.add_argument("ids", type=int, nargs="+")
+    p = sub.add_parser("rebuild", help="entry_rollup aus entries neu berechnen")
+    p.add_argument("--from", dest="day_from", help="nur ab diesem Tag")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    conn = db.reader()
+    filters = dict(team=args.team, card_type=args.card_type, reader=args.reader) \
+        if args.command not in ("rebuild", "unknown", "alerts", "review") else {}
+    if args.command == "attendance":
+        try:
+            print(attendance(conn, args.day, distinct=args.distinct, **filters))
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "summary":
+        _print_table(
+            ["Tag", "Team", "Kartentyp", "Lesegerät", "Zutritte", "Verweigert", "Scans"],
+            summary(conn, args.day_from, args.day_to, **filters),
+        )
+    elif args.command == "hourly":
+        _print_table(["Stunde", "Zutritte", "Verweigert"], hourly(conn, args.day, **filters))
+    elif args.command == "denials":
+        _print_table(["Grund", "Anzahl"], denials(conn, args.day_from, args.day_to, **filters))
+    elif args.command == "unknown":
+        _print_table(["UID", "Scans", "Zuletzt"],
+                     unknown_cards(conn, args.day_from, args.day_to, args.reader, args.limit))
+    elif args.command == "alerts":
+        _print_table(
+            ["ID", "Zeit", "Regel", "UID", "Lesegerät", "Kartentyp", "Beschreibung", "Erledigt"],
+            [(i, ts.isoformat(sep=" ", timespec="seconds"), *rest[:-1], "ja" if rest[-1] else "")
+             for i, ts, *rest in fraud_alerts(conn, args.day_from, args.day_to, args.rule, args.open)],
+        )
+    elif args.command == "review":
+        with db.writer() as wconn:
+            wconn.executemany("UPDATE fraud_alerts SET reviewed = 1 WHERE id = ?",
+                              [(i,) for i in args.ids])
+        print(f"{len(args.ids)} Auffälligkeiten erledigt")
+    else:
+        with db.writer() as wconn:
+            rebuild_rollups(wconn, args.day_from)
+        print("entry_rollup neu berechnet")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# db/retention.py
+# Aufbewahrung des Scan-Logs: entries hält nur die letzten Saisons ("heißes
+# Fenster"), ältere Scans wandern in eine Archiv-DB pro Saison
+# (db/archive/entries-2024-25.db), danach wird der frei gewordene Platz
+# schrittweise an die SD-Karte zurückgegeben.
+# - läuft im Hintergrund in kleinen Transaktionen mit Pausen dazwischen ->
+#   der Log-Thread der Scans wartet höchstens auf einen Block
+# - entry_rollup wird beim Archivieren nicht verändert, Auswertungen
+#   (db/reports.py) zählen archivierte Tage also weiter mit
+# - Archive haben dieselben Tabellen entries und cards (Kartendaten zum
+#   Zeitpunkt der Archivierung), Export mit: python -m db.export ... --archive 2024-25
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m db.retention run                  # archivieren + Platz freigeben
+#   python -m db.retention run --keep-seasons 2
+#   python -m db.retention check                # Integritätsprüfung (DB + Archive)
+#   python -m db.retention vacuum --full        # einmalig für alte DBs, nur bei beendeter App!
+
+import argparse
+import glob
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from db.database import DB_PATH, Database, connect, from_ms, get_meta, set_meta, to_ms
+
+# Saison beginnt am 1. Juli
+SEASON_START_MONTH = 7
+
+# So viele Saisons (inkl. der laufenden) bleiben in entries
+RETENTION_KEEP_SEASONS = 1
+
+# Ordner für die Archiv-Dateien
+ARCHIVE_DIR = os.path.join(os.path.dirname(DB_PATH), "archive")
+
+# Zeilen pro Archivierungs-Transaktion und Pause dazwischen (Sekunden)
+ARCHIVE_BATCH_SIZE = 2000
+BATCH_PAUSE = 0.05
+
+# Seiten pro incremental_vacuum-Schritt (bei 4 KiB-Seiten 1 MiB)
+VACUUM_STEP_PAGES = 256
+
+# Spalten von entries (Live-DB und Archiv)
+ENTRY_COLUMNS = (
+    "id, uid, timestamp, ts_ms, allowed, reason, reader, team, card_type, code, node, origin_id"
+)
+CARD_COLUMNS = "uid, name, card_type, valid_from, valid_until, teams, notes"
+
+
+def season_start(day):
+    """Erster Tag der Saison, in der `day` liegt (date)."""
+    year = day.year if day.month >= SEASON_START_MONTH else day.year - 1
+    return date(year, SEASON_START_MONTH, 1)
+
+
+def season_name(day):
+    """Name der Saison, z.B. "2025-26"."""
+    start = season_start(day)
+    return f"{start.year}-{(start.year + 1) % 100:02d}"
+
+
+def archive_path(season, archive_dir=ARCHIVE_DIR):
+    """Pfad der Archiv-DB einer Saison ("2024-25")."""
+    return os.path.join(archive_dir, f"entries-{season}.db")
+
+
+def retention_cutoff(today, keep_seasons=RETENTION_KEEP_SEASONS):
+    """
+    Scans vor diesem Tag werden archiviert (Beginn der ältesten behaltenen Saison).
+    keep_seasons < 1 -> ValueError (die laufende Saison wird nie archiviert)
+    """
+    if keep_seasons < 1:
+        raise ValueError(f"keep_seasons muss mindestens 1 sein, nicht {keep_seasons}")
+    start = season_start(today)
+    return start.replace(year=start.year - (keep_seasons - 1))
+
+
+def _create_archive_schema(conn):
+    """Tabellen der angehängten Archiv-DB (Schema "archive")."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive.entries (
+            id INTEGER PRIMARY KEY, uid TEXT, timestamp TEXT, ts_ms INTEGER,
+            allowed INTEGER, reason TEXT, reader TEXT, team TEXT, card_type TEXT,
+            code TEXT, node TEXT, origin_id INTEGER
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_entries_ts ON entries(ts_ms)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive.cards (
+            id INTEGER PRIMARY KEY, uid TEXT UNIQUE, name TEXT, card_type TEXT,
+            valid_from TEXT, valid_until TEXT, teams TEXT, notes TEXT
+        )
+        """
+    )
+
+
+def archive_batch(db, cutoff_ms, archive_dir=ARCHIVE_DIR, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Verschiebt die ältesten Scans (ts_ms < cutoff_ms, höchstens `batch_size`,
+    alle aus derselben Saison) in die Archiv-DB ihrer Saison.
+    Der Scan mit der höchsten id bleibt immer stehen, damit SQLite keine ids
+    neu vergibt (die Sync-Gegenstellen merken sich die letzte id).
+    Rückgabe: Anzahl verschobener Scans (0 = nichts mehr zu tun)
+    """
+    row = db.reader().execute(
+        "SELECT MIN(ts_ms) FROM entries WHERE ts_ms < ?", (cutoff_ms,)
+    ).fetchone()
+    if row[0] is None:
+        return 0
+    season = season_start(from_ms(row[0]).date())
+    next_season = season.replace(year=season.year + 1)
+    upper_ms = min(cutoff_ms, to_ms(datetime.combine(next_season, datetime.min.time())))
+    os.makedirs(archive_dir, exist_ok=True)
+
+    with db.writer() as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(season_name(season), archive_dir),))
+        try:
+            _create_archive_schema(conn)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM archive_ids")
+            conn.execute(
+                """
+                INSERT INTO archive_ids
+                SELECT id FROM entries
+                WHERE ts_ms < ? AND id < (SELECT MAX(id) FROM entries)
+                ORDER BY ts_ms LIMIT ?
+                """,
+                (upper_ms, batch_size),
+            )
+            # OR IGNORE: Archiv und Live-DB werden getrennt committet; nach
+            # einem Absturz dazwischen stehen Scans schon im Archiv
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO archive.entries({ENTRY_COLUMNS})
+                SELECT {ENTRY_COLUMNS} FROM entries WHERE id IN (SELECT id FROM archive_ids)
+                """
+            )
+            conn.execute(
+                f"""
+                INSERT OR REPLACE INTO archive.cards({CARD_COLUMNS})
+                SELECT {CARD_COLUMNS} FROM cards
+                WHERE uid IN (SELECT e.uid FROM entries e JOIN archive_ids a ON a.id = e.id)
+                """
+            )
+            moved = conn.execute(
+                "DELETE FROM entries WHERE id IN (SELECT id FROM archive_ids)"
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE archive")
+    return moved
+
+
+def incremental_vacuum(db, max_steps=None, pause=BATCH_PAUSE, stop_event=None):
+    """
+    Gibt freie Seiten in kleinen Schritten an das Dateisystem zurück
+    (nur bei auto_vacuum=INCREMENTAL, ältere DBs siehe full_vacuum()).
+    Bricht nach dem laufenden Schritt ab, sobald `stop_event` gesetzt wird.
+    Rückgabe: Anzahl freigegebener Seiten
+    """
+    reader = db.reader()
+    if reader.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    before = free = reader.execute("PRAGMA freelist_count").fetchone()[0]
+    steps = 0
+    while free and (max_steps is None or steps < max_steps):
+        if stop_event and stop_event.is_set():
+            break
+        with db.writer() as conn:
+            # executescript statt execute: sqlite3 führt das PRAGMA sonst nur
+            # einen Schritt weit aus (= eine Seite)
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+        free = reader.execute("PRAGMA freelist_count").fetchone()[0]
+        steps += 1
+        time.sleep(pause)
+    with db.writer() as conn:
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return before - free
+
+
+def full_vacuum(path):
+    """
+    Schreibt die ganze DB neu und schaltet dabei auf auto_vacuum=INCREMENTAL
+    um (einmalig für DBs aus älteren Versionen). Braucht die DB für sich
+    allein -> App vorher beenden. Im WAL-Modus lässt SQLite auto_vacuum nicht
+    umstellen, daher kurz zurück in den Rollback-Journal-Modus.
+    """
+    conn = connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE").fetchall()
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.execute("PRAGMA journal_mode=WAL").fetchall()
+    finally:
+        conn.close()
+
+
+def check_integrity(path, full=False):
+    """
+    Prüft eine DB-Datei (Live-DB oder Archiv) über eine Leseverbindung.
+    full=False: PRAGMA quick_check (schnell), True: PRAGMA integrity_check
+    (prüft zusätzlich die Indizes, dauert bei großen DBs länger).
+    Rückgabe: Liste von Fehlermeldungen (leer = in Ordnung)
+    """
+    conn = connect(path, readonly=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check").fetchall()
+    finally:
+        conn.close()
+    return [msg for (msg,) in rows if msg != "ok"]
+
+
+def run_retention(db, today=None, keep_seasons=RETENTION_KEEP_SEASONS,
+                  archive_dir=ARCHIVE_DIR, stop_event=None):
+    """
+    Archiviert alle Scans vor retention_cutoff() blockweise und gibt danach
+    den Platz frei. Bricht ab, sobald `stop_event` gesetzt wird.
+    keep_seasons < 1 -> ValueError, bevor etwas geändert wird.
+    Rückgabe: (archivierte Scans, freigegebene Seiten)
+    """
+    cutoff = retention_cutoff(today or date.today(), keep_seasons)
+    with db.writer() as conn:
+        # vorher setzen: rebuild_rollups darf archivierte Tage nicht neu zählen
+        if (get_meta(conn, "archived_until") or "") < cutoff.isoformat():
+            set_meta(conn, "archived_until", cutoff.isoformat())
+    cutoff_ms = to_ms(datetime.combine(cutoff, datetime.min.time()))
+    moved = 0
+    while not (stop_event and stop_event.is_set()):
+        n = archive_batch(db, cutoff_ms, archive_dir)
+        if not n:
+            break
+        moved += n
+        time.sleep(BATCH_PAUSE)
+    with db.writer() as conn:
+        # Zähler unbekannter Karten werden nicht archiviert
+        conn.execute("DELETE FROM unknown_scans WHERE window_ms < ?", (cutoff_ms,))
+    freed = incremental_vacuum(db, stop_event=stop_event) if moved else 0
+    return moved, freed
+
+
+class RetentionWorker(threading.Thread):
+    """
+    Führt run_retention() im Hintergrund aus: kurz nach dem Start und dann
+    alle `interval` Sekunden (Standard: täglich).
+    - status: letztes Ergebnis für Anzeige/Diagnose
+    """
+
+    def __init__(self, db, keep_seasons=RETENTION_KEEP_SEASONS, interval=24 * 3600,
+                 initial_delay=300, archive_dir=ARCHIVE_DIR):
+        retention_cutoff(date.today(), keep_seasons)  # ValueError schon beim Anlegen
+        super().__init__(daemon=True, name="RetentionWorker")
+        self.db = db
+        self.keep_seasons = keep_seasons
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.archive_dir = archive_dir
+        self.stop_event = threading.Event()
+        self.status = "noch nicht gelaufen"
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        delay = self.initial_delay
+        while not self.stop_event.wait(delay):
+            try:
+                moved, freed = run_retention(
+                    self.db, keep_seasons=self.keep_seasons,
+                    archive_dir=self.archive_dir, stop_event=self.stop_event,
+                )
+                self.status = f"{moved} Scans archiviert, {freed} Seiten freigegeben"
+            except Exception as e:  # nächster Versuch beim nächsten Lauf
+                self.status = f"Fehler: {e}"
+            delay = self.interval
+
+
+def _keep_seasons(value):
+    """--keep-seasons: ganze Zahl >= 1."""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError("mindestens 1 (die laufende Saison bleibt immer)")
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aufbewahrung und Archivierung des Scan-Logs")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="alte Saisons archivieren und Platz freigeben")
+    p.add_argument("--keep-seasons", type=_keep_seasons, default=RETENTION_KEEP_SEASONS)
+    p = sub.add_parser("check", help="Integritätsprüfung von DB und Archiven")
+    p.add_argument("--full", action="store_true", help="integrity_check statt quick_check")
+    p = sub.add_parser("vacuum", help="freie Seiten zurückgeben")
+    p.add_argument("--full", action="store_true", help="komplettes VACUUM (blockiert!)")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        ok = True
+        for path in [args.db] + sorted(glob.glob(os.path.join(args.archive_dir, "entries-*.db"))):
+            problems = check_integrity(path, full=args.full)
+            ok = ok and not problems
+            print(f"{path}: {'ok' if not problems else '; '.join(problems)}")
+        raise SystemExit(0 if ok else 1)
+
+    if args.command == "vacuum" and args.full:
+        full_vacuum(args.db)
+        print("VACUUM fertig (auto_vacuum=INCREMENTAL)")
+        return
+
+    db = Database(args.db)
+    try:
+        if args.command == "run":
+            moved, freed = run_retention(db, keep_seasons=args.keep_seasons, archive_dir=args.archive_dir)
+            print(f"{moved} Scans archiviert, {freed} Seiten freigegeben")
+        else:
+            print(f"{incremental_vacuum(db)} Seiten freigegeben")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# decision.py
+# Zutrittsentscheidung ohne Seiteneffekte (keine UI, keine DB).
+# Bekommt Karte, letzten erlaubten Zutritt, Team und Uhrzeit und liefert ein
+# Verdict zurück. Damit lässt sich die Entscheidung headless testen, messen
+# und eine ganze Saison an Scans in Sekunden nachspielen.
+
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+
+from db.card_index import INVALID_DATE, norm_team, team_bit
+
+# Ergebnis-Codes (stabil, für Logs und Auswertungen)
+CODE_OK = "ok"                      # Zutritt erlaubt
+CODE_GRACE = "grace"                # erneuter Scan in der Schutzfrist -> erlaubt
+CODE_UNKNOWN = "unknown"            # Karte nicht registriert
+CODE_NOT_YET_VALID = "not_yet_valid"
+CODE_EXPIRED = "expired"
+CODE_INVALID_DATE = "invalid_date"
+CODE_TEAM = "team"                  # keine Berechtigung für das Team
+CODE_REUSED = "reused"              # innerhalb des Sperrfensters schon benutzt
+
+# Ergebnis einer Entscheidung:
+# - allowed:    True/False
+# - code:       Ergebnis-Code (bei mehreren Gründen der erste)
+# - reasons:    Gründe für die Anzeige (leer bei Zutritt)
+# - log_reason: Text für entries.reason
+# - card:       IndexedCard oder None (unbekannte Karte)
+# - minutes:    bei CODE_REUSED: vor wie vielen Minuten zuletzt benutzt
+Verdict = namedtuple("Verdict", "allowed code reasons log_reason card minutes")
+
+
+# Max. Einträge im Gültigkeits-Cache (pro Team und Tag, siehe DecisionEngine)
+ELIGIBILITY_CACHE_MAX = 100000
+
+
+# --- Regeln --- #
+# Jede Regel-Fabrik bekommt die Engine (Konfiguration) und liefert eine
+# Prüffunktion check(card, team, today) -> (code, grund) oder None:
+# - team:  Bit des gewählten Teams (db.card_index.team_bit)
+# - today: heutiges Datum als Ordinalzahl (vergleichbar mit card.vf / card.vu)
+
+def _rule_valid_from(engine):
+    def check(card, team, today):
+        if card.vf is INVALID_DATE:
+            return CODE_INVALID_DATE, "Ungültiges Startdatum"
+        if card.vf and today < card.vf:
+            return CODE_NOT_YET_VALID, f"Karte noch nicht gültig (ab {card.valid_from})"
+        return None
+    return check
+
+
+def _rule_valid_until(engine):
+    def check(card, team, today):
+        if card.vu is INVALID_DATE:
+            return CODE_INVALID_DATE, "Ungültiges Enddatum"
+        if card.vu and today > card.vu:
+            return CODE_EXPIRED, f"Karte abgelaufen (gültig bis {card.valid_until})"
+        return None
+    return check
+
+
+def _rule_team(engine):
+    def check(card, team, today):
+        if card.team_mask & team:
+            return None
+        return CODE_TEAM, None  # Text braucht den Original-Teamnamen, siehe decide()
+    return check
+
+
+# Verfügbare Regeln; die Reihenfolge in DEFAULT_RULES bestimmt die Reihenfolge der Gründe
+RULES = {
+    "valid_from": _rule_valid_from,
+    "valid_until": _rule_valid_until,
+    "team": _rule_team,
+}
+DEFAULT_RULES = ("valid_from", "valid_until", "team")
+
+
+@lru_cache(maxsize=64)
+def _cached_norm_team(team):
+    return norm_team(team)
+
+
+class DecisionEngine:
+    """
+    Entscheidet über einen Scan. Reihenfolge:
+    1. Unbekannte Karte -> verweigert
+    2. Gültigkeitsregeln (konfigurierbar, alle Gründe werden gesammelt)
+    3. Doppel-Scan: innerhalb der Schutzfrist erlaubt, innerhalb des
+       Sperrfensters (pro Kartentyp einstellbar) verweigert. Ein Zutritt an
+       einem anderen Gate sperrt immer, auch innerhalb der Schutzfrist
+       (sonst ließe sich die Karte über den Zaun weiterreichen).
+    Die Regeln werden beim Erzeugen einmal zu einer Liste von Prüffunktionen
+    "kompiliert"; decide() hat keine Seiteneffekte außer einem Cache: Team
+    und Datum stehen am Spieltag fest, das Ergebnis der Gültigkeitsregeln
+    wird daher pro Karte für das aktuelle (Team, Tag) gemerkt und verworfen,
+    sobald sich eins von beiden ändert.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, grace_period=timedelta(minutes=1),
+                 reuse_window=timedelta(hours=1), reuse_windows=None):
+        """
+        Parameter:
+        - rules:          Namen der Regeln aus RULES, in Prüfreihenfolge
+        - grace_period:   Schutzfrist für versehentliche Doppel-Scans
+        - reuse_window:   Sperrfenster nach einem Zutritt (Standard)
+        - reuse_windows:  optional dict Kartentyp -> Sperrfenster
+                          (z.B. {"Dauerkarte": timedelta(hours=2)})
+        """
+        self.grace_period = grace_period
+        self.reuse_window = reuse_window
+        self.reuse_windows = dict(reuse_windows or {})
+        self._checks = tuple(RULES[name](self) for name in rules)
+        # (Team, Tag), Team-Bit, Tag als Ordinalzahl, uid -> (card, Verdict oder None)
+        self._eligibility = (None, 0, 0, {})
+
+    @property
+    def max_reuse_window(self):
+        """Längstes Sperrfenster (so lange muss der CardIndex Zutritte merken)."""
+        return max([self.reuse_window, *self.reuse_windows.values()])
+
+    def decide(self, card, last_allowed, team, now, last_remote=None):
+        """
+        Parameter:
+        - card:         IndexedCard oder None (unbekannte Karte)
+        - last_allowed: datetime des letzten erlaubten Zutritts oder None
+        - last_remote:  datetime des letzten erlaubten Zutritts an einem
+                        anderen Gate oder None
+        - team:         aktuell gewähltes Team (Anzeigename)
+        - now:          Zeitpunkt des Scans (datetime)
+        Rückgabe: Verdict
+        """
+        if card is None:
+            return Verdict(False, CODE_UNKNOWN, ["Karte nicht registriert"],
+                           "Karte nicht registriert", None, None)
+
+        denied = self._check_eligibility(card, team, now.date())
+        if denied:
+            return denied
+
+        # --- Karte ist gültig: Doppel-Scan-Prüfung ---
+        window = self.reuse_windows.get(card.card_type, self.reuse_window)
+        if last_remote and now - last_remote < window:
+            return self._reused(card, now - last_remote)
+        if last_allowed:
+            delta = now - last_allowed
+            if delta < self.grace_period:
+                return Verdict(True, CODE_GRACE, [], "Schutzfrist erneuter Scan", card, None)
+            if delta < window:
+                return self._reused(card, delta)
+
+        return Verdict(True, CODE_OK, [], "OK", card, None)
+
+    def _check_eligibility(self, card, team, today):
+        """
+        Gültigkeitsregeln für (Karte, Team, Tag): Verdict bei Verweigerung,
+        sonst None. Pro (Team, Tag) gecacht; geänderte Karten sind neue
+        IndexedCard-Objekte und werden daher neu geprüft.
+        """
+        key, bit, day, cache = self._eligibility
+        if key != (team, today):
+            key, bit, day, cache = (team, today), team_bit(_cached_norm_team(team)), today.toordinal(), {}
+            self._eligibility = (key, bit, day, cache)
+        hit = cache.get(card.uid)
+        if hit is not None and hit[0] is card:
+            return hit[1]
+
+        codes = []
+        reasons = []
+        for check in self._checks:
+            result = check(card, bit, day)
+            if result:
+                code, reason = result
+                codes.append(code)
+                reasons.append(reason or f"Keine Berechtigung für {team}")
+        denied = Verdict(False, codes[0], reasons, "; ".join(reasons), card, None) if reasons else None
+        if len(cache) >= ELIGIBILITY_CACHE_MAX:
+            cache.clear()
+        cache[card.uid] = (card, denied)
+        return denied
+
+    def _reused(self, card, delta):
+        minutes = max(0, int(delta.total_seconds() // 60))
+        return Verdict(
+            False, CODE_REUSED,
+            [f"Karte wurde schon vor {minutes} Minuten verwendet"],
+            f"Schon vor {minutes} Minuten verwendet", card, minutes,
+        )
@@ -0,0 +1,280 @@
+# fraud.py
+# Erkennung von Kartenmissbrauch im Scan-Strom. Die Stunden-Sperre in der
+# DecisionEngine sieht nur einzelne Scans; hier laufen alle Scans (auch die
+# anderer Gates aus sync.py) durch Zähler über gleitende Zeitfenster:
+# - denied_multi:       dieselbe UID mehrfach verweigert, an mehreren Lesegeräten/Gates
+#                       (Karte wird herumgereicht)
+# - unknown_burst:      viele verschiedene unbekannte UIDs an einem Lesegerät
+#                       (Durchprobieren, geklonte Karten)
+# - team_hopping:       Karte am selben Tag für verschiedene Teams eingelassen
+# - card_type_denials:  gehäufte Verweigerungen eines Kartentyps
+# Auffälligkeiten landen in fraud_alerts (Nachkontrolle mit
+# python -m db.reports alerts) und werden per on_alert gemeldet.
+# - GateCore.process() legt Scans nur in eine Warteschlange, die Auswertung
+#   läuft im eigenen Thread und bremst die Entscheidung nicht
+# - Speicher begrenzt: höchstens MAX_KEYS Schlüssel pro Zähler (die am
+#   längsten unbenutzten fallen raus) und MAX_EVENTS Scans pro Schlüssel
+# - pro Regel und Schlüssel höchstens ein Alarm je Zeitfenster (hält die
+#   Auffälligkeit an, folgt nach einem Fenster der nächste)
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python fraud.py --from 2026-03-14          # Scans eines Zeitraums nachträglich prüfen
+
+import argparse
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict, deque, namedtuple
+from datetime import date, datetime, timedelta
+
+from db.database import DB_PATH, from_ms, log_alerts, to_ms
+from decision import CODE_GRACE, CODE_UNKNOWN
+from metrics import FRAUD_ALERTS
+
+RULE_DENIED_MULTI = "denied_multi"
+RULE_UNKNOWN_BURST = "unknown_burst"
+RULE_TEAM_HOPPING = "team_hopping"
+RULE_CARD_TYPE_DENIALS = "card_type_denials"
+
+# Zeitfenster (Sekunden) und Schwellen der Regeln
+DENIED_WINDOW = 600
+DENIED_MIN = 3              # Verweigerungen derselben UID ...
+DENIED_MIN_READERS = 2      # ... an mindestens so vielen Lesegeräten
+UNKNOWN_WINDOW = 60
+UNKNOWN_MIN = 8             # verschiedene unbekannte UIDs an einem Lesegerät
+CARD_TYPE_WINDOW = 600
+CARD_TYPE_MIN = 25          # Verweigerungen eines Kartentyps
+TEAM_WINDOW = 24 * 3600
+
+# Ältere Scans können keine Regel mehr auslösen (z.B. nachgeholte Scans
+# eines Gates, das lange offline war) und werden nicht ausgewertet
+MAX_WINDOW = max(DENIED_WINDOW, UNKNOWN_WINDOW, CARD_TYPE_WINDOW, TEAM_WINDOW)
+
+# Speichergrenzen der Zähler
+MAX_KEYS = 20000
+MAX_EVENTS = 64
+
+# Max. Alarme, die bei nicht beschreibbarer DB im Speicher warten
+PENDING_MAX = 1000
+
+# Markiert das Ende der Warteschlange (close())
+_STOP = object()
+
+# Auffälligkeit: ts (datetime), rule, uid, reader, card_type, detail (Text)
+Alert = namedtuple("Alert", "ts rule uid reader card_type detail")
+
+
+class SlidingWindow:
+    """
+    Ereignisse pro Schlüssel aus den letzten `window` Sekunden.
+    Höchstens max_keys Schlüssel (der am längsten unbenutzte fällt raus)
+    und max_events Ereignisse pro Schlüssel. Verspätete Ereignisse (z.B.
+    von anderen Gates) werden nach Zeit einsortiert, das Fenster endet beim
+    neuesten Ereignis des Schlüssels.
+    """
+
+    def __init__(self, window, max_keys=MAX_KEYS, max_events=MAX_EVENTS):
+        self.window_ms = int(window * 1000)
+        self.max_keys = max_keys
+        self.max_events = max_events
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, ts_ms, value=None):
+        """Trägt ein Ereignis ein. Rückgabe: deque der (ts_ms, value) im Fenster."""
+        events = self._keys.get(key)
+        if events is None:
+            events = self._keys[key] = deque(maxlen=self.max_events)
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        i = len(events)
+        while i and events[i - 1][0] > ts_ms:
+            i -= 1
+        if len(events) == self.max_events:
+            if not i:
+                return events       # älter als alles Gespeicherte -> fiele sofort raus
+            events.popleft()
+            i -= 1
+        events.insert(i, (ts_ms, value))
+        limit = events[-1][0] - self.window_ms
+        while events[0][0] < limit:
+            events.popleft()
+        return events
+
+
+class FraudDetector:
+    """
+    Die Regeln über gleitende Fenster (ohne Thread, z.B. für Nachprüfungen).
+    scan() liefert die durch einen Scan ausgelösten Alerts.
+    """
+
+    def __init__(self):
+        self._denied = SlidingWindow(DENIED_WINDOW)          # uid -> Lesegerät
+        self._unknown = SlidingWindow(UNKNOWN_WINDOW, max_keys=1000)   # Lesegerät -> uid
+        self._teams = SlidingWindow(TEAM_WINDOW, max_events=8)  # uid -> (Tag, Team)
+        self._card_types = SlidingWindow(CARD_TYPE_WINDOW, max_keys=1000)
+        self._cooldown_ms = {
+            RULE_DENIED_MULTI: DENIED_WINDOW * 1000,
+            RULE_UNKNOWN_BURST: UNKNOWN_WINDOW * 1000,
+            RULE_TEAM_HOPPING: TEAM_WINDOW * 1000,
+            RULE_CARD_TYPE_DENIALS: CARD_TYPE_WINDOW * 1000,
+        }
+        self._last_alert = {rule: OrderedDict() for rule in self._cooldown_ms}  # key -> ts_ms
+
+    def _first(self, rule, key, ts_ms):
+        """
+        Nur aufrufen, wenn die Regel anschlägt: True (Alarm, Zeitpunkt wird
+        gemerkt), wenn der letzte Alarm für (rule, key) mindestens ein
+        Fenster der Regel zurückliegt. Hält die Lage an, kommt so je Fenster
+        ein neuer Alarm.
+        """
+        last = self._last_alert[rule]
+        previous = last.get(key)
+        if previous is not None and abs(ts_ms - previous) < self._cooldown_ms[rule]:
+            return False
+        last[key] = ts_ms if previous is None else max(previous, ts_ms)
+        last.move_to_end(key)
+        if len(last) > MAX_KEYS:
+            last.popitem(last=False)
+        return True
+
+    def scan(self, ts, uid, allowed, code, reader=None, team=None, card_type=None):
+        """
+        Wertet einen Scan aus (Parameter wie entries). Rückgabe: Liste von Alert
+        """
+        ts_ms = to_ms(ts)
+        reader = reader or ""
+        alerts = []
+        if code == CODE_UNKNOWN:
+            uids = {u for _, u in self._unknown.add(reader, ts_ms, uid)}
+            if len(uids) >= UNKNOWN_MIN and self._first(RULE_UNKNOWN_BURST, reader, ts_ms):
+                alerts.append(Alert(ts, RULE_UNKNOWN_BURST, uid, reader, None,
+                                    f"{len(uids)} unbekannte Karten in {UNKNOWN_WINDOW} s"))
+        elif not allowed:
+            events = self._denied.add(uid, ts_ms, reader)
+            readers = {r for _, r in events}
+            if (len(events) >= DENIED_MIN and len(readers) >= DENIED_MIN_READERS
+                    and self._first(RULE_DENIED_MULTI, uid, ts_ms)):
+                alerts.append(Alert(ts, RULE_DENIED_MULTI, uid, reader, card_type,
+                                    f"{len(events)}x verweigert an {', '.join(sorted(readers))}"))
+            if card_type:
+                denials = len(self._card_types.add(card_type, ts_ms))
+                if denials >= CARD_TYPE_MIN and self._first(RULE_CARD_TYPE_DENIALS, card_type, ts_ms):
+                    alerts.append(Alert(ts, RULE_CARD_TYPE_DENIALS, None, reader, card_type,
+                                        f"{denials} Verweigerungen in {CARD_TYPE_WINDOW // 60} min"))
+        elif team and code != CODE_GRACE:
+            day = ts.date()
+            teams = {t for _, (d, t) in self._teams.add(uid, ts_ms, (day, team)) if d == day}
+            if len(teams) > 1 and self._first(RULE_TEAM_HOPPING, uid, ts_ms):
+                alerts.append(Alert(ts, RULE_TEAM_HOPPING, uid, reader, card_type,
+                                    f"heute für {', '.join(sorted(teams))}"))
+        return alerts
+
+
+class FraudMonitor(threading.Thread):
+    """
+    Wertet alle Scans im Hintergrund mit FraudDetector aus.
+    - observe() legt einen Scan nur in die Warteschlange (kostet den
+      aufrufenden Thread fast nichts)
+    - Alarme werden in fraud_alerts geschrieben und an on_alert(alert)
+      gemeldet (läuft im Thread des Monitors)
+    """
+
+    def __init__(self, db, on_alert=None):
+        super().__init__(daemon=True, name="FraudMonitor")
+        self.db = db
+        self.on_alert = on_alert
+        self.detector = FraudDetector()
+        self.queue = queue.Queue()
+        self._pending = []
+
+    def observe(self, ts, uid, allowed, code, reader=None, team=None, card_type=None):
+        """Nimmt einen Scan entgegen (Parameter wie FraudDetector.scan)."""
+        self.queue.put((ts, uid, allowed, code, reader, team, card_type))
+
+    def wait_idle(self):
+        """Blockiert, bis alle bisher übergebenen Scans ausgewertet sind."""
+        self.queue.join()
+
+    def close(self, timeout=None):
+        if self.is_alive():
+            self.queue.put(_STOP)
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                self._flush()
+                break
+            try:
+                for alert in self.detector.scan(*item):
+                    self._raise(alert)
+            except Exception as e:
+                print(f"Fehler bei der Missbrauchserkennung: {e}")
+            if self._pending and self.queue.empty():
+                self._flush()
+            self.queue.task_done()
+
+    def _raise(self, alert):
+        print(f"Auffälligkeit {alert.rule}: {alert.uid or alert.card_type} – {alert.detail}")
+        FRAUD_ALERTS.labels(alert.rule).inc()
+        self._pending.append(alert)
+        if len(self._pending) > PENDING_MAX:
+            del self._pending[0]
+        if self.on_alert:
+            self.on_alert(alert)
+
+    def _flush(self):
+        """Schreibt wartende Alarme; bei DB-Fehlern beim nächsten Mal erneut."""
+        if not self._pending:
+            return
+        try:
+            with self.db.writer() as conn:
+                log_alerts(conn, self._pending)
+        except sqlite3.Error as e:
+            print(f"{len(self._pending)} Auffälligkeiten noch nicht gespeichert: {e}")
+            return
+        self._pending.clear()
+
+
+def main():
+    """Scans eines Zeitraums aus entries nachträglich prüfen (schreibt nichts)."""
+    from db.database import Database
+
+    parser = argparse.ArgumentParser(description="Scan-Log auf Kartenmissbrauch prüfen")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    parser.add_argument("--from", dest="day_from", default=date.today().isoformat())
+    parser.add_argument("--to", dest="day_to")
+    args = parser.parse_args()
+
+    start = datetime.combine(date.fromisoformat(args.day_from), datetime.min.time())
+    end = datetime.combine(date.fromisoformat(args.day_to or args.day_from) + timedelta(days=1),
+                           datetime.min.time())
+    db = Database(args.db)
+    detector = FraudDetector()
+    count = 0
+    rows = db.reader().execute(
+        """
+        SELECT ts_ms, uid, allowed, code, COALESCE(node || ':', '') || COALESCE(reader, ''),
+               team, card_type
+        FROM entries WHERE ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms
+        """,
+        (to_ms(start), to_ms(end)),
+    )
+    for ts_ms, uid, allowed, code, reader, team, card_type in rows:
+        for alert in detector.scan(from_ms(ts_ms), uid, allowed, code, reader, team, card_type):
+            count += 1
+            print(f"{alert.ts.isoformat(sep=' ', timespec='seconds')}  {alert.rule:<18} "
+                  f"{alert.uid or alert.card_type:<16} {alert.detail}")
+    print(f"{count} Auffälligkeiten")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
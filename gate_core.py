@@ -0,0 +1,147 @@
+# gate_core.py
+# Kivy-freier Kern eines Gates: Karten-Index, Zutrittsregeln und Log.
+# Wird von der Kivy-App (ui/app.py) und vom Replay-/Lasttest
+# (bench/replay.py) gleichermaßen benutzt.
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db.card_index import CardIndex
+from db.database import UNKNOWN_WINDOW_SECONDS, to_ms
+from db.entry_writer import EntryWriter
+from db.journal import journal_path
+from decision import DecisionEngine
+from fraud import MAX_WINDOW, FraudMonitor
+from metrics import SCANS, STAGE_SECONDS
+
+# Stufen-Histogramme einmal holen (Label-Lookup nicht pro Scan)
+_LOOKUP = STAGE_SECONDS.labels("lookup")
+_DECIDE = STAGE_SECONDS.labels("decide")
+_LOG = STAGE_SECONDS.labels("log")
+
+# Max. Anzahl gemerkter unbekannter UIDs für die Log-Drosselung
+UNKNOWN_TRACK_MAX = 10000
+
+
+class GateCore:
+    """
+    Verarbeitet Scans: Index-Lookup -> Entscheidung -> Log.
+    - db:     Database (db/database.py)
+    - engine: DecisionEngine (Standard: Standardregeln)
+    - team:   aktuell gewähltes Team
+    Der Index wird mit der Leseverbindung des erzeugenden Threads geladen;
+    process() und refresh() müssen von diesem Thread aus aufgerufen werden.
+
+    Unbekannte Karten erkennt der Index-Lookup (ein Dict-Zugriff). Pro UID
+    und Zeitfenster (UNKNOWN_WINDOW_SECONDS) landet nur der erste Scan in
+    entries, alle werden in unknown_scans gezählt.
+
+    Ist die DB nicht beschreibbar oder lesbar, laufen die Entscheidungen mit
+    dem Index im Speicher weiter und die Scans gehen ins Journal (Notbetrieb,
+    siehe EntryWriter).
+    """
+
+    def __init__(self, db, engine=None, flush_interval=0.5, batch_size=100):
+        self.db = db
+        self.engine = engine or DecisionEngine()
+        self.index = CardIndex(db.reader(), reuse_window=self.engine.max_reuse_window)
+        self.writer = EntryWriter(db, flush_interval=flush_interval, batch_size=batch_size,
+                                  journal_path=journal_path(db.path))
+        self.monitor = FraudMonitor(db)     # Missbrauchserkennung (on_alert setzt der Aufrufer)
+        self.team = None
+        self.ready = threading.Event()      # gesetzt, sobald start() fertig ist
+        self._unknown_logged = {}           # uid -> Zeitfenster, dessen erster Scan geloggt ist
+
+    def start(self, conn=None):
+        """
+        Lädt den Karten-Index und startet Log-Thread und Missbrauchserkennung.
+        conn: Leseverbindung des aufrufenden Threads, wenn der Index in einem
+        Hintergrund-Thread geladen wird (siehe GateApp-Start).
+        """
+        self.index.load(conn)
+        self.writer.start()
+        self.monitor.start()
+        self.ready.set()
+
+    def close(self):
+        """Schreibt alle offenen Log-Einträge und Auffälligkeiten (blockiert bis fertig)."""
+        self.monitor.close()
+        self.writer.close()
+
+    @property
+    def degraded(self):
+        """True im Notbetrieb (DB nicht beschreibbar, Scans gehen ins Journal)."""
+        return self.writer.degraded
+
+    def refresh(self):
+        """
+        Gleicht den Index mit der DB ab, falls sich Karten geändert haben.
+        Ist die DB nicht lesbar, bleibt der bisherige Index in Gebrauch.
+        """
+        try:
+            if self.index.db_changed():
+                self.index.refresh()
+        except sqlite3.Error as e:
+            print(f"Karten-Index nicht abgeglichen, DB nicht lesbar: {e}")
+
+    def note_remote_entries(self, entries):
+        """
+        Übernimmt Scans anderer Gates (Callback für sync.SyncWorker):
+        entries = Liste von (uid, datetime, allowed, node, reader, team, card_type, code).
+        Die Missbrauchserkennung sieht nur Scans aus ihrem größten Zeitfenster
+        (beim ersten Abgleich kommt sonst die ganze Historie der Gegenstelle).
+        """
+        oldest = datetime.now() - timedelta(seconds=MAX_WINDOW)
+        for uid, ts, allowed, node, reader, team, card_type, code in entries:
+            self.index.note_entry(uid, ts, allowed, remote=True)
+            if ts >= oldest:
+                self.monitor.observe(ts, uid, allowed, code, f"{node}:{reader or ''}", team, card_type)
+
+    def process(self, uid_hex, reader=None, now=None):
+        """
+        Entscheidet über einen Scan und loggt ihn.
+        Der Index wird sofort aktualisiert (Doppel-Scan-Prüfung), geschrieben
+        wird im Hintergrund. Rückgabe: Verdict (siehe decision.py)
+        """
+        now = now or datetime.now()
+        t0 = time.perf_counter()
+        card = self.index.get(uid_hex)
+        if card is None:
+            last_allowed = last_remote = None
+        else:
+            last_allowed = self.index.last_allowed(uid_hex)
+            last_remote = self.index.last_remote(uid_hex)
+        t1 = time.perf_counter()
+        verdict = self.engine.decide(card, last_allowed, self.team, now, last_remote=last_remote)
+        t2 = time.perf_counter()
+        if card is None:
+            self.writer.count_unknown(uid_hex, now, reader)
+            if self._first_unknown(uid_hex, now):
+                self.writer.log(uid_hex, False, verdict.log_reason, timestamp=now, reader=reader,
+                                team=self.team, code=verdict.code)
+        else:
+            self.index.note_entry(uid_hex, now, verdict.allowed)
+            self.writer.log(
+                uid_hex, verdict.allowed, verdict.log_reason, timestamp=now, reader=reader,
+                team=self.team, card_type=card.card_type, code=verdict.code,
+            )
+        self.monitor.observe(now, uid_hex, verdict.allowed, verdict.code, reader, self.team,
+                             card.card_type if card is not None else None)
+        t3 = time.perf_counter()
+        _LOOKUP.observe(t1 - t0)
+        _DECIDE.observe(t2 - t1)
+        _LOG.observe(t3 - t2)
+        SCANS.labels(verdict.code, int(verdict.allowed)).inc()
+        return verdict
+
+    def _first_unknown(self, uid_hex, now):
+        """True für den ersten Scan einer unbekannten UID im aktuellen Zeitfenster."""
+        window = to_ms(now) // (UNKNOWN_WINDOW_SECONDS * 1000)
+        if self._unknown_logged.get(uid_hex) == window:
+            return False
+        if len(self._unknown_logged) >= UNKNOWN_TRACK_MAX:
+            self._unknown_logged.clear()
+        self._unknown_logged[uid_hex] = window
+        return True
@@ -0,0 +1,471 @@
+# gated.py
+# Gate ohne Bildschirm (z.B. reines Drehkreuz): dieselbe Scan-Verarbeitung
+# wie die App (GateCore, NFCReaderThread, cards.db), aber ohne Kivy/SDL.
+# - eigener Loop im Hauptthread statt Kivy-Clock: Lese-Thread und API
+#   übergeben ihre Aufrufe per call_soon(), GateCore läuft nur hier
+# - Relais am GPIO-Pin öffnet das Drehkreuz bei erlaubtem Zutritt
+# - lokale HTTP-API (nur 127.0.0.1) für Anzeigen, Kassen-PC-Tools, Tests:
+#     GET  /status                      -> Team, Karten, Notbetrieb, Lesegeräte
+#     GET  /events?since=<seq>&wait=<s> -> Scans/Meldungen/Auffälligkeiten ab seq (Long-Poll)
+#     POST /team   {"team": "..."}      -> Team wechseln
+#     POST /scan   {"uid": "...", "reader": "..."} -> Scan wie vom Lesegerät
+#                  (nur zum Testen, mit --allow-scan: öffnet sonst das Relais
+#                  für jeden lokalen Prozess)
+#   POST antwortet 503, wenn der Loop nicht rechtzeitig dazu kommt (der
+#   Aufruf wird dann verworfen)
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python gated.py --team "1. Herren"
+#   python gated.py --team "1. Herren" --relay 17                 # ein Drehkreuz an GPIO 17
+#   python gated.py --team "1. Herren" --relay "00 00=17" --relay "01 00=27"   # je Lesegerät
+#   curl "http://127.0.0.1:8720/events?since=0&wait=25"
+
+import argparse
+import json
+import os
+import queue
+import signal
+import sqlite3
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from db.database import DB_PATH, DURABILITY_MODES, Database, import_from_csv
+from gate_core import GateCore
+from nfc_reader import ReaderSupervisor
+from ui.results import verdict_result
+
+# Standard-Port der lokalen API
+API_PORT = 8720
+
+# Wie oft (Sekunden) auf Änderungen an cards.csv / DB geprüft wird (wie in ui/app.py)
+CARD_RELOAD_INTERVAL = 5
+
+# So viele Ereignisse hält /events vor
+EVENT_BUFFER = 1000
+
+# Max. Wartezeit eines Long-Polls auf /events (Sekunden)
+EVENT_WAIT_MAX = 30.0
+
+# Max. Wartezeit (Sekunden) der API auf den Loop (POST /team, /scan)
+API_CALL_TIMEOUT = 5.0
+
+# So lange (Sekunden) zieht das Relais bei einem erlaubten Zutritt an
+RELAY_PULSE = 1.0
+
+
+class EventLog:
+    """
+    Ringpuffer der letzten Ereignisse mit fortlaufender Nummer (seq) für
+    /events. Ereignisse sind dicts mit "type" ("scan", "message", "readers", "alert").
+    """
+
+    def __init__(self, size=EVENT_BUFFER):
+        self._events = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.seq = 0
+
+    def add(self, event):
+        with self._cond:
+            self.seq += 1
+            event["seq"] = self.seq
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def since(self, seq, wait=0.0):
+        """
+        Ereignisse nach `seq`; wait > 0: wartet höchstens so lange auf das nächste.
+        Ein `seq` aus einem früheren Lauf des Daemons liefert alle vorhandenen.
+        Rückgabe: (aktuelle seq, Liste der Ereignisse)
+        """
+        with self._cond:
+            if seq > self.seq:
+                seq = 0
+            if wait > 0:
+                self._cond.wait_for(lambda: self.seq > seq, wait)
+            return self.seq, [e for e in self._events if e["seq"] > seq]
+
+
+class GpioRelay:
+    """
+    Hook für GateDaemon: zieht bei einem erlaubten Zutritt das Relais des
+    Lesegeräts für `pulse` Sekunden an (gpiozero, nur auf dem Raspberry Pi).
+    pins: Liste von (Teil des Lesegerät-Namens, GPIO-Pin); "" gilt für alle.
+    """
+
+    def __init__(self, pins, pulse=RELAY_PULSE, active_high=True):
+        try:
+            from gpiozero import OutputDevice
+        except ImportError:
+            raise RuntimeError("Relais braucht gpiozero (pip install gpiozero)") from None
+        self.pulse = pulse
+        self._devices = [
+            (pattern, OutputDevice(pin, active_high=active_high, initial_value=False))
+            for pattern, pin in pins
+        ]
+        self._timers = {}
+
+    def _device(self, reader):
+        for pattern, device in self._devices:
+            if pattern in (reader or ""):
+                return device
+        return None
+
+    def __call__(self, verdict, uid_hex, reader):
+        if not verdict.allowed:
+            return
+        device = self._device(reader)
+        if device is None:
+            return
+        device.on()
+        # erneuter Zutritt während des Impulses verlängert ihn
+        timer = self._timers.pop(device, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(self.pulse, device.off)
+        timer.daemon = True
+        timer.start()
+        self._timers[device] = timer
+
+    def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        for _, device in self._devices:
+            device.off()
+            device.close()
+
+
+class GateDaemon:
+    """
+    Gate ohne UI: Lesegeräte -> GateCore -> Hooks (Relais) und Ereignisse.
+    run() läuft im Hauptthread und führt alle per call_soon() übergebenen
+    Aufrufe nacheinander aus (wie die Kivy-Clock in der App). Wie bei
+    GateCore: im selben Thread erzeugen, in dem run() läuft.
+    """
+
+    def __init__(self, db, team, csv_path=None, hooks=(), mode="event", backend=None):
+        """
+        Parameter:
+        - db:        Database
+        - team:      Team, für das Zutritt gewährt wird
+        - csv_path:  cards.csv, die importiert und überwacht wird (None = keine)
+        - hooks:     Callbacks hook(verdict, uid_hex, reader) nach jedem Scan,
+                     z.B. GpioRelay; laufen im Loop, müssen also schnell sein
+        - mode, backend: wie NFCReaderThread
+        """
+        self.db = db
+        self.core = GateCore(db)
+        self.core.team = team
+        self.csv_path = csv_path
+        self.csv_mtime = None
+        self.hooks = list(hooks)
+        self.events = EventLog()
+        self.services = []          # Threads mit stop(), werden am Ende beendet
+        self._calls = queue.Queue()
+        self.core.monitor.on_alert = self.on_alert
+        self.readers = ReaderSupervisor(
+            uid_callback=self.on_uid,
+            error_callback=self.on_error,
+            readers_callback=self.on_readers,
+            mode=mode,
+            backend=backend,
+            dispatch=self.call_soon,
+        )
+
+    def call_soon(self, func):
+        """Führt func() im Loop aus (thread-sicher, kehrt sofort zurück)."""
+        self._calls.put(func)
+
+    def call(self, func, *args, timeout=API_CALL_TIMEOUT):
+        """
+        Führt func(*args) im Loop aus und wartet auf das Ergebnis (für die API).
+        Nach `timeout` Sekunden FutureTimeoutError; war func bis dahin noch
+        nicht an der Reihe, wird es nicht mehr ausgeführt (z.B. kein Relais
+        für einen Scan, dessen Anfrage schon abgebrochen ist).
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.call_soon(run)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def run(self):
+        """Startet alles und arbeitet den Loop ab, bis KeyboardInterrupt/SIGTERM."""
+        self.check_card_updates()
+        self.core.start()
+        print(f"{len(self.core.index)} Karten geladen, Team {self.core.team}")
+        self.readers.start()
+        next_check = time.monotonic() + CARD_RELOAD_INTERVAL
+        try:
+            while True:
+                try:
+                    func = self._calls.get(timeout=max(0.0, next_check - time.monotonic()))
+                except queue.Empty:
+                    func = None
+                if func is not None:
+                    try:
+                        func()
+                    except Exception:
+                        # ein fehlerhafter Hook/Aufruf darf das Gate nicht anhalten
+                        traceback.print_exc()
+                if time.monotonic() >= next_check:
+                    self.check_card_updates()
+                    self.core.refresh()
+                    next_check = time.monotonic() + CARD_RELOAD_INTERVAL
+        finally:
+            self.close()
+
+    def close(self):
+        self.readers.close()
+        for service in self.services:
+            service.stop()
+        for hook in self.hooks:
+            if hasattr(hook, "close"):
+                hook.close()
+        self.core.close()
+
+    def check_card_updates(self):
+        """cards.csv geändert -> neu importieren (der Index gleicht sich danach ab)."""
+        if not self.csv_path:
+            return
+        try:
+            mtime = os.path.getmtime(self.csv_path)
+        except OSError:
+            return
+        if mtime == self.csv_mtime:
+            return
+        try:
+            with self.db.writer() as conn:
+                report = import_from_csv(conn, self.csv_path)
+        except sqlite3.Error as e:
+            print(f"cards.csv nicht importiert, DB nicht beschreibbar: {e}")
+            return
+        self.csv_mtime = mtime
+        for line, uid, msg in report.errors:
+            print(f"cards.csv Zeile {line} ({uid}): {msg}")
+
+    def on_uid(self, uid_hex, reader=None, t0=None):
+        """
+        Scan entscheiden, Hooks (Relais) zuerst, dann Ereignis für die API.
+        t0: Zeitpunkt des Lesens im Reader-Thread (None = jetzt)
+        """
+        if t0 is None:
+            t0 = time.perf_counter()
+        verdict = self.core.process(uid_hex, reader=reader)
+        for hook in self.hooks:
+            hook(verdict, uid_hex, reader)
+        result = verdict_result(verdict, uid_hex, t0)
+        self.events.add({
+            "type": "scan", "time": time.time(), "uid": uid_hex, "reader": reader,
+            "allowed": verdict.allowed, "code": verdict.code, "status": result.status,
+            "color": result.color, "details": list(result.details),
+        })
+        return verdict
+
+    def on_error(self, msg, reader=None):
+        print(f"{reader or 'Lesegeräte'}: {msg}")
+        self.events.add({"type": "message", "time": time.time(), "reader": reader, "text": msg})
+
+    def on_alert(self, alert):
+        """Auffälligkeit der Missbrauchserkennung (läuft im Thread des Monitors)."""
+        self.events.add({"type": "alert", "time": alert.ts.timestamp(), "rule": alert.rule,
+                         "uid": alert.uid, "reader": alert.reader, "card_type": alert.card_type,
+                         "text": alert.detail})
+
+    def on_readers(self, names):
+        self.events.add({"type": "readers", "time": time.time(), "readers": list(names)})
+
+    def set_team(self, team):
+        self.core.team = team
+        print(f"Team: {team}")
+        self.events.add({"type": "message", "time": time.time(), "reader": None,
+                         "text": f"Team: {team}"})
+
+    def status(self):
+        return {
+            "team": self.core.team,
+            "ready": self.core.ready.is_set(),
+            "cards": len(self.core.index),
+            "degraded": self.core.degraded,
+            "readers": self.readers.health(),
+            "seq": self.events.seq,
+        }
+
+
+class ApiServer(threading.Thread):
+    """
+    Lokale HTTP-API des Daemons (siehe Kopf der Datei).
+    allow_scan: POST /scan annehmen (nur für Tests, sonst 403)
+    """
+
+    def __init__(self, daemon, port=API_PORT, host="127.0.0.1", allow_scan=False):
+        super().__init__(daemon=True, name="ApiServer")
+        self.gate = daemon
+        self.allow_scan = allow_scan
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _make_handler(self):
+        gate = self.gate
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/status":
+                    self._send(gate.status())
+                elif url.path == "/events":
+                    try:
+                        since = int(query.get("since", ["0"])[0])
+                        wait = min(float(query.get("wait", ["0"])[0]), EVENT_WAIT_MAX)
+                    except ValueError:
+                        self.send_error(400)
+                        return
+                    seq, events = gate.events.since(since, wait)
+                    self._send({"seq": seq, "events": events})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    data = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self.send_error(400)
+                    return
+                try:
+                    if self.path == "/team" and data.get("team"):
+                        gate.call(gate.set_team, data["team"], timeout=API_CALL_TIMEOUT)
+                        self._send({"team": data["team"]})
+                    elif self.path == "/scan" and not server.allow_scan:
+                        self.send_error(403, "POST /scan nur mit --allow-scan")
+                    elif self.path == "/scan" and data.get("uid"):
+                        verdict = gate.call(gate.on_uid, str(data["uid"]).upper(), data.get("reader"),
+                                            timeout=API_CALL_TIMEOUT)
+                        self._send({"allowed": verdict.allowed, "code": verdict.code,
+                                    "reasons": list(verdict.reasons)})
+                    else:
+                        self.send_error(400 if self.path in ("/team", "/scan") else 404)
+                except FutureTimeoutError:
+                    self.send_error(503, "Gate antwortet nicht (Loop belegt)")
+
+            def _send(self, data):
+                body = json.dumps(data, default=str).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keine Zugriffslogs auf der Konsole
+
+        return Handler
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _relay_pin(value):
+    """--relay "PIN" oder "Lesegerät=PIN" -> (Teil des Lesegerät-Namens, Pin)."""
+    pattern, _, pin = value.rpartition("=")
+    return pattern, int(pin)
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gate ohne Bildschirm (Drehkreuz)")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur SQLite-DB")
+    parser.add_argument("--durability", default="normal", choices=sorted(DURABILITY_MODES))
+    parser.add_argument("--team", required=True, help="Team, für das Zutritt gewährt wird")
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "cards.csv"),
+                        help="Karten aus dieser CSV importieren und überwachen ('' = keine)")
+    parser.add_argument("--card-server", help="Kartenliste von diesem Kartenserver (cardsync.py)")
+    parser.add_argument("--card-token", help="Token des Kartenservers")
+    parser.add_argument("--peer", action="append", default=[],
+                        help="anderes Gate für den Log-Abgleich (sync.py)")
+    parser.add_argument("--sync-token", help="gemeinsames Token der Gates (Pflicht mit --peer)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="Port der lokalen API (0 = aus)")
+    parser.add_argument("--allow-scan", action="store_true",
+                        help="POST /scan annehmen (nur zum Testen, löst auch das Relais aus)")
+    parser.add_argument("--metrics-port", type=int, default=9108, help="0 = kein Metrik-Endpunkt")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="0.0.0.0 = Metriken im Netz abrufbar")
+    parser.add_argument("--relay", action="append", default=[], type=_relay_pin,
+                        metavar="[LESEGERÄT=]PIN", help="GPIO-Pin des Drehkreuz-Relais")
+    parser.add_argument("--relay-pulse", type=float, default=RELAY_PULSE)
+    parser.add_argument("--mode", default="event", choices=("event", "poll"))
+    args = parser.parse_args()
+    if args.peer and not args.sync_token:
+        parser.error("--peer braucht --sync-token (das Scan-Log enthält UIDs)")
+
+    hooks = [GpioRelay(args.relay, pulse=args.relay_pulse)] if args.relay else []
+    db = Database(args.db, durability=args.durability)
+    gate = GateDaemon(db, args.team, csv_path=None if args.card_server else args.csv or None,
+                      hooks=hooks, mode=args.mode)
+
+    if args.card_server:
+        from cardsync import CardSyncWorker
+        worker = CardSyncWorker(db, args.card_server,
+                                on_change=lambda: gate.call_soon(gate.core.refresh),
+                                token=args.card_token)
+        worker.start()
+        gate.services.append(worker)
+    if args.peer:
+        from sync import SYNC_PORT, SyncServer, SyncWorker
+        server = SyncServer(db, port=SYNC_PORT, host="0.0.0.0", token=args.sync_token)
+        server.start()
+        worker = SyncWorker(db, args.peer, on_entries=gate.core.note_remote_entries,
+                            token=args.sync_token)
+        worker.start()
+        gate.services += [worker, server]
+    if args.metrics_port:
+        from metrics import MetricsServer
+        try:
+            server = MetricsServer(port=args.metrics_port, host=args.metrics_host)
+            server.start()
+            gate.services.append(server)
+        except OSError as e:
+            print(f"Metrik-Endpunkt nicht verfügbar: {e}")
+    if args.port:
+        api = ApiServer(gate, port=args.port, allow_scan=args.allow_scan)
+        api.start()
+        gate.services.append(api)
+        print(f"API auf http://127.0.0.1:{args.port}")
+
+    # systemd stoppt mit SIGTERM: wie Strg+C sauber beenden (Log leeren)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        gate.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # Einstiegspunkt der Anwendung.
 # Startet die Kivy-App, indem die GateApp-Klasse aus ui/app.py aufgerufen wird.
 
+import startup  # als erstes: startet die Zeitmessung der Startphasen (startup.py)
 from ui.app import GateApp
 
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+# metrics.py
+# Messwerte eines Gates (Zähler, Histogramme, Momentanwerte) und ein kleiner
+# HTTP-Endpunkt im Prometheus-Textformat, damit sich während eines Spiels
+# alle Gates beobachten lassen:
+#   curl http://127.0.0.1:9108/metrics
+# Standardmäßig nur lokal erreichbar; zum Abruf über das Netz mit
+# host="0.0.0.0" starten (METRICS_HOST in ui/app.py, gated.py --metrics-host).
+#
+# Histogramme haben feste Bucket-Grenzen: eine Messung kostet ein bisect und
+# eine Addition unter einem Lock (wenige hundert Nanosekunden), es werden
+# keine Einzelwerte gespeichert.
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Standard-Port des Metrik-Endpunkts
+METRICS_PORT = 9108
+
+# Bucket-Grenzen (Sekunden) für Latenzen: 50 µs bis 2,5 s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """Gemeinsame Basis: Name, Hilfetext, Label-Namen und Kind-Werte pro Label-Kombination."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}     # Label-Werte als Text -> Wert
+        self._lookup = {}       # Label-Werte wie übergeben -> Wert (spart str() im heißen Pfad)
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Wert für eine Label-Kombination (für heiße Pfade einmal holen und merken)."""
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: erwartet Labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+                self._lookup[values] = child
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Neuer Wert für eine Label-Kombination (je Metrik-Art)."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Zähler, der nur wächst (z.B. Scans, Lesefehler)."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _GaugeValue:
+    __slots__ = ("value", "func")
+
+    def __init__(self):
+        self.value = 0
+        self.func = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, func):
+        """Wert wird erst beim Abruf über func() ermittelt (z.B. Länge einer Warteschlange)."""
+        self.func = func
+
+    def render(self, name, labelnames, values):
+        value = self.func() if self.func else self.value
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """Momentanwert (z.B. Länge der Log-Warteschlange)."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, func):
+        self._default.set_function(func)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # letzter Bucket: > größte Grenze
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Misst die Dauer des with-Blocks in Sekunden."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Verteilung von Messwerten in festen Buckets (z.B. Latenzen)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Registry:
+    """Sammlung aller Messwerte eines Prozesses."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """Alle Messwerte im Prometheus-Textformat (Version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Gemeinsame Registry des Gate-Prozesses
+REGISTRY = Registry()
+
+# --- Messwerte des Scan-Pfads --- #
+# Stufen: detect (UID vom Lesegerät holen), dispatch (Warten auf den
+# Kivy-Loop), lookup (Karte + letzte Zutritte im Index), decide (Regeln),
+# log (Übergabe an den Log-Thread), render (Scan bis erster Frame mit Ergebnis)
+STAGE_SECONDS = REGISTRY.histogram(
+    "gate_stage_seconds", "Dauer der Stufen eines Scans in Sekunden", ("stage",)
+)
+SCANS = REGISTRY.counter(
+    "gate_scans_total", "Scans nach Ergebnis-Code (siehe decision.py)", ("code", "allowed")
+)
+READER_ERRORS = REGISTRY.counter(
+    "gate_reader_errors_total", "Fehler der Lesegeräte", ("reader",)
+)
+READER_UP = REGISTRY.gauge(
+    "gate_reader_up", "Lesegerät angeschlossen und bereit (1) oder weg (0)", ("reader",)
+)
+READER_RESTARTS = REGISTRY.counter(
+    "gate_reader_restarts_total", "Neustarts der Lesegeräte-Überwachung (PC/SC-Kontext neu aufgebaut)"
+)
+LOG_FLUSH_SECONDS = REGISTRY.histogram(
+    "gate_log_flush_seconds", "Dauer eines gebündelten Schreibvorgangs in entries"
+)
+LOG_ROWS = REGISTRY.counter("gate_log_rows_total", "In entries geschriebene Scans")
+LOG_QUEUE = REGISTRY.gauge("gate_log_queue", "Noch nicht geschriebene Scans")
+DB_DEGRADED = REGISTRY.gauge(
+    "gate_db_degraded", "Notbetrieb: DB nicht beschreibbar, Scans gehen ins Journal (1/0)"
+)
+JOURNAL_ROWS = REGISTRY.gauge("gate_journal_rows", "Scans im Journal, noch nicht in der DB")
+FRAUD_ALERTS = REGISTRY.counter(
+    "gate_fraud_alerts_total", "Auffälligkeiten der Missbrauchserkennung (siehe fraud.py)", ("rule",)
+)
+
+
+class MetricsServer(threading.Thread):
+    """
+    Stellt die Messwerte bereit:
+      GET /metrics -> Prometheus-Textformat
+    Standardmäßig nur lokal erreichbar (host="0.0.0.0" = im Netz).
+    """
+
+    def __init__(self, registry=REGISTRY, port=METRICS_PORT, host="127.0.0.1"):
+        from http.server import HTTPServer  # erst hier: metrics wird schon beim Start importiert
+
+        super().__init__(daemon=True, name="MetricsServer")
+        self.registry = registry
+        self.httpd = HTTPServer((host, port), self._make_handler())
+
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keine Zugriffslogs auf der Konsole
+
+        return Handler
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
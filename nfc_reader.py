@@ -1,98 +1,479 @@
 import threading
 import time
-from smartcard.System import readers
-from smartcard.Exceptions import NoCardException
-from kivy.clock import Clock
+
+from metrics import READER_ERRORS, READER_RESTARTS, READER_UP, STAGE_SECONDS
+from pcsc_backend import (
+    PNP_READER, STATE_CHANGED, STATE_EMPTY, STATE_PRESENT, STATE_UNAVAILABLE,
+    STATE_UNAWARE, STATE_UNKNOWN, BackendError, NoCardError, ScardBackend, ServiceError,
+)
 
 # APDU-Befehl für ACR122U: liefert die UID der aufgelegten Karte
 GET_UID_APDU = [0xFF, 0xCA, 0x00, 0x00, 0x00]
 
+# Max. Wartezeit (Sekunden) eines Status-Wartens, danach wird stop_event geprüft
+EVENT_TIMEOUT = 0.5
+
+# Wartezeit (Sekunden) vor einem Neustart nach einem Ausfall (pcscd neu
+# gestartet, USB-Reset, ...): verdoppelt sich bis RESTART_BACKOFF_MAX und
+# fällt zurück, sobald das Lesegerät wieder antwortet
+RESTART_BACKOFF_MIN = 0.5
+RESTART_BACKOFF_MAX = 30.0
+
+# Poll-Modus: nach so vielen Lesefehlern in Folge wird das Lesegerät neu gesucht
+POLL_MAX_FAILURES = 3
+
+# Zustände der Überwachung (NFCReaderThread.health()["state"])
+STATE_STARTING = "starting"      # Kontext wird aufgebaut
+STATE_RUNNING = "running"        # mindestens ein Lesegerät bereit
+STATE_NO_READER = "no_reader"    # Dienst läuft, aber kein Lesegerät angesteckt
+STATE_RESTARTING = "restarting"  # Ausfall, wartet auf den nächsten Versuch
+STATE_STOPPED = "stopped"        # Thread beendet (z.B. zurück auf der Startseite)
+
+_DETECT = STAGE_SECONDS.labels("detect")
+_DISPATCH = STAGE_SECONDS.labels("dispatch")
+
 
 def uid_to_hex(data):
     """Wandelt eine Liste von Bytes in einen Hex-String um."""
     return ''.join('{:02X}'.format(x) for x in data)
 
 
+def kivy_dispatch():
+    """
+    Standard-Dispatcher: führt Callbacks im Kivy-Loop aus.
+    Kivy wird erst hier geladen, ohne UI (gated.py) wird es nie importiert.
+    """
+    from kivy.clock import Clock
+    return lambda func: Clock.schedule_once(lambda dt: func())
+
+
 def get_reader_status():
     """
     Prüft einmalig, ob ein NFC-Lesegerät verfügbar ist.
     Rückgabe: Text für die Anzeige in der UI.
+    pyscard wird erst hier geladen (spart Zeit beim Start der App).
     """
     try:
+        from smartcard.System import readers
         r = readers()
         if not r:
             return "Achtung: Kein NFC-Lesegerät gefunden"
-        return f"Lesegerät bereit: {r[0]}"
+        if len(r) == 1:
+            return f"Lesegerät bereit: {r[0]}"
+        return f"{len(r)} Lesegeräte bereit: " + ", ".join(str(x) for x in r)
     except Exception as e:
         return f"Fehler beim Initialisieren: {e}"
 
 
+class _ReaderState:
+    """Zustand eines einzelnen Lesegeräts im Event-Modus."""
+
+    __slots__ = ("state", "card_done", "baseline")
+
+    def __init__(self, baseline=False):
+        self.state = STATE_UNAWARE   # zuletzt gemeldeter PC/SC-Zustand
+        self.card_done = False       # aufliegende Karte schon gelesen -> Entfernen abwarten
+        self.baseline = baseline     # erster Zustand nach Neustart: nur übernehmen, nicht lesen
+
+
 class NFCReaderThread(threading.Thread):
     """
-    Hintergrund-Thread, der kontinuierlich den NFC-Lesegerät abfragt.
+    Hintergrund-Thread, der die NFC-Lesegeräte überwacht.
     - Liest UIDs von aufgelegten Karten
-    - Ruft Kivy-Callbacks (uid_callback, error_callback) thread-sicher auf
+    - Ruft die Callbacks (uid_callback, error_callback) thread-sicher über
+      den Dispatcher im Loop der Anwendung auf (Standard: Kivy-Clock)
+
+    Modi:
+    - "event" (Standard): bedient alle angeschlossenen Lesegeräte über eine
+      gemeinsame PC/SC-Statusabfrage und schläft dazwischen im Treiber.
+      Eine Karte wird genau einmal gelesen und erst nach dem Entfernen wieder
+      akzeptiert (Entprellung über das Abnehmen, pro Lesegerät).
+      Lesegeräte können im laufenden Betrieb an- und abgesteckt werden.
+    - "poll": alte Variante mit Verbindungsversuchen in einer Schleife
+      (nur das erste Lesegerät)
+
+    Fällt der PC/SC-Dienst aus (pcscd neu gestartet, USB-Reset) oder hängt
+    das Lesegerät, baut der Thread den Kontext mit wachsender Wartezeit neu
+    auf (RESTART_BACKOFF_MIN .. RESTART_BACKOFF_MAX) und sucht die Lesegeräte
+    neu. Karten, die bei Lesegeräten von vor dem Ausfall noch aufliegen,
+    gelten danach als schon gelesen (kein zweiter Zutritt). Den aktuellen
+    Zustand liefert health().
     """
 
-    def __init__(self, uid_callback, error_callback, stop_event):
+    def __init__(self, uid_callback, error_callback, stop_event, mode="event", backend=None,
+                 readers_callback=None, close_backend=True, dispatch=None):
         """
         Parameter:
-        - uid_callback(uid_hex): wird aufgerufen, wenn eine Karte erkannt wird
-        - error_callback(msg):   wird aufgerufen bei Fehlern oder fehlendem Lesegerät
-        - stop_event:            threading.Event, um den Thread sauber zu stoppen
+        - uid_callback(uid_hex, reader, t0): wird aufgerufen, wenn eine Karte erkannt
+                                         wird (t0 = time.perf_counter() beim Lesen der
+                                         UID, für die Zeit Tap bis Anzeige)
+        - error_callback(msg, reader):   wird aufgerufen bei Fehlern oder fehlendem
+                                         Lesegerät (reader=None: betrifft alle)
+        - stop_event:                    threading.Event, um den Thread sauber zu stoppen
+        - mode:                          "event" oder "poll" (siehe oben)
+        - backend:                       PC/SC-Backend für den Event-Modus
+                                         (Standard: ScardBackend, für Tests: MockBackend)
+        - readers_callback(names):       optional, wird bei jeder Änderung der
+                                         angeschlossenen Lesegeräte aufgerufen
+        - close_backend:                 Kontext am Ende freigeben (False: der
+                                         Aufrufer verwendet ihn weiter, siehe ReaderSupervisor)
+        - dispatch(func):                führt func() im Loop der Anwendung aus
+                                         (Standard: kivy_dispatch(), ohne UI z.B.
+                                         GateDaemon.call_soon)
         """
-        super().__init__(daemon=True)
+        super().__init__(daemon=True, name="NFCReader")
         self.uid_callback = uid_callback
         self.error_callback = error_callback
+        self.readers_callback = readers_callback
         self.stop_event = stop_event
+        self.mode = mode
+        self.backend = backend
+        self.close_backend = close_backend
+        self.dispatch = dispatch or kivy_dispatch()
+        self._backoff = RESTART_BACKOFF_MIN
+        self._resumed = set()       # Lesegeräte, die vor dem letzten Ausfall bereit waren
+        self._health_lock = threading.Lock()
+        self._health = {
+            "state": STATE_STARTING,
+            "readers": {},          # Lesegerät -> {"up", "since", "errors", "last_error"}
+            "restarts": 0,
+            "retry_in": None,       # Sekunden bis zum nächsten Versuch (nur "restarting")
+            "last_error": None,     # (Zeitpunkt, Meldung) des letzten Fehlers
+        }
+
+    def _post(self, callback, *args):
+        """
+        Ruft einen Callback thread-sicher im Loop der Anwendung auf und misst,
+        wie lange er dort auf die Ausführung gewartet hat.
+        """
+        posted = time.perf_counter()
+
+        def run():
+            _DISPATCH.observe(time.perf_counter() - posted)
+            callback(*args)
+
+        self.dispatch(run)
+
+    def _report_error(self, msg, reader):
+        """Meldet einen Fehler an die UI und zählt ihn (metrics.READER_ERRORS)."""
+        READER_ERRORS.labels(reader or "").inc()
+        with self._health_lock:
+            self._health["last_error"] = (time.time(), msg)
+            info = self._health["readers"].get(reader)
+            if info is not None:
+                info["errors"] += 1
+                info["last_error"] = msg
+        self._post(self.error_callback, msg, reader)
+
+    # --- Zustand (health) --- #
+
+    def health(self):
+        """
+        Momentaufnahme des Zustands (thread-sicher), z.B.
+        {"state": "running", "readers": {"ACS ACR122U 00": {"up": True, ...}},
+         "restarts": 0, "retry_in": None, "last_error": None}
+        """
+        with self._health_lock:
+            health = dict(self._health)
+            health["readers"] = {name: dict(info) for name, info in self._health["readers"].items()}
+        return health
+
+    def _set_state(self, state, retry_in=None):
+        with self._health_lock:
+            self._health["state"] = state
+            self._health["retry_in"] = retry_in
+
+    def _reader_up(self, name):
+        with self._health_lock:
+            info = self._health["readers"].setdefault(name, {"errors": 0, "last_error": None})
+            info.update(up=True, since=time.time())
+            self._health["state"] = STATE_RUNNING
+        READER_UP.labels(name).set(1)
+
+    def _reader_down(self, name):
+        with self._health_lock:
+            info = self._health["readers"].get(name)
+            if info is not None:
+                info.update(up=False, since=time.time())
+            if not any(i["up"] for i in self._health["readers"].values()):
+                self._health["state"] = STATE_NO_READER
+        READER_UP.labels(name).set(0)
+
+    # --- Hauptschleife --- #
 
     def run(self):
-        """Hauptschleife: Karten einlesen, bis stop_event gesetzt wird."""
+        """
+        Hauptschleife: Karten einlesen, bis stop_event gesetzt wird. Bricht der
+        Modus mit einem Fehler ab, wird er nach einer Wartezeit neu gestartet.
+        """
+        run_mode = self._run_poll if self.mode == "poll" else self._run_events
         try:
-            # Verfügbare Lesegeräte prüfen
-            r = readers()
-            if not r:
-                Clock.schedule_once(
-                    lambda dt: self.error_callback("Kein NFC-Lesegerät gefunden")
-                )
-                return
+            while not self.stop_event.is_set():
+                self._set_state(STATE_STARTING)
+                try:
+                    run_mode()
+                except Exception as e:
+                    # Kontext verwerfen, beim nächsten Versuch wird er neu aufgebaut
+                    if self.backend is not None:
+                        self.backend.close()
+                    delay = self._backoff
+                    self._backoff = min(delay * 2, RESTART_BACKOFF_MAX)
+                    READER_RESTARTS.inc()
+                    with self._health_lock:
+                        self._health["restarts"] += 1
+                    self._set_state(STATE_RESTARTING, retry_in=delay)
+                    self._report_error(f"Lesegerät nicht bereit: {e} (neuer Versuch in {delay:g} s)", None)
+                    self.stop_event.wait(delay)
+        finally:
+            self._set_state(STATE_STOPPED)
+            if self.close_backend and self.backend is not None:
+                self.backend.close()
+
+    def _run_events(self):
+        """
+        Ereignisgesteuerter Modus über PC/SC-Statusänderungen (alle Lesegeräte).
+        Ein noch gültiger Kontext wird weiterverwendet; ServiceError (Dienst
+        weg, Kontext ungültig) beendet den Modus, run() startet ihn neu.
+        Nach einem Neustart ist der erste Zustand eines schon vorher bekannten
+        Lesegeräts nur die Ausgangslage: eine noch aufliegende Karte wurde
+        bereits gelesen und wird erst nach Abnehmen/Auflegen wieder gemeldet.
+        """
+        if self.backend is None:
+            self.backend = ScardBackend()
+        backend = self.backend
+        backend.open()
 
-            reader = r[0]  # erstes gefundenes Lesegerät verwenden
-            Clock.schedule_once(
-                lambda dt: self.error_callback(f"Verwendes Lesegerät: {reader}")
-            )
-        except Exception as e:
-            Clock.schedule_once(
-                lambda dt: self.error_callback(f"Fehler beim Initialisieren: {e}")
-            )
+        readers = {}                # Lesegerät -> _ReaderState
+        pnp_state = STATE_UNAWARE
+        try:
+            self._sync_readers(backend, readers)
+            while not self.stop_event.is_set():
+                states = {name: rs.state for name, rs in readers.items()}
+                states[PNP_READER] = pnp_state
+                try:
+                    changes = backend.wait_for_change(states, EVENT_TIMEOUT)
+                except ServiceError:
+                    raise
+                except BackendError as e:
+                    # z.B. Lesegerät während des Wartens abgezogen
+                    self._report_error(f"Lesefehler: {e}", None)
+                    self.stop_event.wait(1.0)
+                    self._sync_readers(backend, readers)
+                    continue
+                self._backoff = RESTART_BACKOFF_MIN   # Dienst antwortet wieder
+
+                resync = False
+                for name, event in changes.items():
+                    if not event & STATE_CHANGED:
+                        continue
+                    if name == PNP_READER:
+                        pnp_state = event & ~STATE_CHANGED
+                        resync = True
+                        continue
+                    rs = readers.get(name)
+                    if rs is None:
+                        continue
+                    previous, rs.state = rs.state, event & ~STATE_CHANGED
+                    if rs.state & (STATE_UNKNOWN | STATE_UNAVAILABLE):
+                        resync = True
+                    elif rs.baseline:
+                        rs.baseline = False
+                        rs.card_done = bool(rs.state & STATE_PRESENT)
+                    else:
+                        self._handle_state(backend, name, rs, previous)
+                if resync:
+                    self._sync_readers(backend, readers)
+        finally:
+            self._resumed = set(readers)
+            for name in readers:
+                self._reader_down(name)
+
+    def _sync_readers(self, backend, readers):
+        """Gleicht die Liste der Lesegeräte ab (Hotplug) und meldet Änderungen."""
+        try:
+            names = backend.list_readers()
+        except ServiceError:
+            raise
+        except BackendError as e:
+            self._report_error(f"Fehler beim Suchen der Lesegeräte: {e}", None)
+            return
+        added = [n for n in names if n not in readers]
+        removed = [n for n in readers if n not in names]
+        for name in removed:
+            del readers[name]
+            self._reader_down(name)
+            self._post(self.error_callback, f"Lesegerät getrennt: {name}", name)
+        for name in added:
+            readers[name] = _ReaderState(baseline=name in self._resumed)
+            self._resumed.discard(name)
+            self._reader_up(name)
+            self._post(self.error_callback, f"Verwendes Lesegerät: {name}", name)
+        if not names and (removed or not added):
+            self._set_state(STATE_NO_READER)
+            self._post(self.error_callback, "Kein NFC-Lesegerät gefunden", None)
+        if (added or removed) and self.readers_callback:
+            self._post(self.readers_callback, list(readers))
+
+    def _handle_state(self, backend, reader, rs, previous):
+        """Reagiert auf Auflegen/Entfernen einer Karte an einem Lesegerät."""
+        if rs.state & STATE_EMPTY:
+            rs.card_done = False
+            return
+        # Die oberen 16 Bit zählen Auflegen/Entfernen. Springt der Zähler um
+        # mehr als 1, wurde zwischendurch abgenommen und wieder aufgelegt.
+        if (rs.state >> 16) - (previous >> 16) >= 2:
+            rs.card_done = False
+        if not rs.state & STATE_PRESENT or rs.card_done:
+            return
+        start = time.perf_counter()
+        try:
+            data, sw1, sw2 = backend.transmit(reader, GET_UID_APDU)
+        except NoCardError:
+            # Karte wurde schon wieder entfernt -> nächstes Ereignis abwarten
             return
+        except ServiceError:
+            raise
+        except BackendError as e:
+            # Fehler beim Lesen -> Meldung an UI, Karte gilt als gelesen
+            rs.card_done = True
+            self._report_error(f"Lesefehler: {e}", reader)
+            return
+        _DETECT.observe(time.perf_counter() - start)
+        rs.card_done = True
+        if sw1 == 0x90:  # Status 0x90 = OK
+            uid = uid_to_hex(data)
+            if uid:
+                self._post(self.uid_callback, uid, reader, start)
+
+    def _run_poll(self):
+        """
+        Alter Modus: wiederholt verbinden, bis eine Karte aufliegt (nur das
+        erste Lesegerät). Ein Verbindungsobjekt wird für alle Karten
+        wiederverwendet; hängt das Lesegerät (POLL_MAX_FAILURES Fehler in
+        Folge) oder fehlt es, sucht run() nach einer Wartezeit neu.
+        """
+        from smartcard.System import readers
+        from smartcard.Exceptions import NoCardException
+
+        # Verfügbare Lesegeräte prüfen
+        r = readers()
+        if not r:
+            self._set_state(STATE_NO_READER)
+            raise BackendError("Kein NFC-Lesegerät gefunden")
+
+        reader = r[0]  # erstes gefundenes Lesegerät verwenden
+        name = str(reader)
+        self._post(self.error_callback, f"Verwendes Lesegerät: {name}", name)
+        self._reader_up(name)
+        conn = reader.createConnection()
+        failures = 0
 
         # Endlosschleife: wiederholt nach Karten suchen
-        while not self.stop_event.is_set():
-            try:
-                # Verbindung zum Lesegerät herstellen
-                conn = reader.createConnection()
-                conn.connect()
-
-                # UID auslesen
-                data, sw1, sw2 = conn.transmit(GET_UID_APDU)
-                if sw1 == 0x90:  # Status 0x90 = OK
-                    uid = uid_to_hex(data)
-                    if uid:
-                        # UID-Callback thread-sicher in Kivy-Loop posten
-                        Clock.schedule_once(lambda dt: self.uid_callback(uid))
-                        # kurze Pause, um versehentliches Doppelscannen zu vermeiden
-                        time.sleep(1.5)
-
-                conn.disconnect()
-
-            except NoCardException:
-                # keine Karte aufgelegt -> kleine Pause, dann weiter
-                time.sleep(0.2)
-
-            except Exception as e:
-                # Fehler beim Lesen -> Meldung an UI + kurze Pause
-                Clock.schedule_once(
-                    lambda dt: self.error_callback(f"Lesefehler: {e}")
-                )
-                time.sleep(1.0)
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    # Verbindung zur Karte herstellen, UID auslesen, wieder trennen
+                    conn.connect()
+                    try:
+                        start = time.perf_counter()
+                        data, sw1, sw2 = conn.transmit(GET_UID_APDU)
+                        _DETECT.observe(time.perf_counter() - start)
+                    finally:
+                        conn.disconnect()
+                    failures = 0
+                    self._backoff = RESTART_BACKOFF_MIN
+                    if sw1 == 0x90:  # Status 0x90 = OK
+                        uid = uid_to_hex(data)
+                        if uid:
+                            # UID-Callback thread-sicher in Kivy-Loop posten
+                            self._post(self.uid_callback, uid, name, start)
+                            # kurze Pause, um versehentliches Doppelscannen zu vermeiden
+                            self.stop_event.wait(1.5)
+
+                except NoCardException:
+                    # keine Karte aufgelegt -> kleine Pause, dann weiter
+                    failures = 0
+                    self._backoff = RESTART_BACKOFF_MIN
+                    self.stop_event.wait(0.2)
+
+                except Exception as e:
+                    # Fehler beim Lesen -> Meldung an UI + kurze Pause,
+                    # bei wiederholten Fehlern Lesegerät neu suchen (run())
+                    failures += 1
+                    if failures >= POLL_MAX_FAILURES:
+                        raise
+                    self._report_error(f"Lesefehler: {e}", name)
+                    self.stop_event.wait(1.0)
+        finally:
+            self._reader_down(name)
+
+
+class ReaderSupervisor:
+    """
+    Startet und stoppt die Überwachung der Lesegeräte, z.B. beim Wechsel
+    zwischen Start- und Gate-Seite. Der PC/SC-Kontext bleibt dabei erhalten
+    und wird beim nächsten start() weiterverwendet; freigegeben wird er erst
+    mit close().
+    """
+
+    def __init__(self, uid_callback, error_callback, readers_callback=None, mode="event",
+                 backend=None, dispatch=None):
+        """Parameter wie NFCReaderThread (ohne stop_event)."""
+        self.uid_callback = uid_callback
+        self.error_callback = error_callback
+        self.readers_callback = readers_callback
+        self.mode = mode
+        self.backend = backend
+        self.dispatch = dispatch
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Startet den Lese-Thread (nichts passiert, wenn er schon läuft)."""
+        if self.running:
+            if not self.stop_event.is_set():
+                return
+            self.thread.join()    # gerade gestoppt -> erst zu Ende laufen lassen
+            self.backend = self.thread.backend
+        self.stop_event = threading.Event()
+        self.thread = NFCReaderThread(
+            uid_callback=self.uid_callback,
+            error_callback=self.error_callback,
+            stop_event=self.stop_event,
+            mode=self.mode,
+            backend=self.backend,
+            readers_callback=self.readers_callback,
+            close_backend=False,
+            dispatch=self.dispatch,
+        )
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """
+        Stoppt den Lese-Thread und wartet (max. timeout Sekunden) auf sein Ende.
+        Ein laufendes Warten im Treiber wird sofort abgebrochen.
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        if self.thread.backend is not None:
+            self.thread.backend.cancel()
+        self.thread.join(timeout)
+        self.backend = self.thread.backend    # Kontext für den nächsten start() merken
+
+    def close(self):
+        """Stoppt den Thread und gibt den PC/SC-Kontext frei."""
+        self.stop()
+        if self.backend is not None:
+            self.backend.close()
+
+    def health(self):
+        """Zustand der Lesegeräte (siehe NFCReaderThread.health())."""
+        if self.thread is None:
+            return {"state": STATE_STOPPED, "readers": {}, "restarts": 0,
+                    "retry_in": None, "last_error": None}
+        return self.thread.health()
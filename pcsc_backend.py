@@ -0,0 +1,279 @@
+# pcsc_backend.py
+# Dünne Schicht über PC/SC für den ereignisgesteuerten Kartenleser-Modus.
+# - ScardBackend: echtes PC/SC über pyscard (SCardGetStatusChange)
+# - MockBackend:  simuliertes Lesegerät ohne Hardware (Tests, Replay, Entwicklung)
+# Beide Backends haben dieselbe Schnittstelle, siehe NFCReaderThread in nfc_reader.py.
+
+import threading
+
+# Zustandsbits eines Lesegeräts, identisch zu SCARD_STATE_* aus PC/SC
+STATE_UNAWARE = 0x0000
+STATE_CHANGED = 0x0002
+STATE_UNKNOWN = 0x0004
+STATE_UNAVAILABLE = 0x0008
+STATE_EMPTY = 0x0010
+STATE_PRESENT = 0x0020
+
+# Pseudo-Lesegerät von PC/SC: ändert seinen Zustand, wenn ein Lesegerät
+# angeschlossen oder entfernt wird (Hotplug)
+PNP_READER = "\\\\?PnP?\\Notification"
+
+
+class BackendError(Exception):
+    """Fehler der PC/SC-Schicht (Dienst weg, Lesegerät entfernt, ...)."""
+
+
+class NoCardError(BackendError):
+    """Beim Zugriff lag keine Karte (mehr) auf."""
+
+
+class ServiceError(BackendError):
+    """
+    PC/SC-Dienst nicht erreichbar oder Kontext ungültig (pcscd neu gestartet,
+    USB-Reset): der Kontext muss neu aufgebaut werden.
+    """
+
+
+class ScardBackend:
+    """
+    PC/SC über pyscard (smartcard.scard).
+    Statt in einer Schleife zu verbinden, wartet wait_for_change() im Treiber
+    auf das Auflegen/Entfernen einer Karte und verbraucht dabei keine CPU.
+    """
+
+    def __init__(self):
+        from smartcard import scard  # erst hier, damit der Mock ohne pyscard läuft
+        self.scard = scard
+        self.context = None
+
+    def open(self):
+        """
+        Baut den PC/SC-Kontext auf. Ein noch gültiger Kontext wird
+        weiterverwendet (z.B. nach Stoppen/Starten des Lese-Threads).
+        """
+        if self.context is not None:
+            if self.scard.SCardIsValidContext(self.context) == self.scard.SCARD_S_SUCCESS:
+                return
+            self.close()
+        hresult, context = self.scard.SCardEstablishContext(self.scard.SCARD_SCOPE_USER)
+        self._check(hresult, "SCardEstablishContext")
+        self.context = context
+
+    def close(self):
+        """Gibt den PC/SC-Kontext frei."""
+        if self.context is not None:
+            try:
+                self.scard.SCardReleaseContext(self.context)
+            except Exception:
+                pass  # Dienst schon weg -> Kontext ist ohnehin ungültig
+            self.context = None
+
+    def list_readers(self):
+        """Namen aller angeschlossenen Lesegeräte."""
+        hresult, names = self.scard.SCardListReaders(self.context, [])
+        if hresult == self.scard.SCARD_E_NO_READERS_AVAILABLE:
+            return []
+        self._check(hresult, "SCardListReaders")
+        return list(names)
+
+    def wait_for_change(self, states, timeout):
+        """
+        Wartet, bis sich der Zustand eines der Lesegeräte ändert.
+        - states:  dict Lesegerät -> zuletzt bekannter Zustand (STATE_UNAWARE am Anfang)
+        - timeout: max. Wartezeit in Sekunden
+        Rückgabe: dict Lesegerät -> neuer Zustand (leer bei Timeout/Abbruch).
+        Geänderte Lesegeräte haben das Bit STATE_CHANGED gesetzt.
+        PNP_READER kann mit übergeben werden, um Hotplug zu erkennen.
+        """
+        hresult, result = self.scard.SCardGetStatusChange(
+            self.context, int(timeout * 1000), list(states.items())
+        )
+        if hresult in (self.scard.SCARD_E_TIMEOUT, self.scard.SCARD_E_CANCELLED):
+            return {}
+        self._check(hresult, "SCardGetStatusChange")
+        return {reader: event for reader, event, _atr in result}
+
+    def cancel(self):
+        """Weckt ein laufendes wait_for_change() sofort auf."""
+        if self.context is not None:
+            self.scard.SCardCancel(self.context)
+
+    def transmit(self, reader, apdu):
+        """
+        Verbindet mit der aufgelegten Karte, sendet ein APDU und trennt wieder.
+        Rückgabe: (data, sw1, sw2)
+        """
+        s = self.scard
+        hresult, card, protocol = s.SCardConnect(
+            self.context, reader, s.SCARD_SHARE_SHARED, s.SCARD_PROTOCOL_T0 | s.SCARD_PROTOCOL_T1
+        )
+        if hresult in (s.SCARD_E_NO_SMARTCARD, s.SCARD_W_REMOVED_CARD):
+            raise NoCardError(s.SCardGetErrorMessage(hresult))
+        self._check(hresult, "SCardConnect")
+        try:
+            hresult, response = s.SCardTransmit(card, protocol, apdu)
+            if hresult == s.SCARD_W_REMOVED_CARD:
+                raise NoCardError(s.SCardGetErrorMessage(hresult))
+            self._check(hresult, "SCardTransmit")
+        finally:
+            s.SCardDisconnect(card, s.SCARD_LEAVE_CARD)
+        if len(response) < 2:
+            raise BackendError("Antwort ohne Statuswort")
+        return response[:-2], response[-2], response[-1]
+
+    def _check(self, hresult, what):
+        s = self.scard
+        if hresult != s.SCARD_S_SUCCESS:
+            message = f"{what}: {s.SCardGetErrorMessage(hresult)}"
+            if hresult in (s.SCARD_E_NO_SERVICE, s.SCARD_E_SERVICE_STOPPED,
+                           s.SCARD_E_INVALID_HANDLE, s.SCARD_F_COMM_ERROR):
+                raise ServiceError(message)
+            raise BackendError(message)
+
+
+class MockBackend:
+    """
+    Simuliertes PC/SC-Backend ohne Hardware.
+    Karten werden per insert_card()/remove_card() aus einem anderen Thread
+    "aufgelegt", Lesegeräte per add_reader()/remove_reader() an- und
+    abgesteckt; wait_for_change() verhält sich wie beim echten Treiber
+    (inkl. Ereigniszähler in den oberen 16 Bit und PNP_READER).
+    """
+
+    def __init__(self, readers=("Mock Reader 0",)):
+        self._cond = threading.Condition()
+        self._cards = {name: None for name in readers}     # Lesegerät -> UID-Bytes
+        self._events = {name: 0 for name in readers}       # Ereigniszähler
+        self._pnp_events = 0                               # Hotplug-Zähler
+        self._cancelled = False
+        self._service_up = True
+        self._context = False
+        self.opened = 0                                    # Anzahl open() (Kontext neu aufgebaut)
+
+    # --- Steuerung (Test/Simulation) --- #
+
+    def insert_card(self, reader, uid):
+        """Legt eine Karte auf (uid als Hex-String oder Bytes)."""
+        if isinstance(uid, str):
+            uid = bytes.fromhex(uid)
+        with self._cond:
+            self._cards[reader] = list(uid)
+            self._events[reader] += 1
+            self._cond.notify_all()
+
+    def remove_card(self, reader):
+        """Nimmt die Karte vom Lesegerät."""
+        with self._cond:
+            self._cards[reader] = None
+            self._events[reader] += 1
+            self._cond.notify_all()
+
+    def retap(self, reader, uid):
+        """
+        Nimmt die Karte ab und legt sie sofort wieder auf, ohne dass eine
+        Statusabfrage dazwischen liegt (Ereigniszähler springt um 2).
+        """
+        if isinstance(uid, str):
+            uid = bytes.fromhex(uid)
+        with self._cond:
+            self._cards[reader] = list(uid)
+            self._events[reader] += 2
+            self._cond.notify_all()
+
+    def add_reader(self, reader):
+        """Simuliert das Anstecken eines Lesegeräts."""
+        with self._cond:
+            self._cards[reader] = None
+            self._events.setdefault(reader, 0)
+            self._pnp_events += 1
+            self._cond.notify_all()
+
+    def remove_reader(self, reader):
+        """Simuliert das Abziehen eines Lesegeräts."""
+        with self._cond:
+            self._cards.pop(reader, None)
+            self._events[reader] = self._events.get(reader, 0) + 1
+            self._pnp_events += 1
+            self._cond.notify_all()
+
+    def stop_service(self):
+        """Simuliert einen Absturz/Neustart von pcscd: alle Aufrufe schlagen fehl."""
+        with self._cond:
+            self._service_up = False
+            self._context = False
+            self._cond.notify_all()
+
+    def start_service(self):
+        """pcscd läuft wieder (der alte Kontext bleibt ungültig)."""
+        with self._cond:
+            self._service_up = True
+            self._cond.notify_all()
+
+    # --- Backend-Schnittstelle --- #
+
+    def open(self):
+        with self._cond:
+            if not self._service_up:
+                raise ServiceError("SCardEstablishContext: Dienst nicht erreichbar")
+            if not self._context:
+                self._context = True
+                self.opened += 1
+
+    def close(self):
+        with self._cond:
+            self._context = False
+
+    def _check_context(self):
+        if not (self._service_up and self._context):
+            raise ServiceError("Kontext ungültig")
+
+    def list_readers(self):
+        with self._cond:
+            self._check_context()
+            return list(self._cards)
+
+    def wait_for_change(self, states, timeout):
+        with self._cond:
+            self._check_context()
+
+            def changed():
+                return self._cancelled or not self._service_up or any(
+                    self._state(reader) != (state & ~STATE_CHANGED)
+                    for reader, state in states.items()
+                )
+            self._cond.wait_for(changed, timeout)
+            self._check_context()
+            if self._cancelled:
+                self._cancelled = False
+                return {}
+            result = {}
+            for reader, state in states.items():
+                current = self._state(reader)
+                if current != (state & ~STATE_CHANGED):
+                    current |= STATE_CHANGED
+                result[reader] = current
+            return result if any(s & STATE_CHANGED for s in result.values()) else {}
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def transmit(self, reader, apdu):
+        with self._cond:
+            self._check_context()
+            if reader not in self._cards:
+                raise BackendError(f"Lesegerät {reader} nicht vorhanden")
+            uid = self._cards[reader]
+        if uid is None:
+            raise NoCardError("Keine Karte aufgelegt")
+        return list(uid), 0x90, 0x00
+
+    def _state(self, reader):
+        """Aktueller Zustand eines Lesegeräts (Lock wird gehalten)."""
+        if reader == PNP_READER:
+            return self._pnp_events << 16
+        if reader not in self._cards:
+            return STATE_UNKNOWN | STATE_UNAVAILABLE
+        flags = STATE_PRESENT if self._cards[reader] is not None else STATE_EMPTY
+        return (self._events[reader] << 16) | flags
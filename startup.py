@@ -0,0 +1,65 @@
+# startup.py
+# Zeitmessung der Startphasen der App (Importe, DB, Screens, erster Frame,
+# Hintergrund-Aufgaben bis "bereit"). main.py importiert dieses Modul als
+# erstes, damit die Messung möglichst früh beginnt.
+# Die Dauer jeder Phase landet zusätzlich als gate_startup_seconds{phase}
+# im Metrik-Endpunkt (metrics.py).
+
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "gate_startup_seconds", "Dauer der Startphasen in Sekunden", ("phase",)
+)
+
+
+class StartupTrace:
+    """
+    Sammelt Startphasen mit Beginn (relativ zum Start) und Dauer.
+    Phasen dürfen in mehreren Threads gleichzeitig laufen.
+    """
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []        # (name, beginn_s, dauer_s, thread)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Misst den with-Block als Phase `name`."""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, begin, time.perf_counter() - begin)
+
+    def mark(self, name, since=None):
+        """
+        Zeitpunkt ohne eigene Dauer, z.B. "erster Frame". Mit `since`
+        (perf_counter-Wert) wird die Zeit ab dort als Dauer eingetragen,
+        sonst die Zeit seit Programmstart.
+        """
+        now = time.perf_counter()
+        begin = since if since is not None else self.start
+        self._add(name, begin, now - begin)
+
+    def _add(self, name, begin, duration):
+        with self._lock:
+            self.phases.append((name, begin - self.start, duration, threading.current_thread().name))
+        STARTUP_SECONDS.labels(name).set(duration)
+
+    def report(self):
+        """Übersicht als Text (eine Zeile pro Phase, nach Beginn sortiert)."""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+        lines = ["Start-Phasen (ab Programmstart):"]
+        for name, begin, duration, thread in phases:
+            lines.append(f"  {begin * 1000:8.1f} ms  +{duration * 1000:8.1f} ms  {name:<16} [{thread}]")
+        return "\n".join(lines)
+
+
+# Messung des laufenden Prozesses (ab Import dieses Moduls)
+TRACE = StartupTrace()
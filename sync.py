@@ -0,0 +1,261 @@
+# sync.py
+# Abgleich des Scan-Logs (entries) zwischen mehreren Gates im lokalen Netz.
+# - Jedes Gate stellt seine eigenen Scans per HTTP bereit (SyncServer)
+# - Jedes Gate holt regelmäßig die neuen Scans der anderen (SyncWorker),
+#   gebündelt und nur ab der zuletzt übernommenen Sequenznummer (entries.id)
+# - Offline-first: Netzwerkfehler verzögern nur den Abgleich, Scans am Gate
+#   laufen unabhängig davon weiter
+# - Übernommene erlaubte Zutritte landen sofort im Karten-Index, damit die
+#   Stunden-Sperre auch Scans an anderen Gates berücksichtigt
+#
+# - das Scan-Log enthält UIDs: im Netz (nicht nur 127.0.0.1) antwortet der
+#   Server nur mit gemeinsamem Token (Header X-Gate-Token)
+#
+# Mehrere Knoten lokal testen (je ein Terminal, UIDs über stdin eingeben):
+#   python sync.py --db /tmp/a.db --port 8701 --peer http://127.0.0.1:8702
+#   python sync.py --db /tmp/b.db --port 8702 --peer http://127.0.0.1:8701
+# Im Netz:
+#   python sync.py --db /tmp/a.db --host 0.0.0.0 --token geheim --peer http://gate-b.local:8701
+
+import argparse
+import hmac
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from http.client import HTTPException
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+from db.database import (
+    apply_remote_entries, from_ms, get_meta, local_entries_since, set_meta, sync_cursor,
+)
+
+# Standard-Port des Sync-Servers
+SYNC_PORT = 8701
+
+# Max. Scans pro Abruf
+SYNC_BATCH_SIZE = 500
+
+# Header mit dem gemeinsamen Token der Gates (auch für cardsync.py)
+TOKEN_HEADER = "X-Gate-Token"
+
+# Adressen, an denen ein Server ohne Token lauschen darf
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def check_listen(host, token):
+    """Ein Server im Netz braucht ein Token (sonst ValueError)."""
+    if not token and host not in LOCAL_HOSTS:
+        raise ValueError(f"Server auf {host} nur mit Token (sonst nur 127.0.0.1)")
+
+
+def token_ok(headers, token):
+    """True, wenn kein Token verlangt ist oder die Anfrage das richtige mitschickt."""
+    if not token:
+        return True
+    return hmac.compare_digest(headers.get(TOKEN_HEADER, "").encode(), token.encode())
+
+
+def token_headers(token):
+    """Header für Anfragen an einen Server mit Token."""
+    return {TOKEN_HEADER: token} if token else {}
+
+
+def node_id(db):
+    """Eindeutige ID dieses Gates (wird beim ersten Aufruf erzeugt und gespeichert)."""
+    value = get_meta(db.reader(), "node_id")
+    if value is None:
+        value = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        with db.writer() as conn:
+            set_meta(conn, "node_id", value)
+    return value
+
+
+class SyncServer(threading.Thread):
+    """
+    Stellt die lokalen Scans bereit:
+      GET /entries?since=<seq>&limit=<n>
+      -> {"node": "...", "entries": [[seq, uid, ts_ms, allowed, reason, reader,
+                                      team, card_type, code], ...]}
+    Läuft in einem Thread mit eigener Leseverbindung.
+    Standardmäßig nur lokal erreichbar; im Netz (host="0.0.0.0") nur mit
+    `token`, Anfragen ohne passendes Token bekommen 403.
+    """
+
+    def __init__(self, db, port=SYNC_PORT, host="127.0.0.1", token=None):
+        check_listen(host, token)
+        super().__init__(daemon=True, name="SyncServer")
+        self.db = db
+        self.node = node_id(db)
+        self.token = token
+        self.httpd = HTTPServer((host, port), self._make_handler())
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not token_ok(self.headers, server.token):
+                    self.send_error(403)
+                    return
+                url = urlparse(self.path)
+                if url.path != "/entries":
+                    self.send_error(404)
+                    return
+                query = parse_qs(url.query)
+                try:
+                    since = int(query.get("since", ["0"])[0])
+                    limit = min(int(query.get("limit", [SYNC_BATCH_SIZE])[0]), SYNC_BATCH_SIZE)
+                except ValueError:
+                    self.send_error(400)
+                    return
+                rows = local_entries_since(server.db.reader(), since, limit)
+                body = json.dumps({"node": server.node, "entries": rows}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keine Zugriffslogs auf der Konsole
+
+        return Handler
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SyncWorker(threading.Thread):
+    """
+    Holt regelmäßig neue Scans von allen Gegenstellen und übernimmt sie.
+    - peers:        Liste von URLs (z.B. "http://gate-b:8701")
+    - on_entries:   Callback(list von (uid, datetime, allowed, node, reader, team,
+                    card_type, code)) für übernommene Scans, z.B.
+                    GateCore.note_remote_entries für Stunden-Sperre und fraud.py
+    - interval:     Pause zwischen zwei Runden (Sekunden)
+    - token:        gemeinsames Token der Gates (siehe SyncServer)
+    Nicht erreichbare Gegenstellen und DB-Fehler (z.B. gesperrt) werden mit
+    wachsender Pause erneut versucht.
+    """
+
+    def __init__(self, db, peers, on_entries=None, interval=1.0, timeout=2.0, max_backoff=30.0,
+                 token=None):
+        super().__init__(daemon=True, name="SyncWorker")
+        self.db = db
+        self.peers = list(peers)
+        self.on_entries = on_entries
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.token = token
+        self.stop_event = threading.Event()
+        self.status = {url: "unbekannt" for url in self.peers}   # für Anzeige/Diagnose
+        self._retry_at = {url: 0.0 for url in self.peers}
+        self._backoff = {url: interval for url in self.peers}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            for url in self.peers:
+                if time.monotonic() < self._retry_at[url]:
+                    continue
+                try:
+                    while self.pull(url) == SYNC_BATCH_SIZE:
+                        pass  # volle Seite -> gleich weiterholen
+                    self.status[url] = "ok"
+                    self._backoff[url] = self.interval
+                except (URLError, OSError, ValueError, HTTPException, sqlite3.Error) as e:
+                    if isinstance(e, sqlite3.Error):
+                        self.status[url] = f"nicht übernommen (DB): {e}"
+                    else:
+                        self.status[url] = f"nicht erreichbar: {e}"
+                    self._retry_at[url] = time.monotonic() + self._backoff[url]
+                    self._backoff[url] = min(self._backoff[url] * 2, self.max_backoff)
+            self.stop_event.wait(self.interval)
+
+    def pull(self, url):
+        """Holt eine Seite neuer Scans von einer Gegenstelle. Rückgabe: Anzahl Zeilen."""
+        known_node, seq = sync_cursor(self.db.reader(), url)
+        data = self._fetch(url, seq)
+        if known_node is not None and data["node"] != known_node:
+            # Gegenstelle wurde neu aufgesetzt -> ihre Sequenz beginnt von vorn
+            seq = 0
+            data = self._fetch(url, seq)
+        rows = data["entries"]
+        if not rows:
+            return 0
+        with self.db.writer() as conn:
+            apply_remote_entries(conn, url, data["node"], rows)
+        if self.on_entries:
+            node = data["node"]
+            self.on_entries([
+                (uid, from_ms(ts), bool(allowed), node, reader, team, card_type, code)
+                for _, uid, ts, allowed, _reason, reader, team, card_type, code in rows
+            ])
+        return len(rows)
+
+    def _fetch(self, url, seq):
+        request = Request(f"{url}/entries?since={seq}&limit={SYNC_BATCH_SIZE}",
+                          headers=token_headers(self.token))
+        with urlopen(request, timeout=self.timeout) as resp:
+            return json.loads(resp.read())
+
+
+def main():
+    """Headless Sync-Knoten zum Testen mit mehreren lokalen Prozessen."""
+    from db.database import Database
+    from gate_core import GateCore
+
+    parser = argparse.ArgumentParser(description="Gate-Knoten mit Log-Abgleich (headless)")
+    parser.add_argument("--db", required=True, help="Pfad zur SQLite-DB dieses Knotens")
+    parser.add_argument("--port", type=int, default=SYNC_PORT)
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 = im Netz (nur mit --token)")
+    parser.add_argument("--token", help="gemeinsames Token aller Gates")
+    parser.add_argument("--peer", action="append", default=[], help="URL einer Gegenstelle")
+    parser.add_argument("--csv", help="Karten aus dieser CSV importieren")
+    parser.add_argument("--team", default="1. Herren")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.csv:
+        from db.database import import_from_csv
+        with db.writer() as conn:
+            print(import_from_csv(conn, args.csv))
+    core = GateCore(db)
+    core.team = args.team
+    core.start()
+
+    server = SyncServer(db, port=args.port, host=args.host, token=args.token)
+    server.start()
+    worker = SyncWorker(db, args.peer, on_entries=core.note_remote_entries, token=args.token)
+    worker.start()
+    print(f"Knoten {server.node} auf Port {args.port}, Gegenstellen: {args.peer or '-'}")
+    print("UID eingeben (Enter), Strg+D beendet.")
+    try:
+        for line in iter(input, None):
+            uid = line.strip().upper()
+            if uid:
+                verdict = core.process(uid, reader=f"port{args.port}")
+                print(f"{uid}: {'erlaubt' if verdict.allowed else 'verweigert'} ({verdict.log_reason})")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    worker.stop()
+    server.stop()
+    core.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
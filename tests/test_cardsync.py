@@ -0,0 +1,157 @@
+# tests/test_cardsync.py
+# Verteilung der Kartenliste (cardsync.py): CardServer auf 127.0.0.1 und ein
+# Gate mit je einer temporären DB. Abgleich nach Einfügen/Ändern/Löschen,
+# Snapshot und Delta, Long-Poll, gzip, Token.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_cardsync
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from cardsync import GZIP_MIN_BYTES, CardServer, CardSyncWorker
+from db.database import CARD_FIELDS, Database, card_cursor, card_seq
+
+INSERT_SQL = f"INSERT INTO cards({', '.join(CARD_FIELDS)}) VALUES({', '.join('?' * len(CARD_FIELDS))})"
+
+
+def card_row(i, name="Max Mustermann", teams="*"):
+    return (f"{i:08X}", f"{name} {i}", "Dauerkarte", "2025-07-01", "2026-06-30", teams, "")
+
+
+class CardSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server_db = Database(os.path.join(self.dir, "kasse.db"))
+        self.gate_db = Database(os.path.join(self.dir, "gate.db"))
+        self.server = None
+
+    def tearDown(self):
+        if self.server:
+            self.server.stop()
+        self.server_db.close()
+        self.gate_db.close()
+        shutil.rmtree(self.dir)
+
+    def serve(self, token=None):
+        self.server = CardServer(self.server_db, port=0, token=token)
+        self.server.start()
+        self.url = f"http://127.0.0.1:{self.server.httpd.server_address[1]}"
+        return self.url
+
+    def write(self, sql, rows):
+        with self.server_db.writer() as conn:
+            conn.executemany(sql, rows)
+
+    def cards(self, database):
+        return database.reader().execute(
+            f"SELECT {', '.join(CARD_FIELDS)} FROM cards ORDER BY uid").fetchall()
+
+    def assert_converged(self):
+        self.assertEqual(self.cards(self.gate_db), self.cards(self.server_db))
+        self.assertEqual(card_cursor(self.gate_db.reader()),
+                         (self.server.node, card_seq(self.server_db.reader())))
+
+    def test_inserts_updates_and_deletes_converge(self):
+        self.write(INSERT_SQL, [card_row(i) for i in range(3)])
+        worker = CardSyncWorker(self.gate_db, self.serve())
+        self.assertEqual(worker.pull(), (3, 0))
+        self.assert_converged()
+
+        self.write(INSERT_SQL, [card_row(3)])
+        self.write("UPDATE cards SET teams=? WHERE uid=?", [("A-Jugend", "00000001")])
+        self.write("DELETE FROM cards WHERE uid=?", [("00000000",)])
+        self.assertEqual(worker.pull(), (2, 1))
+        self.assert_converged()
+        self.assertEqual(worker.pull(), (0, 0))
+
+    def test_snapshot_first_then_delta(self):
+        self.write(INSERT_SQL, [card_row(i) for i in range(3)])
+        worker = CardSyncWorker(self.gate_db, self.serve())
+        with mock.patch.object(worker, "_apply_snapshot", wraps=worker._apply_snapshot) as snapshot:
+            worker.pull()
+            self.assertEqual(snapshot.call_count, 1)
+            self.write(INSERT_SQL, [card_row(3)])
+            self.assertEqual(worker.pull(), (1, 0))
+            self.assertEqual(snapshot.call_count, 1)     # nur Delta
+
+            # Gate kennt einen Stand, den der Server nicht hat -> wieder Snapshot
+            with self.gate_db.writer() as conn:
+                conn.execute("UPDATE meta SET value='999' WHERE key='card_seq'")
+            worker.pull()
+            self.assertEqual(snapshot.call_count, 2)
+        self.assert_converged()
+
+    def test_long_poll(self):
+        worker = CardSyncWorker(self.gate_db, self.serve())
+        worker.pull()
+        start = time.monotonic()
+        self.assertEqual(worker.pull(wait=0.5), (0, 0))    # keine Änderung: nach wait leer zurück
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+
+        timer = threading.Timer(0.3, self.write, (INSERT_SQL, [card_row(1)]))
+        timer.start()
+        start = time.monotonic()
+        self.assertEqual(worker.pull(wait=10), (1, 0))     # Änderung beendet das Warten
+        self.assertLess(time.monotonic() - start, 5)
+        timer.join()
+        self.assert_converged()
+
+    def test_large_answers_are_gzipped(self):
+        self.write(INSERT_SQL, [card_row(i) for i in range(100)])
+        url = self.serve()
+        request = Request(url + "/cards/snapshot", headers={"Accept-Encoding": "gzip"})
+        with urlopen(request, timeout=5) as resp:
+            self.assertEqual(resp.headers.get("Content-Encoding"), "gzip")
+            body = gzip.decompress(resp.read())
+        self.assertGreaterEqual(len(body), GZIP_MIN_BYTES)
+        self.assertEqual(len(json.loads(body)["cards"]), 100)
+        with urlopen(url + "/cards/snapshot", timeout=5) as resp:    # Client ohne gzip
+            self.assertIsNone(resp.headers.get("Content-Encoding"))
+            self.assertEqual(len(json.loads(resp.read())["cards"]), 100)
+        with urlopen(Request(url + "/cards/delta?since=0",
+                             headers={"Accept-Encoding": "gzip"}), timeout=5) as resp:
+            self.assertEqual(resp.headers.get("Content-Encoding"), "gzip")
+
+        self.assertEqual(CardSyncWorker(self.gate_db, url).pull(), (100, 0))
+        self.assert_converged()
+
+    def test_token_is_required(self):
+        self.write(INSERT_SQL, [card_row(1)])
+        url = self.serve(token="geheim")
+        for token in (None, "falsch"):
+            with self.assertRaises(HTTPError) as ctx:
+                CardSyncWorker(self.gate_db, url, token=token).pull()
+            self.assertEqual(ctx.exception.code, 403)
+        self.assertEqual(self.cards(self.gate_db), [])
+        self.assertEqual(CardSyncWorker(self.gate_db, url, token="geheim").pull(), (1, 0))
+
+    def test_worker_follows_changes(self):
+        changed = threading.Event()
+        worker = CardSyncWorker(self.gate_db, self.serve(), on_change=changed.set, wait=1.0)
+        worker.start()
+        try:
+            self.write(INSERT_SQL, [card_row(i) for i in range(2)])
+            self.assertTrue(changed.wait(5))
+            expected = f"ok (Stand {card_seq(self.server_db.reader())})"
+            deadline = time.monotonic() + 5
+            while worker.status != expected:
+                self.assertLess(time.monotonic(), deadline, worker.status)
+                time.sleep(0.05)
+            self.assert_converged()
+        finally:
+            worker.stop()
+            worker.join(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
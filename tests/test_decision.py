@@ -0,0 +1,237 @@
+# tests/test_decision.py
+# Zutrittsentscheidung (decision.py): Gültigkeit, Team, Schutzfrist,
+# Sperrfenster, Zutritte an anderen Gates. Zusätzlich ein Vergleich mit den
+# Regeln in ihrer ursprünglichen Form (früher direkt in GateApp.on_uid) über
+# alle Kombinationen eines Rasters. Cache der Gültigkeitsprüfung: Tageswechsel,
+# geänderte Karten (CardIndex.refresh), Team-Bits.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_decision
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+from db.card_index import ALL_TEAMS, CardIndex, _compile_teams, _make_card, norm_team, team_bit
+from db.database import Database
+from decision import (
+    CODE_EXPIRED, CODE_GRACE, CODE_INVALID_DATE, CODE_NOT_YET_VALID, CODE_OK, CODE_REUSED,
+    CODE_TEAM, CODE_UNKNOWN, DecisionEngine,
+)
+
+NOW = datetime(2026, 3, 14, 15, 0)
+TEAM = "1. Herren"
+
+
+def card(valid_from="2025-07-01", valid_until="2026-06-30", teams="1.Herren", card_type="Dauerkarte",
+         uid="04A1B2C3"):
+    """IndexedCard wie aus der Tabelle cards geladen."""
+    return _make_card((uid, "Max Mustermann", card_type, valid_from, valid_until, teams, ""))
+
+
+def reference(card, last_allowed, team, now):
+    """
+    Die Regeln in ihrer ursprünglichen Form (Schutzfrist 1 Minute,
+    Sperrfenster 1 Stunde). Rückgabe: (erlaubt, Log-Text)
+    """
+    reasons = []
+    today = now.date()
+    for value, text, too_early in ((card.valid_from, "Startdatum", True),
+                                   (card.valid_until, "Enddatum", False)):
+        if not value:
+            continue
+        try:
+            day = datetime.fromisoformat(value).date()
+        except ValueError:
+            reasons.append(f"Ungültiges {text}")
+            continue
+        if too_early and today < day:
+            reasons.append(f"Karte noch nicht gültig (ab {value})")
+        elif not too_early and today > day:
+            reasons.append(f"Karte abgelaufen (gültig bis {value})")
+    if "*" not in card.teams and norm_team(team) not in card.teams:
+        reasons.append(f"Keine Berechtigung für {team}")
+    if reasons:
+        return False, "; ".join(reasons)
+    if last_allowed:
+        delta = now - last_allowed
+        if delta < timedelta(minutes=1):
+            return True, "Schutzfrist erneuter Scan"
+        if delta < timedelta(hours=1):
+            return False, f"Schon vor {delta.seconds // 60} Minuten verwendet"
+    return True, "OK"
+
+
+class DecisionTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = DecisionEngine()
+
+    def decide(self, c, last_allowed=None, team=TEAM, now=NOW, last_remote=None):
+        return self.engine.decide(c, last_allowed, team, now, last_remote=last_remote)
+
+    def test_unknown_card(self):
+        verdict = self.decide(None)
+        self.assertFalse(verdict.allowed)
+        self.assertEqual(verdict.code, CODE_UNKNOWN)
+
+    def test_valid_card(self):
+        verdict = self.decide(card())
+        self.assertTrue(verdict.allowed)
+        self.assertEqual((verdict.code, verdict.reasons, verdict.log_reason), (CODE_OK, [], "OK"))
+
+    def test_expired_card(self):
+        verdict = self.decide(card(valid_until="2026-03-13"))
+        self.assertEqual(verdict.code, CODE_EXPIRED)
+        self.assertEqual(verdict.reasons, ["Karte abgelaufen (gültig bis 2026-03-13)"])
+        self.assertTrue(self.decide(card(valid_until="2026-03-14", uid="04000002")).allowed)
+
+    def test_not_yet_valid_and_invalid_dates(self):
+        self.assertEqual(self.decide(card(valid_from="2026-03-15")).code, CODE_NOT_YET_VALID)
+        self.assertEqual(self.decide(card(valid_from="kaputt", uid="04000002")).code, CODE_INVALID_DATE)
+        self.assertEqual(self.decide(card(valid_until="31.12.", uid="04000003")).code,
+                         CODE_INVALID_DATE)
+        self.assertTrue(self.decide(card(valid_from="", valid_until="", uid="04000004")).allowed)
+
+    def test_wrong_team(self):
+        verdict = self.decide(card(teams="A-Jugend"))
+        self.assertEqual(verdict.code, CODE_TEAM)
+        self.assertEqual(verdict.reasons, [f"Keine Berechtigung für {TEAM}"])
+        self.assertTrue(self.decide(card(teams="*", uid="04000002")).allowed)
+        self.assertTrue(self.decide(card(teams="A-Jugend, 1. Herren", uid="04000003")).allowed)
+
+    def test_all_reasons_in_rule_order(self):
+        verdict = self.decide(card(valid_from="2026-04-01", valid_until="2026-03-01", teams="A-Jugend"))
+        self.assertEqual(verdict.code, CODE_NOT_YET_VALID)
+        self.assertEqual(len(verdict.reasons), 3)
+        self.assertEqual(verdict.log_reason, "; ".join(verdict.reasons))
+
+    def test_grace_period(self):
+        verdict = self.decide(card(), last_allowed=NOW - timedelta(seconds=30))
+        self.assertTrue(verdict.allowed)
+        self.assertEqual(verdict.code, CODE_GRACE)
+
+    def test_reuse_after_allowed_entry(self):
+        verdict = self.decide(card(), last_allowed=NOW - timedelta(minutes=10, seconds=5))
+        self.assertFalse(verdict.allowed)
+        self.assertEqual((verdict.code, verdict.minutes), (CODE_REUSED, 10))
+        self.assertEqual(self.decide(card(), last_allowed=NOW - timedelta(hours=1)).code, CODE_OK)
+
+    def test_reuse_window_per_card_type(self):
+        engine = DecisionEngine(reuse_windows={"Dauerkarte": timedelta(hours=2)})
+        ninety = NOW - timedelta(minutes=90)
+        self.assertEqual(engine.decide(card(), ninety, TEAM, NOW).code, CODE_REUSED)
+        self.assertEqual(engine.decide(card(card_type="Tageskarte"), ninety, TEAM, NOW).code, CODE_OK)
+        self.assertEqual(engine.max_reuse_window, timedelta(hours=2))
+
+    def test_remote_tap_inside_grace_period_is_denied(self):
+        verdict = self.decide(card(), last_remote=NOW - timedelta(seconds=20))
+        self.assertFalse(verdict.allowed)
+        self.assertEqual((verdict.code, verdict.minutes), (CODE_REUSED, 0))
+        # eigener Scan in der Schutzfrist ändert daran nichts
+        verdict = self.decide(card(), last_allowed=NOW - timedelta(seconds=5),
+                              last_remote=NOW - timedelta(seconds=20))
+        self.assertEqual(verdict.code, CODE_REUSED)
+        self.assertEqual(self.decide(card(), last_remote=NOW - timedelta(hours=2)).code, CODE_OK)
+
+    def test_invalid_card_is_denied_before_reuse_check(self):
+        verdict = self.decide(card(teams="A-Jugend"), last_allowed=NOW - timedelta(seconds=5))
+        self.assertEqual(verdict.code, CODE_TEAM)
+
+    def test_same_result_as_original_rules(self):
+        dates = ("", "2025-07-01", "2026-03-14", "2026-03-15", "kaputt")
+        teams = ("*", "1.Herren", "1. herren, A-Jugend", "A-Jugend", "")
+        selected = ("1. Herren", "A-Jugend", "B-Jugend")
+        last = (None, timedelta(seconds=0), timedelta(seconds=59), timedelta(minutes=1),
+                timedelta(minutes=59, seconds=59), timedelta(hours=1), timedelta(days=1))
+        days = (NOW - timedelta(days=1), NOW, NOW + timedelta(days=1))
+        count = 0
+        for i, (vf, vu, team_text) in enumerate(itertools.product(dates, dates, teams)):
+            c = card(valid_from=vf, valid_until=vu, teams=team_text, uid=f"{i:08X}")
+            for team, delta, now in itertools.product(selected, last, days):
+                last_allowed = None if delta is None else now - delta
+                verdict = self.decide(c, last_allowed, team, now)
+                self.assertEqual((verdict.allowed, verdict.log_reason),
+                                 reference(c, last_allowed, team, now),
+                                 (vf, vu, team_text, team, delta, now))
+                count += 1
+        self.assertEqual(count, 125 * 3 * 7 * 3)
+
+
+class EligibilityCacheTest(unittest.TestCase):
+    """Pro (Team, Tag) gecachte Gültigkeitsprüfung."""
+
+    def setUp(self):
+        self.engine = DecisionEngine()
+
+    def code(self, c, team=TEAM, now=NOW):
+        return self.engine.decide(c, None, team, now).code
+
+    def test_day_rollover(self):
+        c = card(valid_until="2026-03-14")
+        self.assertEqual(self.code(c, now=datetime(2026, 3, 14, 23, 59)), CODE_OK)
+        self.assertEqual(self.code(c, now=datetime(2026, 3, 15, 0, 0)), CODE_EXPIRED)
+
+        c = card(valid_from="2026-03-15", uid="04000002")
+        self.assertEqual(self.code(c, now=datetime(2026, 3, 14, 23, 59)), CODE_NOT_YET_VALID)
+        self.assertEqual(self.code(c, now=datetime(2026, 3, 15, 0, 0)), CODE_OK)
+
+    def test_team_change_is_not_served_from_cache(self):
+        c = card(teams="A-Jugend")
+        self.assertEqual(self.code(c), CODE_TEAM)
+        self.assertEqual(self.code(c, team="A-Jugend"), CODE_OK)
+        self.assertEqual(self.code(c), CODE_TEAM)
+
+    def test_changed_card_after_index_refresh(self):
+        tmp = tempfile.mkdtemp()
+        db = Database(os.path.join(tmp, "cards.db"))
+        try:
+            sql = ("INSERT INTO cards(uid, name, card_type, valid_from, valid_until, teams, notes) "
+                   "VALUES(?,?,?,?,?,?,?)")
+            with db.writer() as conn:
+                conn.execute(sql, ("04A1B2C3", "Max", "Dauerkarte", "2025-07-01", "2026-06-30",
+                                   "A-Jugend", ""))
+            index = CardIndex(db.reader())
+            index.load()
+            old = index.get("04A1B2C3")
+            self.assertEqual(self.code(old), CODE_TEAM)
+
+            with db.writer() as conn:
+                conn.execute("UPDATE cards SET teams=? WHERE uid=?", ("A-Jugend, 1.Herren", "04A1B2C3"))
+            self.assertTrue(index.db_changed())
+            self.assertEqual(index.refresh(), (0, 1, 0))
+            new = index.get("04A1B2C3")
+            self.assertIsNot(new, old)
+            self.assertEqual(self.code(new), CODE_OK)      # gleicher Tag, gleiches Team
+            self.assertEqual(self.code(old), CODE_TEAM)
+
+            with db.writer() as conn:
+                conn.execute("DELETE FROM cards WHERE uid=?", ("04A1B2C3",))
+            self.assertEqual(index.refresh(), (0, 0, 1))
+            self.assertEqual(self.code(index.get("04A1B2C3")), CODE_UNKNOWN)
+        finally:
+            db.close()
+            shutil.rmtree(tmp)
+
+    def test_team_bits(self):
+        unknown = f"Gäste {uuid.uuid4().hex[:8]}"       # Team, das keine Karte kennt
+        self.assertEqual(_compile_teams("*")[1], ALL_TEAMS)
+        self.assertEqual(_compile_teams("A-Jugend, *")[1], ALL_TEAMS)
+        self.assertEqual(self.code(card(teams="*"), team=unknown), CODE_OK)
+
+        c = card(teams="1.Herren, A-Jugend")
+        self.assertEqual(self.code(c, team=unknown), CODE_TEAM)
+        self.assertFalse(c.team_mask & team_bit(norm_team(unknown)))
+        self.assertEqual(self.code(card(teams="", uid="04000002")), CODE_TEAM)
+
+        # Schreibweisen desselben Teams teilen sich ein Bit
+        self.assertEqual(team_bit(norm_team("1. Herren")), team_bit(norm_team("1.herren")))
+        for variant in ("1. Herren", "1.Herren", "1 . HERREN"):
+            self.assertEqual(self.code(c, team=variant), CODE_OK, variant)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_entry_writer.py
+# EntryWriter: ein Batch (entries + unknown_scans) ist eine Transaktion.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_entry_writer
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from db import entry_writer as entry_writer_module
+from db.database import Database, entry_row, unknown_row
+from db.entry_writer import EntryWriter, _UnknownScan
+
+NOW = datetime(2026, 3, 14, 14, 0)
+
+
+class EntryWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.dir, "cards.db"))
+        self.writer = EntryWriter(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def count(self, table):
+        return self.db.reader().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def batch(self):
+        for row in (entry_row("04A1B2C3", True, "OK", NOW, code="ok"),
+                    _UnknownScan(unknown_row("DEADBEEF", NOW, "Leser 1"))):
+            self.writer.queue.put(row)      # für task_done() in _done()
+        return [self.writer.queue.get(), self.writer.queue.get()]
+
+    def test_batch_is_written(self):
+        self.assertTrue(self.writer._write(self.batch()))
+        self.assertEqual(self.count("entries"), 1)
+        self.assertEqual(self.count("unknown_scans"), 1)
+
+    def test_failed_batch_is_rolled_back_completely(self):
+        batch = self.batch()
+        with mock.patch.object(entry_writer_module, "count_unknown_scans",
+                               side_effect=sqlite3.OperationalError("disk I/O error")):
+            self.assertFalse(self.writer._write(batch))     # ohne Journal: bleibt im Speicher
+        self.assertEqual(self.count("entries"), 0)
+        self.assertEqual(len(batch), 2)
+        self.assertTrue(self.writer._write(batch))
+        self.assertEqual(self.count("entries"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
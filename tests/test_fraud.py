@@ -0,0 +1,137 @@
+# tests/test_fraud.py
+# Missbrauchserkennung (fraud.py): Reihenfolge und Grenzen von SlidingWindow,
+# Schwellen der Regeln, erneuter Alarm bei anhaltender Auffälligkeit.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_fraud
+
+import unittest
+from datetime import datetime, timedelta
+
+from decision import CODE_GRACE, CODE_OK, CODE_REUSED, CODE_UNKNOWN
+from fraud import (
+    CARD_TYPE_MIN, CARD_TYPE_WINDOW, DENIED_MIN, DENIED_WINDOW, RULE_CARD_TYPE_DENIALS,
+    RULE_DENIED_MULTI, RULE_TEAM_HOPPING, RULE_UNKNOWN_BURST, UNKNOWN_MIN, UNKNOWN_WINDOW,
+    FraudDetector, SlidingWindow,
+)
+
+START = datetime(2026, 3, 14, 14, 0)
+
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+
+class SlidingWindowTest(unittest.TestCase):
+    def times(self, events):
+        return [ts for ts, _ in events]
+
+    def test_out_of_order_events_are_sorted(self):
+        window = SlidingWindow(10)
+        for ts in (1000, 5000, 3000, 4000, 2000):
+            events = window.add("a", ts)
+        self.assertEqual(self.times(events), [1000, 2000, 3000, 4000, 5000])
+
+    def test_window_ends_at_newest_event(self):
+        window = SlidingWindow(10)
+        window.add("a", 1000)
+        window.add("a", 8000)
+        self.assertEqual(self.times(window.add("a", 12000)), [8000, 12000])
+        # verspätetes Ereignis außerhalb des Fensters fällt sofort raus
+        self.assertEqual(self.times(window.add("a", 1500)), [8000, 12000])
+        # verspätetes Ereignis im Fenster wird einsortiert
+        self.assertEqual(self.times(window.add("a", 9000)), [8000, 9000, 12000])
+
+    def test_max_events_drops_oldest(self):
+        window = SlidingWindow(60, max_events=3)
+        for ts in (1000, 2000, 3000):
+            window.add("a", ts)
+        self.assertEqual(self.times(window.add("a", 4000)), [2000, 3000, 4000])
+        self.assertEqual(self.times(window.add("a", 2500)), [2500, 3000, 4000])
+        # älter als alles Gespeicherte bei vollem Schlüssel -> nicht übernommen
+        self.assertEqual(self.times(window.add("a", 1500)), [2500, 3000, 4000])
+
+    def test_max_keys_drops_least_recently_used(self):
+        window = SlidingWindow(60, max_keys=2)
+        window.add("a", 1000)
+        window.add("b", 1000)
+        window.add("a", 2000)
+        window.add("c", 3000)
+        self.assertEqual(len(window), 2)
+        self.assertEqual(self.times(window.add("b", 4000)), [4000])     # "b" war rausgefallen
+        self.assertEqual(self.times(window.add("c", 5000)), [3000, 5000])
+
+
+class FraudDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = FraudDetector()
+
+    def rules(self, alerts):
+        return [alert.rule for alert in alerts]
+
+    def unknown(self, seconds, uid, reader="Leser 1"):
+        return self.detector.scan(at(seconds), uid, False, CODE_UNKNOWN, reader)
+
+    def denied(self, seconds, uid, reader, card_type="Dauerkarte"):
+        return self.detector.scan(at(seconds), uid, False, CODE_REUSED, reader, "1. Herren", card_type)
+
+    def test_unknown_burst(self):
+        for i in range(UNKNOWN_MIN - 1):
+            self.assertEqual(self.unknown(i, f"{i:08X}"), [])
+        self.assertEqual(self.unknown(UNKNOWN_MIN, f"{0:08X}"), [])       # gleiche UID zählt nicht neu
+        self.assertEqual(self.unknown(UNKNOWN_MIN, f"{0:08X}", "Leser 2"), [])
+        alerts = self.unknown(UNKNOWN_MIN, "FFFFFFFF")
+        self.assertEqual(self.rules(alerts), [RULE_UNKNOWN_BURST])
+        self.assertEqual(alerts[0].reader, "Leser 1")
+        self.assertEqual(self.unknown(UNKNOWN_MIN + 1, "FFFFFFFE"), [])  # ein Alarm je Fenster
+
+    def test_denied_multi(self):
+        self.assertEqual(self.denied(0, "04A1B2C3", "Leser 1"), [])
+        self.assertEqual(self.denied(10, "04A1B2C3", "Leser 1"), [])
+        self.assertEqual(self.denied(20, "04A1B2C3", "Leser 1"), [])    # nur ein Lesegerät
+        alerts = self.denied(30, "04A1B2C3", "Leser 2")
+        self.assertEqual(self.rules(alerts), [RULE_DENIED_MULTI])
+        self.assertEqual(alerts[0].uid, "04A1B2C3")
+
+        self.assertEqual(self.denied(0, "04000001", "Leser 1"), [])
+        for i in range(1, DENIED_MIN - 1):
+            self.assertEqual(self.denied(i * 10, "04000001", f"Leser {i + 1}"), [])
+        self.assertEqual(self.denied(DENIED_WINDOW + 20, "04000001", "Leser 1"), [])  # Fenster vorbei
+
+    def test_card_type_denials(self):
+        for i in range(CARD_TYPE_MIN - 1):
+            self.assertEqual(self.denied(i, f"{i:08X}", "Leser 1", "Tageskarte"), [])
+        alerts = self.denied(CARD_TYPE_MIN, "FFFFFFFF", "Leser 1", "Tageskarte")
+        self.assertEqual(self.rules(alerts), [RULE_CARD_TYPE_DENIALS])
+        self.assertEqual(alerts[0].card_type, "Tageskarte")
+        self.assertEqual(self.denied(CARD_TYPE_MIN + 1, "FFFFFFFE", "Leser 1", "Dauerkarte"), [])
+
+    def test_team_hopping(self):
+        scan = self.detector.scan
+        self.assertEqual(scan(at(0), "04A1B2C3", True, CODE_OK, "Leser 1", "1. Herren"), [])
+        self.assertEqual(scan(at(30), "04A1B2C3", True, CODE_GRACE, "Leser 1", "A-Jugend"), [])
+        self.assertEqual(scan(at(3600), "04A1B2C3", True, CODE_OK, "Leser 1", "1. Herren"), [])
+        alerts = scan(at(7200), "04A1B2C3", True, CODE_OK, "Leser 2", "A-Jugend")
+        self.assertEqual(self.rules(alerts), [RULE_TEAM_HOPPING])
+        # anderer Tag: zählt für sich
+        for day, team in ((15, "A-Jugend"), (16, "1. Herren")):
+            self.assertEqual(scan(datetime(2026, 3, day, 10), "04000001", True, CODE_OK, "Leser 1", team), [])
+
+    def test_sustained_condition_alerts_again_after_window(self):
+        # alle 5 s eine neue unbekannte Karte am selben Lesegerät, 3 Minuten lang
+        alerts = []
+        for i in range(36):
+            alerts += [(alert.ts, alert.rule) for alert in self.unknown(i * 5, f"{i:08X}")]
+        first = (UNKNOWN_MIN - 1) * 5
+        self.assertEqual(alerts, [(at(first + n * UNKNOWN_WINDOW), RULE_UNKNOWN_BURST)
+                                  for n in range(3)])
+
+    def test_sustained_card_type_denials(self):
+        count = 0
+        for i in range(CARD_TYPE_MIN + 2 * CARD_TYPE_WINDOW // 10):
+            count += len(self.denied(i * 10, f"{i:08X}", "Leser 1", "Tageskarte"))
+        self.assertEqual(count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+# tests/test_gated.py
+# Lokale HTTP-API des Gates ohne Bildschirm (gated.py): GateDaemon mit
+# MockBackend und temporärer DB, ApiServer auf 127.0.0.1.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_gated
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import gated
+from db.database import Database
+from gated import ApiServer, GateDaemon
+from nfc_reader import STATE_RUNNING
+from pcsc_backend import MockBackend
+
+READER = "Mock Reader 0"
+UID = "04A1B2C3"
+TEAM = "1. Herren"
+TIMEOUT = 5.0
+
+
+class ApiTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        csv_path = os.path.join(self.dir, "cards.csv")
+        today = date.today()
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("uid;name;card_type;valid_from;valid_until;teams;notes\n")
+            f.write(f"{UID};Max Mustermann;Dauerkarte;{today - timedelta(days=30)};"
+                    f"{today + timedelta(days=30)};1.Herren;\n")
+        self.db = Database(os.path.join(self.dir, "cards.db"))
+        self.backend = MockBackend()
+        self.pulses = []
+        started = threading.Event()
+
+        def main():
+            # GateCore muss im Thread des Loops erzeugt werden
+            self.gate = GateDaemon(self.db, TEAM, csv_path=csv_path, backend=self.backend,
+                                   hooks=[self.relay])
+            self.api = ApiServer(self.gate, port=0)
+            self.scan_api = ApiServer(self.gate, port=0, allow_scan=True)
+            for api in (self.api, self.scan_api):
+                api.start()
+                self.gate.services.append(api)
+            started.set()
+            try:
+                self.gate.run()
+            except SystemExit:
+                pass                # Ende durch tearDown
+
+        self.loop = threading.Thread(target=main, daemon=True)
+        self.loop.start()
+        self.assertTrue(started.wait(TIMEOUT))
+        self.assertTrue(self.gate.core.ready.wait(TIMEOUT))
+        self.url = self.base(self.api)
+
+    def relay(self, verdict, uid_hex, reader):
+        """Hook wie GpioRelay: merkt sich erlaubte Zutritte."""
+        if verdict.allowed:
+            self.pulses.append(uid_hex)
+
+    def wait_reader_ready(self):
+        """Wartet, bis das Lesegerät bereit ist und seine Meldungen im Log stehen."""
+        deadline = time.monotonic() + TIMEOUT
+        while self.gate.readers.health()["state"] != STATE_RUNNING:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.02)
+        self.gate.call(lambda: None)
+
+    def tearDown(self):
+        def stop():
+            raise SystemExit
+        self.gate.call_soon(stop)
+        self.loop.join(TIMEOUT)
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    @staticmethod
+    def base(api):
+        return f"http://127.0.0.1:{api.httpd.server_address[1]}"
+
+    def get(self, path, url=None):
+        with urlopen((url or self.url) + path, timeout=TIMEOUT + 30) as resp:
+            return json.load(resp)
+
+    def post(self, path, data, url=None):
+        request = Request((url or self.url) + path, data=json.dumps(data).encode(), method="POST")
+        with urlopen(request, timeout=TIMEOUT) as resp:
+            return json.load(resp)
+
+    def assert_http_error(self, code, func, *args):
+        with self.assertRaises(HTTPError) as ctx:
+            func(*args)
+        self.assertEqual(ctx.exception.code, code)
+
+    def test_status(self):
+        status = self.get("/status")
+        self.assertEqual((status["team"], status["ready"], status["cards"], status["degraded"]),
+                         (TEAM, True, 1, False))
+        self.assertIn("state", status["readers"])
+
+    def test_events_long_poll(self):
+        self.wait_reader_ready()
+        seq = self.get("/status")["seq"]
+        result = {}
+        poll = threading.Thread(
+            target=lambda: result.update(self.get(f"/events?since={seq}&wait=10")))
+        poll.start()
+        self.backend.insert_card(READER, UID)
+        poll.join(TIMEOUT)
+        self.assertFalse(poll.is_alive())
+        scans = [e for e in result["events"] if e["type"] == "scan"]
+        self.assertEqual(len(scans), 1)
+        self.assertEqual((scans[0]["uid"], scans[0]["reader"], scans[0]["allowed"]),
+                         (UID, READER, True))
+        self.assertEqual(self.pulses, [UID])
+        self.assertGreater(result["seq"], seq)
+
+        later = self.get(f"/events?since={result['seq']}&wait=0.2")   # nichts Neues
+        self.assertEqual((later["seq"], later["events"]), (result["seq"], []))
+        self.assertGreaterEqual(len(self.get("/events?since=0")["events"]), len(result["events"]))
+
+    def test_bad_requests(self):
+        self.assert_http_error(400, self.get, "/events?since=x")
+        self.assert_http_error(404, self.get, "/nix")
+        self.assert_http_error(400, self.post, "/team", {})
+        self.assert_http_error(404, self.post, "/nix", {"team": TEAM})
+
+    def test_team_and_scan(self):
+        self.assertEqual(self.post("/team", {"team": "A-Jugend"}), {"team": "A-Jugend"})
+        self.assertEqual(self.get("/status")["team"], "A-Jugend")
+
+        self.assert_http_error(403, self.post, "/scan", {"uid": UID})
+        self.assertEqual(self.pulses, [])
+        scan_url = self.base(self.scan_api)
+        result = self.post("/scan", {"uid": UID.lower(), "reader": READER}, scan_url)
+        self.assertEqual((result["allowed"], result["code"]), (False, "team"))
+        self.post("/team", {"team": TEAM})
+        self.assertTrue(self.post("/scan", {"uid": UID}, scan_url)["allowed"])
+        self.assertEqual(self.pulses, [UID])
+
+    def test_busy_loop_answers_503(self):
+        release = threading.Event()
+        self.gate.call_soon(lambda: release.wait(TIMEOUT))          # Loop belegt
+        with mock.patch.object(gated, "API_CALL_TIMEOUT", 0.2):
+            self.assert_http_error(503, self.post, "/team", {"team": "A-Jugend"})
+            self.assert_http_error(503, self.post, "/scan", {"uid": UID}, self.base(self.scan_api))
+        release.set()
+        self.gate.call(lambda: None)                                 # Loop wieder frei
+        self.assertEqual(self.get("/status")["team"], TEAM)          # abgebrochene Aufrufe verworfen
+        self.assertEqual(self.pulses, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+# tests/test_journal.py
+# Notbetrieb des Scan-Logs (db/journal.py, EntryWriter): abgebrochene und
+# fehlgeschlagene Schreibvorgänge, unterbrochenes Einspielen, defektes Journal.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_journal
+
+import errno
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from db import journal as journal_module
+from db.database import Database, entry_row, unknown_row
+from db.entry_writer import EntryWriter
+from db.journal import RECORD_SIZE, JournalError, ScanJournal
+
+START = datetime(2026, 3, 14, 14, 0)
+
+
+def scans(count, first=0, reader="Leser 1"):
+    """`count` Zeilen wie entry_row(), mit fortlaufenden UIDs und Zeiten."""
+    return [
+        entry_row(f"{i:08X}", i % 2 == 0, f"Grund {i}", START + timedelta(seconds=i),
+                  reader=reader, team="1. Herren", card_type="Dauerkarte", code="ok")
+        for i in range(first, first + count)
+    ]
+
+
+class _FailingFile:
+    """Journal-Datei, deren write() nach `limit` Bytes mit ENOSPC abbricht."""
+
+    def __init__(self, f, limit):
+        self._f = f
+        self.limit = limit
+
+    def write(self, data):
+        if self.limit <= 0:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        n = self._f.write(data[:self.limit])
+        self.limit -= n
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cards.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_torn_tail_is_cut_on_open(self):
+        journal = ScanJournal(self.path)
+        journal.append(scans(3))
+        journal.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as f:
+            f.write(b"\x02" + b"\0" * 20)   # halber Datensatz (Stromausfall)
+
+        journal = ScanJournal(self.path)
+        self.assertEqual(len(journal), 3)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertFalse(os.path.exists(self.path + ".bad"))
+        journal.append(scans(2, first=3))
+        self.assertEqual([row[0] for _, _, row in journal.pending()],
+                         [f"{i:08X}" for i in range(5)])
+        journal.close()
+
+    def test_failed_append_is_rolled_back(self):
+        journal = ScanJournal(self.path)
+        journal.append(scans(2))
+        size = os.path.getsize(self.path)
+        for limit in (0, RECORD_SIZE + 7):      # nichts geschrieben / mitten im Datensatz
+            journal._file = _FailingFile(journal._file, limit)
+            with self.assertRaises(OSError):
+                # neue Texte (Lesegerät) -> Texttabelle muss mit zurück
+                journal.append(scans(3, first=2, reader="Leser 2"))
+            journal._file = journal._file._f
+            self.assertEqual(len(journal), 2)
+            self.assertEqual(os.path.getsize(self.path), size)
+
+        journal.append(scans(3, first=2, reader="Leser 2"))
+        journal.close()
+        journal = ScanJournal(self.path)
+        rows = [row for _, _, row in journal.pending()]
+        self.assertEqual(len(journal), 5)
+        self.assertEqual([row[4] for row in rows], ["Leser 1"] * 2 + ["Leser 2"] * 3)
+        journal.close()
+
+    def test_failed_truncate_reopens_journal(self):
+        journal = ScanJournal(self.path)
+        journal.append(scans(2))
+        journal._file = _FailingFile(journal._file, RECORD_SIZE + 7)
+        with mock.patch.object(_FailingFile, "truncate", side_effect=OSError(errno.EIO, "EIO"),
+                               create=True):
+            with self.assertRaises(OSError):
+                journal.append(scans(3, first=2, reader="Leser 2"))
+        journal.append(scans(1, first=2))
+        self.assertEqual(len(journal), 3)
+        self.assertEqual(len(journal.pending()), 3)
+        journal.close()
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.dir, "cards.db"))
+        self.path = os.path.join(self.dir, "cards.journal")
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def count(self, table="entries"):
+        return self.db.reader().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_interrupted_replay_has_no_duplicates(self):
+        journal = ScanJournal(self.path)
+        journal.append(scans(5), [unknown_row("DEADBEEF", START, "Leser 1")])
+        real = journal_module.log_entries
+        calls = []
+
+        def fail_second(conn, rows):
+            calls.append(len(rows))
+            if len(calls) == 2:
+                raise sqlite3.OperationalError("database is locked")
+            real(conn, rows)
+
+        with mock.patch.object(journal_module, "log_entries", fail_second):
+            with self.assertRaises(sqlite3.OperationalError):
+                journal.replay(self.db, chunk=2)
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(len(journal.pending()), 6)     # Journal bleibt bis zum Ende stehen
+
+        self.assertEqual(journal.replay(self.db, chunk=2), 4)
+        self.assertEqual(self.count(), 5)
+        self.assertEqual(self.count("unknown_scans"), 1)
+        self.assertEqual(len(journal), 0)
+        journal.close()
+
+    def test_corrupt_journal_does_not_stop_writer(self):
+        writer = EntryWriter(self.db, journal_path=self.path)
+        writer._open_journal()
+        writer.journal.append(scans(3))
+        with open(self.path, "ab") as f:
+            f.write(b"\xEE" * RECORD_SIZE * 2)      # kein gültiger Datensatz
+
+        with self.assertRaises(JournalError):
+            writer.journal.pending()
+        self.assertFalse(writer._replay())
+        self.assertTrue(os.path.exists(self.path + ".bad"))
+        self.assertEqual(len(writer.journal), 3)
+
+        self.assertTrue(writer._replay())
+        self.assertEqual(self.count(), 3)
+        writer.journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
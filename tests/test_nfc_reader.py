@@ -0,0 +1,204 @@
+# tests/test_nfc_reader.py
+# Ereignis-Modus des Lese-Threads (nfc_reader.py) mit MockBackend: Auflegen,
+# Entprellung über das Abnehmen, Hotplug, Neustart von pcscd mit wachsender
+# Wartezeit, Stoppen/Starten.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_nfc_reader
+
+import queue
+import re
+import threading
+import unittest
+from unittest import mock
+
+import nfc_reader
+from nfc_reader import (
+    STATE_NO_READER, STATE_RESTARTING, STATE_RUNNING, NFCReaderThread, ReaderSupervisor,
+)
+from pcsc_backend import MockBackend
+
+READER = "Mock Reader 0"
+UID = "04A1B2C3"
+
+# Max. Wartezeit (Sekunden) auf ein erwartetes bzw. ausbleibendes Ereignis
+TIMEOUT = 2.0
+QUIET = 0.3
+
+
+class ReaderTestCase(unittest.TestCase):
+    """Sammelt die Callbacks des Lese-Threads in Warteschlangen."""
+
+    def setUp(self):
+        self.backend = MockBackend()
+        self.uids = queue.Queue()
+        self.messages = queue.Queue()
+        self.reader_lists = queue.Queue()
+
+    def callbacks(self):
+        return dict(
+            uid_callback=lambda uid, reader, t0: self.uids.put((uid, reader)),
+            error_callback=lambda msg, reader: self.messages.put((msg, reader)),
+            readers_callback=self.reader_lists.put,
+            dispatch=lambda func: func(),       # direkt im Lese-Thread
+        )
+
+    def next_uid(self):
+        return self.uids.get(timeout=TIMEOUT)
+
+    def assert_no_uid(self):
+        with self.assertRaises(queue.Empty):
+            self.uids.get(timeout=QUIET)
+
+    def wait_for_message(self, text):
+        while True:
+            msg, reader = self.messages.get(timeout=TIMEOUT)
+            if text in msg:
+                return msg, reader
+
+    def wait_ready(self, health):
+        """Wartet, bis der Thread ein Lesegerät bereit meldet."""
+        msg, reader = self.wait_for_message("Verwendes Lesegerät")
+        self.assertEqual(reader, READER)
+        self.assertEqual(health()["state"], STATE_RUNNING)
+
+
+class ReaderThreadTest(ReaderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stop_event = threading.Event()
+        self.thread = NFCReaderThread(stop_event=self.stop_event, backend=self.backend,
+                                      **self.callbacks())
+        self.thread.start()
+        self.wait_ready(self.thread.health)
+
+    def tearDown(self):
+        self.stop_event.set()
+        self.backend.cancel()
+        self.thread.join(TIMEOUT)
+
+    def test_single_tap(self):
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.assert_no_uid()                    # Karte bleibt liegen -> kein zweiter Scan
+
+    def test_retap_between_two_polls_is_read_again(self):
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.backend.retap(READER, UID)         # abgenommen und wieder aufgelegt
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.assert_no_uid()
+
+    def test_remove_and_tap_again(self):
+        self.backend.insert_card(READER, UID)
+        self.next_uid()
+        self.backend.remove_card(READER)
+        self.assert_no_uid()
+        self.backend.insert_card(READER, "04FFEEDD")
+        self.assertEqual(self.next_uid(), ("04FFEEDD", READER))
+
+    def test_reader_unplugged(self):
+        self.backend.remove_reader(READER)
+        msg, reader = self.wait_for_message("getrennt")
+        self.assertEqual(reader, READER)
+        self.wait_for_message("Kein NFC-Lesegerät")
+        health = self.thread.health()
+        self.assertEqual(health["state"], STATE_NO_READER)
+        self.assertFalse(health["readers"][READER]["up"])
+
+        self.backend.add_reader(READER)
+        self.wait_ready(self.thread.health)
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+
+
+class ReaderRestartTest(ReaderTestCase):
+    """pcscd fällt aus und kommt wieder (kurze Wartezeiten für den Test)."""
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (("RESTART_BACKOFF_MIN", 0.05), ("RESTART_BACKOFF_MAX", 0.2)):
+            patcher = mock.patch.object(nfc_reader, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.stop_event = threading.Event()
+        self.thread = NFCReaderThread(stop_event=self.stop_event, backend=self.backend,
+                                      **self.callbacks())
+        self.thread.start()
+        self.wait_ready(self.thread.health)
+
+    def tearDown(self):
+        self.stop_event.set()
+        self.backend.cancel()
+        self.thread.join(TIMEOUT)
+
+    def retry_delays(self, count):
+        """Wartezeiten aus den nächsten `count` Meldungen "neuer Versuch in ... s"."""
+        delays = []
+        while len(delays) < count:
+            msg, reader = self.wait_for_message("neuer Versuch in")
+            self.assertIsNone(reader)
+            delays.append(float(re.search(r"neuer Versuch in ([\d.]+) s", msg).group(1)))
+        return delays
+
+    def test_backoff_grows_and_resets(self):
+        self.backend.stop_service()
+        self.assertEqual(self.retry_delays(4), [0.05, 0.1, 0.2, 0.2])
+        health = self.thread.health()
+        self.assertEqual(health["state"], STATE_RESTARTING)
+        self.assertGreaterEqual(health["restarts"], 4)
+        self.assertFalse(health["readers"][READER]["up"])
+
+        self.backend.start_service()
+        self.wait_ready(self.thread.health)
+        self.assertEqual(self.backend.opened, 2)     # Kontext neu aufgebaut
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+
+        self.backend.stop_service()                  # nach Erholung wieder von vorn
+        self.assertEqual(self.retry_delays(1), [0.05])
+
+    def test_card_left_on_reader_is_not_read_again(self):
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+
+        self.backend.stop_service()
+        self.retry_delays(2)
+        self.backend.start_service()
+        self.wait_ready(self.thread.health)
+        self.assert_no_uid()                         # Karte lag die ganze Zeit auf
+
+        self.backend.retap(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.backend.remove_card(READER)
+        self.backend.insert_card(READER, "04FFEEDD")
+        self.assertEqual(self.next_uid(), ("04FFEEDD", READER))
+        self.assert_no_uid()
+
+
+class ReaderSupervisorTest(ReaderTestCase):
+    def test_stop_and_start_reuses_context(self):
+        supervisor = ReaderSupervisor(backend=self.backend, **self.callbacks())
+        supervisor.start()
+        self.wait_ready(supervisor.health)
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.backend.remove_card(READER)
+
+        supervisor.stop()
+        self.assertFalse(supervisor.running)
+        self.backend.insert_card(READER, UID)      # Startseite: wird nicht gelesen
+        self.backend.remove_card(READER)
+        self.assert_no_uid()
+
+        supervisor.start()
+        self.wait_ready(supervisor.health)
+        self.backend.insert_card(READER, UID)
+        self.assertEqual(self.next_uid(), (UID, READER))
+        self.assertEqual(self.backend.opened, 1)    # Kontext blieb erhalten
+        supervisor.close()
+        self.assertFalse(supervisor.running)
+
+
+if __name__ == "__main__":
+    unittest.main()
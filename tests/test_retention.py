@@ -0,0 +1,44 @@
+# tests/test_retention.py
+# Aufbewahrung des Scan-Logs (db/retention.py): Stichtag der Archivierung,
+# die laufende Saison wird nie archiviert.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_retention
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from db.database import Database, get_meta
+from db.retention import RetentionWorker, retention_cutoff, run_retention
+
+
+class RetentionTest(unittest.TestCase):
+    def test_cutoff_is_start_of_oldest_kept_season(self):
+        self.assertEqual(retention_cutoff(date(2026, 3, 14), 1), date(2025, 7, 1))
+        self.assertEqual(retention_cutoff(date(2026, 7, 1), 1), date(2026, 7, 1))
+        self.assertEqual(retention_cutoff(date(2026, 3, 14), 3), date(2023, 7, 1))
+
+    def test_current_season_is_never_archived(self):
+        for keep in (0, -1):
+            with self.assertRaises(ValueError):
+                retention_cutoff(date(2026, 3, 14), keep)
+        with self.assertRaises(ValueError):
+            RetentionWorker(None, keep_seasons=0)
+
+        tmp = tempfile.mkdtemp()
+        db = Database(os.path.join(tmp, "cards.db"))
+        try:
+            with self.assertRaises(ValueError):
+                run_retention(db, date(2026, 3, 14), keep_seasons=0,
+                              archive_dir=os.path.join(tmp, "archive"))
+            self.assertIsNone(get_meta(db.reader(), "archived_until"))
+        finally:
+            db.close()
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+# tests/test_sync.py
+# Abgleich des Scan-Logs zwischen zwei Gates (sync.py) über 127.0.0.1 mit
+# je einer temporären DB: Delta-Abruf, neu aufgesetzte Gegenstelle, Token,
+# gesperrte DB mit wachsender Pause.
+#
+# Aufruf (im Projekt-Hauptordner):
+#   python -m unittest tests.test_sync
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from urllib.error import HTTPError
+
+import db.database
+from db.database import Database, log_entry, sync_cursor
+from sync import SyncServer, SyncWorker
+
+START = datetime(2026, 3, 14, 14, 0)
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dbs = []
+        self.local = Database(os.path.join(self.dir, "a.db"))
+        self.servers = []
+        self.received = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        for database in self.dbs + [self.local]:
+            database.close()
+        shutil.rmtree(self.dir)
+
+    def open_db(self, name):
+        database = Database(os.path.join(self.dir, name))
+        self.dbs.append(database)
+        return database
+
+    def serve(self, database, port=0, token=None):
+        """Startet einen SyncServer; Rückgabe: URL."""
+        server = SyncServer(database, port=port, token=token)
+        server.start()
+        self.servers.append(server)
+        return f"http://127.0.0.1:{server.httpd.server_address[1]}"
+
+    def stop_server(self, url):
+        for server in list(self.servers):
+            if url.endswith(f":{server.httpd.server_address[1]}"):
+                server.stop()
+                self.servers.remove(server)
+
+    def scan(self, database, count, first=0):
+        with database.writer() as conn:
+            for i in range(first, first + count):
+                log_entry(conn, f"{i:08X}", i % 2 == 0, "OK", START + timedelta(seconds=i),
+                          reader="Gate B", team="1. Herren", card_type="Dauerkarte", code="ok")
+
+    def worker(self, url, **kwargs):
+        return SyncWorker(self.local, [url], on_entries=self.received.extend, **kwargs)
+
+    def remote_uids(self):
+        rows = self.local.reader().execute(
+            "SELECT uid FROM entries WHERE node IS NOT NULL ORDER BY uid").fetchall()
+        return [uid for (uid,) in rows]
+
+    def wait_for(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("Bedingung nicht eingetreten")
+            time.sleep(0.02)
+
+    def test_delta_after_first_pull(self):
+        peer = self.open_db("b.db")
+        url = self.serve(peer)
+        worker = self.worker(url)
+        self.scan(peer, 3)
+        self.assertEqual(worker.pull(url), 3)
+        self.assertEqual(worker.pull(url), 0)
+        self.scan(peer, 2, first=3)
+        self.assertEqual(worker.pull(url), 2)
+        self.assertEqual(self.remote_uids(), [f"{i:08X}" for i in range(5)])
+        self.assertEqual(sync_cursor(self.local.reader(), url)[1], 5)
+        uid, ts, allowed, node, reader, team, card_type, code = self.received[-1]
+        self.assertEqual((uid, ts, allowed, reader), ("00000004", START + timedelta(seconds=4),
+                                                      True, "Gate B"))
+        self.assertEqual((team, card_type, code), ("1. Herren", "Dauerkarte", "ok"))
+
+    def test_reset_peer_is_fetched_from_start(self):
+        old = self.open_db("b.db")
+        url = self.serve(old)
+        worker = self.worker(url)
+        self.scan(old, 3)
+        self.assertEqual(worker.pull(url), 3)
+        old_node = sync_cursor(self.local.reader(), url)[0]
+
+        # Gegenstelle neu aufgesetzt: gleiche URL, neue DB, Sequenz beginnt bei 1
+        self.stop_server(url)
+        fresh = self.open_db("b2.db")
+        self.serve(fresh, port=int(url.rsplit(":", 1)[1]))
+        self.scan(fresh, 1, first=10)
+        self.assertEqual(worker.pull(url), 1)
+        node, seq = sync_cursor(self.local.reader(), url)
+        self.assertNotEqual(node, old_node)
+        self.assertEqual(seq, 1)
+        self.assertIn("0000000A", self.remote_uids())
+
+    def test_token_is_required(self):
+        peer = self.open_db("b.db")
+        url = self.serve(peer, token="geheim")
+        self.scan(peer, 1)
+        for token in (None, "falsch"):
+            with self.assertRaises(HTTPError) as ctx:
+                self.worker(url, token=token).pull(url)
+            self.assertEqual(ctx.exception.code, 403)
+        self.assertEqual(self.remote_uids(), [])
+        self.assertEqual(self.worker(url, token="geheim").pull(url), 1)
+
+    def test_locked_db_backs_off(self):
+        peer = self.open_db("b.db")
+        url = self.serve(peer)
+        self.scan(peer, 2)
+        with mock.patch.object(db.database, "BUSY_TIMEOUT_MS", 50):
+            self.local.close()
+            self.local = Database(os.path.join(self.dir, "a.db"))
+        blocker = sqlite3.connect(os.path.join(self.dir, "a.db"), isolation_level=None)
+        blocker.execute("BEGIN EXCLUSIVE")
+        worker = self.worker(url, interval=0.05, max_backoff=0.4)
+        worker.start()
+        try:
+            self.wait_for(lambda: worker.status[url].startswith("nicht übernommen (DB)"))
+            self.wait_for(lambda: worker._backoff[url] > 0.1)
+            self.assertEqual(self.received, [])
+            blocker.execute("ROLLBACK")
+            self.wait_for(lambda: worker.status[url] == "ok")
+            self.assertEqual(len(self.remote_uids()), 2)
+            self.assertEqual(worker._backoff[url], 0.05)
+        finally:
+            worker.stop()
+            worker.join(2)
+            blocker.close()
+
+    def test_unreachable_peer(self):
+        peer = self.open_db("b.db")
+        url = self.serve(peer)
+        self.stop_server(url)
+        worker = self.worker(url, interval=0.05, timeout=0.5)
+        worker.start()
+        try:
+            self.wait_for(lambda: worker.status[url].startswith("nicht erreichbar"))
+        finally:
+            worker.stop()
+            worker.join(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
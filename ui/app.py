@@ -1,164 +1,327 @@
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.screenmanager import ScreenManager, NoTransition
 
 from ui.home_view import HomeView
 from ui.gate_view import GateView
-from nfc_reader import NFCReaderThread, get_reader_status
+from ui.results import verdict_result
+from nfc_reader import ReaderSupervisor, get_reader_status
 
-from db.database import init_db, import_from_csv, lookup_card, log_entry, last_entry
+from db.database import Database, import_from_csv
+from gate_core import GateCore
+from db.retention import RetentionWorker
+from metrics import MetricsServer
+from startup import TRACE
 
 import threading
 import os
-from datetime import datetime, timedelta
+import sqlite3
+import time
 
+# Wie oft (Sekunden) auf Änderungen an cards.csv / DB geprüft wird
+CARD_RELOAD_INTERVAL = 5
 
-def _norm_team(s: str) -> str:
-    """Team-Namen vereinheitlichen: ohne Leerzeichen/Punkte, Kleinschreibung."""
-    if not s:
-        return ""
-    return s.replace(" ", "").replace(".", "").strip().lower()
+# Pause (Sekunden) vor einem neuen Versuch, wenn der Karten-Index beim Start
+# nicht geladen werden kann (DB gesperrt/defekt)
+STARTUP_RETRY_SECONDS = 5
+
+# Haltbarkeitsmodus der DB (siehe DURABILITY_MODES in db/database.py):
+# "safe" = jeder Batch sofort per fsync, "normal"/"fast" = weniger Schreiblast
+DB_DURABILITY = "normal"
+
+# Andere Gates für den Abgleich des Scan-Logs (leer = kein Abgleich),
+# z.B. ["http://gate-b.local:8701", "http://gate-c.local:8701"]
+SYNC_PEERS = []
+
+# Gemeinsames Token aller Gates für den Abgleich (Pflicht, sobald SYNC_PEERS
+# gesetzt ist: ohne Token könnte jedes Gerät im Netz das Scan-Log lesen)
+SYNC_TOKEN = None
+
+# Kartenserver, von dem dieses Gate die Kartenliste bezieht (cardsync.py),
+# z.B. "http://kasse.local:8710". None = cards.csv im Projektordner importieren.
+CARD_SERVER = None
+
+# Token des Kartenservers (wie dort mit --token gestartet; None = ohne Token,
+# nur für einen Kartenserver auf 127.0.0.1)
+CARD_SERVER_TOKEN = None
+
+# So viele Saisons (inkl. der laufenden) bleiben im Scan-Log, ältere werden
+# im Hintergrund nach db/archive/ verschoben. 0 = nie archivieren (Standard,
+# Archivieren muss bewusst eingeschaltet werden, z.B. mit 1)
+RETENTION_KEEP_SEASONS = 0
+
+# Max. Wartezeit (Sekunden) auf den Archiv-Thread beim Beenden
+RETENTION_STOP_TIMEOUT = 5.0
+
+# Nach so vielen Sekunden ohne neuen Scan zeigt eine Spur wieder
+# "Warte auf Karte..." (None = letztes Ergebnis bleibt stehen)
+RESULT_RESET_SECONDS = 8
+
+# Port des Metrik-Endpunkts (Prometheus-Format unter /metrics, None = aus)
+METRICS_PORT = 9108
+
+# Adresse des Metrik-Endpunkts ("0.0.0.0" = im Netz abrufbar, z.B. für Prometheus)
+METRICS_HOST = "127.0.0.1"
 
 
 class GateApp(App):
     def build(self):
-        """Initialisiert App, DB, Screens und NFC-Thread."""
-        self.stop_event = threading.Event()     # Steuerung für NFC-Thread
-        self.reader_thread = None               # NFC-Lesegerät läuft im Hintergrund
+        """
+        Zeigt die Startseite so schnell wie möglich: hier passiert nur, was
+        für den ersten Frame nötig ist (DB öffnen, Screens bauen). CSV-Import,
+        Karten-Index, Lesegeräte-Suche und Hintergrunddienste laufen danach in
+        einem eigenen Thread (_startup_tasks), der Fortschritt erscheint auf
+        der Startseite. "Start" ist erst danach freigegeben.
+        """
+        TRACE.mark("until_build")     # Importe + Kivy-Fenster
         self.current_team = None                # Aktuell ausgewähltes Team
+        self.sync_server = self.sync_worker = None
+        self.card_sync = None
+        self.metrics_server = None
+        self.retention = None
 
-        # Datenbank initialisieren
-        self.conn = init_db()
+        # Datenbank initialisieren (WAL, getrennte Lese-/Schreibverbindungen)
+        with TRACE.phase("db_open"):
+            self.db = Database(durability=DB_DURABILITY)
 
-        # Karten aus CSV-Datei importieren (falls vorhanden)
         base_dir = os.path.dirname(os.path.dirname(__file__))  # eine Ebene über /ui/
-        csv_path = os.path.join(base_dir, "cards.csv")
-        if os.path.exists(csv_path):
-            import_from_csv(self.conn, csv_path)
+        self.csv_path = os.path.join(base_dir, "cards.csv")
+        # Mit Kartenserver ist cards.csv nicht die Quelle (sonst überschreiben sich beide)
+        self.csv_mtime = None if CARD_SERVER else self._csv_mtime()
+
+        # Kern ohne UI: Karten-Index im Speicher (Scans brauchen keine DB-Abfrage),
+        # Zutrittsregeln (decision.py) und gebündeltes Log in eigenem Thread.
+        # Geladen wird er in _startup_tasks.
+        self.core = GateCore(self.db)
+
+        with TRACE.phase("screens"):
+            # ScreenManager ohne Transition (direkter Wechsel)
+            self.sm = ScreenManager(transition=NoTransition())
 
-        # ScreenManager ohne Transition (direkter Wechsel)
-        self.sm = ScreenManager(transition=NoTransition())
+            # Screens hinzufügen
+            self.home = HomeView(switch_to_gate=self.switch_to_gate)
+            self.gate = GateView(switch_to_home=self.switch_to_home, reset_after=RESULT_RESET_SECONDS)
+            self.sm.add_widget(self.home)
+            self.sm.add_widget(self.gate)
 
-        # Screens hinzufügen
-        self.home = HomeView(switch_to_gate=self.switch_to_gate)
-        self.gate = GateView(switch_to_home=self.switch_to_home)
-        self.sm.add_widget(self.home)
-        self.sm.add_widget(self.gate)
+        # Überwachung der Lesegeräte: läuft nur auf der Gate-Seite, startet nach
+        # Ausfällen (pcscd, USB-Reset) selbst neu und behält den PC/SC-Kontext
+        self.readers = ReaderSupervisor(
+            uid_callback=self.on_uid,       # Callback bei neuer Karte
+            error_callback=self.on_error,   # Callback bei Fehler
+            readers_callback=self.gate.set_readers,  # Spuren pro Lesegerät
+        )
 
-        # Lesegerätstatus beim Start prüfen und auf Home anzeigen
-        self.last_status = get_reader_status()
+        self.degraded = False
+        self.last_status = "Starte..."
         self.home.update_status(self.last_status)
+        self.home.set_busy(True)
+        Clock.schedule_once(lambda *_: TRACE.mark("first_frame"), 0)
+        threading.Thread(target=self._startup_tasks, daemon=True, name="Startup").start()
 
         return self.sm
 
+    def _startup_tasks(self):
+        """
+        Läuft im Hintergrund: alles, was die Startseite nicht braucht.
+        Fehler werden auf der Startseite gemeldet:
+        - CSV-Import: weiter mit dem bisherigen Kartenbestand der DB, neuer
+          Versuch beim nächsten Abgleich (check_card_updates)
+        - Karten-Index: neuer Versuch alle STARTUP_RETRY_SECONDS Sekunden
+          (ohne Index kann kein Scan entschieden werden)
+        - Hintergrunddienste: Start trotzdem freigeben, Meldung bleibt stehen
+        """
+        report = None
+        problems = []
+        if self.csv_mtime is not None:
+            self._post_status("Importiere Karten...")
+            with TRACE.phase("csv_import"):
+                try:
+                    report = self.import_cards()
+                except (sqlite3.Error, OSError, ValueError) as e:
+                    print(f"cards.csv nicht importiert: {e}")
+                    problems.append(f"cards.csv nicht importiert, bisheriger Kartenbestand: {e}")
+                    self.csv_mtime = None   # beim nächsten Abgleich erneut versuchen
+
+        self._post_status("Lade Karten...")
+        self.core.monitor.on_alert = self._on_alert
+        while True:
+            try:
+                with TRACE.phase("card_index"):
+                    self.core.start(conn=self.db.reader())
+                break
+            except (sqlite3.Error, OSError) as e:
+                print(f"Karten-Index nicht geladen: {e}")
+                self._post_status(f"Karten nicht geladen: {e}\n"
+                                  f"Neuer Versuch in {STARTUP_RETRY_SECONDS} s...")
+                time.sleep(STARTUP_RETRY_SECONDS)
+
+        self._post_status("Suche Lesegerät...")
+        with TRACE.phase("reader_status"):
+            status = get_reader_status()
+        if report and report.errors:
+            status += f"\n{report}"
+
+        with TRACE.phase("services"):
+            try:
+                self._start_services()
+            except (sqlite3.Error, OSError, ValueError) as e:
+                print(f"Hintergrunddienste nicht gestartet: {e}")
+                problems.append(f"Hintergrunddienste nicht vollständig gestartet: {e}")
+        if problems:
+            status += "\n" + "\n".join(problems)
+        Clock.schedule_once(lambda *_: self._on_ready(status))
+
+    def _start_services(self):
+        """Kartenliste, Abgleich, Metrik-Endpunkt und Archivierung starten (je nach Einstellung)."""
+        # Kartenliste vom Kartenserver; nicht erreichbar -> letzter Stand in cards.db
+        if CARD_SERVER:
+            from cardsync import CardSyncWorker
+            self.card_sync = CardSyncWorker(
+                self.db, CARD_SERVER,
+                on_change=lambda: Clock.schedule_once(lambda *_: self.core.refresh()),
+                token=CARD_SERVER_TOKEN,
+            )
+            self.card_sync.start()
+
+        # Abgleich mit anderen Gates (Stunden-Sperre über alle Eingänge)
+        if SYNC_PEERS and not SYNC_TOKEN:
+            print("Abgleich zwischen Gates aus: SYNC_TOKEN fehlt")
+        elif SYNC_PEERS:
+            from sync import SYNC_PORT, SyncServer, SyncWorker
+            self.sync_server = SyncServer(self.db, port=SYNC_PORT, host="0.0.0.0", token=SYNC_TOKEN)
+            self.sync_server.start()
+            self.sync_worker = SyncWorker(self.db, SYNC_PEERS, on_entries=self.core.note_remote_entries,
+                                          token=SYNC_TOKEN)
+            self.sync_worker.start()
+
+        # Messwerte für Prometheus / curl (Latenzen, Scans, Lesefehler)
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(port=METRICS_PORT, host=METRICS_HOST)
+                self.metrics_server.start()
+            except OSError as e:
+                print(f"Metrik-Endpunkt nicht verfügbar: {e}")
+
+        # Alte Saisons archivieren und Platz freigeben (kleine Blöcke, Scans laufen weiter)
+        if RETENTION_KEEP_SEASONS:
+            self.retention = RetentionWorker(self.db, keep_seasons=RETENTION_KEEP_SEASONS)
+            self.retention.start()
+
+    def _on_alert(self, alert):
+        """Auffälligkeit der Missbrauchserkennung (Monitor-Thread) auf der Startseite melden."""
+        msg = f"Auffällig ({alert.rule}): {alert.uid or alert.card_type} – {alert.detail}"
+
+        def show(*_):
+            self.last_status = msg
+            self.home.update_status(msg)
+
+        Clock.schedule_once(show)
+
+    def _post_status(self, msg):
+        """Statusmeldung aus einem Hintergrund-Thread auf der Startseite anzeigen."""
+        Clock.schedule_once(lambda *_: self.home.update_status(msg))
+
+    def _on_ready(self, status):
+        """Start abgeschlossen (im Kivy-Loop): Start freigeben, Karten-Abgleich einplanen."""
+        TRACE.mark("ready")
+        print(TRACE.report())
+        self.last_status = status
+        self.home.update_status(status)
+        self.home.set_busy(False)
+        Clock.schedule_interval(self.check_card_updates, CARD_RELOAD_INTERVAL)
+
+    def _csv_mtime(self):
+        """Änderungszeit von cards.csv oder None, wenn die Datei fehlt."""
+        try:
+            return os.path.getmtime(self.csv_path)
+        except OSError:
+            return None
+
+    def import_cards(self):
+        """
+        Importiert cards.csv (nur Änderungen, unveränderte Datei wird übersprungen)
+        und gibt fehlerhafte Zeilen auf der Konsole aus. Rückgabe: ImportReport
+        """
+        with self.db.writer() as conn:
+            report = import_from_csv(conn, self.csv_path)
+        for line, uid, msg in report.errors:
+            print(f"cards.csv Zeile {line} ({uid}): {msg}")
+        return report
+
+    def check_card_updates(self, *_):
+        """
+        Wird regelmäßig von der Kivy-Clock aufgerufen:
+        - cards.csv geändert -> neu importieren und Index abgleichen
+        - DB von außen geändert -> Index abgleichen
+        - Notbetrieb (DB nicht beschreibbar) beginnt/endet -> Status auf Home
+        """
+        mtime = None if CARD_SERVER else self._csv_mtime()
+        if mtime is not None and mtime != self.csv_mtime:
+            try:
+                self.import_cards()
+                self.csv_mtime = mtime
+            except sqlite3.Error as e:
+                print(f"cards.csv nicht importiert, DB nicht beschreibbar: {e}")
+        self.core.refresh()
+        if self.core.degraded != self.degraded:
+            self.degraded = self.core.degraded
+            self.on_error("Notbetrieb: DB nicht beschreibbar, Scans werden zwischengespeichert"
+                          if self.degraded else "DB wieder beschreibbar, Scans nachgetragen")
+
     def switch_to_gate(self, team):
-        """Wechselt von Home zu Gate und startet ggf. den NFC-Lesegerät-Thread."""
+        """Wechselt von Home zu Gate und startet die Überwachung der Lesegeräte."""
+        if not self.core.ready.is_set():
+            return  # Karten-Index noch nicht geladen
         self.current_team = team
+        self.core.team = team
         self.sm.current = "gate"
-
-        if not self.reader_thread:
-            self.stop_event.clear()
-            self.reader_thread = NFCReaderThread(
-                uid_callback=self.on_uid,       # Callback bei neuer Karte
-                error_callback=self.on_error,   # Callback bei Fehler
-                stop_event=self.stop_event
-            )
-            self.reader_thread.start()
+        self.readers.start()
 
     def switch_to_home(self):
-        """Wechselt von Gate zurück zu Home und zeigt aktuellen Status an."""
+        """
+        Wechselt von Gate zurück zu Home und stoppt die Lesegeräte (auf der
+        Startseite wird nicht gescannt), zeigt aktuellen Status an.
+        """
+        self.readers.stop()
         self.sm.current = "home"
         self.home.update_status(self.last_status)
 
-    def on_uid(self, uid_hex):
+    def on_uid(self, uid_hex, reader=None, t0=None):
         """
-        Callback wenn eine Karte gelesen wurde.
-        Prüft Berechtigungen, Zeitfenster (gültig, schon verwendet),
+        Callback wenn eine Karte gelesen wurde (reader = Name des Lesegeräts,
+        t0 = Zeitpunkt des Lesens im Reader-Thread, siehe nfc_reader.py).
+        Entscheidung über die DecisionEngine (gültig, Team, schon verwendet),
         zeigt Ergebnis in der UI und loggt den Versuch in DB.
         """
-        card = lookup_card(self.conn, uid_hex)
-
-        # --- Unbekannte Karte ---
-        if card is None:
-            msg = (
-                "Zutritt verweigert\n"
-                f"Unbekannte Karte ({uid_hex})\nGrund: Karte nicht registriert"
-            )
-            self.gate.show_result(msg, color="red")
-            log_entry(self.conn, uid_hex, False, "Karte nicht registriert")
-            return
+        if t0 is None:
+            t0 = time.perf_counter()
+        verdict = self.core.process(uid_hex, reader=reader)
+        self.gate.show_result(verdict_result(verdict, uid_hex, t0), reader=reader)
 
-        reasons = []
-
-        # --- Datumsprüfung ---
-        now = datetime.now().date()
-        if card["valid_from"]:
-            try:
-                vf = datetime.fromisoformat(card["valid_from"]).date()
-                if now < vf:
-                    reasons.append(f"Karte noch nicht gültig (ab {card['valid_from']})")
-            except Exception:
-                reasons.append("Ungültiges Startdatum")
-
-        if card["valid_until"]:
-            try:
-                vu = datetime.fromisoformat(card["valid_until"]).date()
-                if now > vu:
-                    reasons.append(f"Karte abgelaufen (gültig bis {card['valid_until']})")
-            except Exception:
-                reasons.append("Ungültiges Enddatum")
-
-        # --- Teamprüfung ---
-        current_team_norm = _norm_team(self.current_team)
-        teams_norm = [_norm_team(t) for t in card["teams"]]
-        if "*" not in teams_norm and current_team_norm not in teams_norm:
-            reasons.append(f"Keine Berechtigung für {self.current_team}")
-
-        # Zusatzinfos aus DB
-        card_type = card.get("card_type") or "-"
-        notes = f"\nHinweis: {card['notes']}" if card["notes"] else ""
-
-        # --- Wenn Gründe gefunden -> Zutritt verweigert ---
-        if reasons:
-            details = f"{card['name']} ({card_type})\n" + "\n".join(reasons) + notes
-            self.gate.show_result("Zutritt verweigert\n" + details, color="red")
-            log_entry(self.conn, uid_hex, False, "; ".join(reasons))
-            return
-
-        # --- Karte ist gültig: Doppel-Scan-Prüfung ---
-        last = last_entry(self.conn, uid_hex)
-        if last and last["timestamp"]:
-            delta = datetime.now() - last["timestamp"]
-            if delta < timedelta(minutes=1) and last["allowed"]:
-                # Innerhalb 1 Minute -> Schutzfrist -> erneut erlauben
-                until = card["valid_until"] or "unbegrenzt"
-                details = f"{card['name']} ({card_type})\nGültig bis: {until}" + notes
-                self.gate.show_result("Zutritt erlaubt\n" + details, color="green")
-                log_entry(self.conn, uid_hex, True, "Schutzfrist erneuter Scan")
-                return
-            elif delta < timedelta(hours=1) and last["allowed"]:
-                # Innerhalb 1 Stunde -> verweigern
-                minutes = delta.seconds // 60
-                details = (
-                    f"{card['name']} ({card_type})\n"
-                    f"Karte wurde schon vor {minutes} Minuten verwendet" + notes
-                )
-                self.gate.show_result("Zutritt verweigert\n" + details, color="red")
-                log_entry(self.conn, uid_hex, False, f"Schon vor {minutes} Minuten verwendet")
-                return
-
-        # --- Standardfall: Zutritt erlaubt ---
-        until = card["valid_until"] or "unbegrenzt"
-        details = f"{card['name']} ({card_type})\nGültig bis: {until}" + notes
-        self.gate.show_result("Zutritt erlaubt\n" + details, color="green")
-        log_entry(self.conn, uid_hex, True, "OK")
-
-    def on_error(self, msg):
-        """Callback bei NFC-Lesegerät-Fehlern: zeigt Status auf Home an."""
+    def on_error(self, msg, reader=None):
+        """
+        Callback bei NFC-Lesegerät-Fehlern/-Meldungen: zeigt Status auf Home an
+        und (bei einem bestimmten Lesegerät) zusätzlich in dessen Spur.
+        """
         self.last_status = msg
         self.home.update_status(msg)
+        if reader is not None:
+            self.gate.show_message(msg, reader=reader)
 
     def on_stop(self):
-        """Wird beim Beenden aufgerufen: NFC-Thread stoppen, DB schließen."""
-        self.stop_event.set()
-        self.conn.close()
+        """Wird beim Beenden aufgerufen: NFC-Thread stoppen, Log leeren, DB schließen."""
+        self.readers.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.retention:
+            self.retention.stop()
+            self.retention.join(RETENTION_STOP_TIMEOUT)
+        if self.sync_worker:
+            self.sync_worker.stop()
+            self.sync_server.stop()
+        if self.card_sync:
+            self.card_sync.stop()
+        self.core.close()
+        self.db.close()
         return super().on_stop()
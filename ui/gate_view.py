@@ -1,26 +1,93 @@
+import time
+
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Rectangle
+from kivy.metrics import sp
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.screenmanager import Screen
+from kivy.uix.widget import Widget
 
+from metrics import STAGE_SECONDS
+from ui.results import STATUS_TEXTS, waiting_result
 
-class GateView(Screen):
-    def __init__(self, switch_to_home, **kwargs):
+# Schriftgröße der Statuszeile (sp)
+STATUS_FONT_SIZE = 36
+
+# Farben der Statuszeile
+COLORS = {"green": (0, 1, 0, 1), "red": (1, 0, 0, 1), "white": (1, 1, 1, 1)}
+
+# Vorgerenderte Statuszeilen: (text, farbe, pixelgröße) -> Texture.
+# Text-Layout mit Umlauten in 36sp kostet auf dem Pi mehrere Millisekunden,
+# die festen Statuszeilen werden daher nur einmal gerendert.
+_status_textures = {}
+
+
+def status_texture(text, color, font_size=STATUS_FONT_SIZE):
+    """Texture einer Statuszeile (aus dem Cache, beim ersten Mal gerendert)."""
+    key = (text, color, sp(font_size))
+    texture = _status_textures.get(key)
+    if texture is None:
+        label = CoreLabel(text=text, font_size=key[2], color=COLORS[color])
+        label.refresh()
+        texture = _status_textures[key] = label.texture
+    return texture
+
+
+class StatusLine(Widget):
+    """Zeigt eine vorgerenderte Statuszeile zentriert an (kein Text-Layout pro Scan)."""
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.name = "gate"
-        self.switch_to_home = switch_to_home
+        self.texture = None
+        with self.canvas:
+            self._rect = Rectangle(size=(0, 0))
+        self.bind(pos=self._place, size=self._place)
 
-        layout = BoxLayout(orientation="vertical", padding=20, spacing=20)
+    def set(self, text, color):
+        texture = status_texture(text, color)
+        if texture is not self.texture:
+            self.texture = texture
+            self._rect.texture = texture
+            self._place()
+
+    def _place(self, *_):
+        if self.texture is not None:
+            w, h = self.texture.size
+            # Breiter als die Spur (lange Texte, schmale Spuren) -> verkleinern
+            scale = min(1, self.width / w) if w else 1
+            w, h = w * scale, h * scale
+            self._rect.size = (w, h)
+            self._rect.pos = (self.center_x - w / 2, self.center_y - h / 2)
 
-        # Status-Label (groß, farbig)
-        self.status_lbl = Label(
-            text="Warte auf Karte...",
-            font_size="36sp",
+
+class ResultLane(BoxLayout):
+    """
+    Ergebnisanzeige für ein Lesegerät (eine "Spur" pro Drehkreuz):
+    Name/Zustand des Lesegeräts, Status (groß, farbig) und Details.
+    Nach `reset_after` Sekunden ohne neuen Scan zurück auf "Warte auf Karte...".
+    """
+
+    def __init__(self, title="", reset_after=None, **kwargs):
+        super().__init__(orientation="vertical", spacing=10, **kwargs)
+        self.title = title
+        self.reset_after = reset_after
+        self._reset_event = Clock.create_trigger(self.reset, reset_after or 0)
+
+        # Lesegerät-Name bzw. letzte Meldung des Lesegeräts
+        self.title_lbl = Label(
+            text=title,
+            font_size="16sp",
             halign="center",
             valign="middle",
-            size_hint=(1, 0.3),
+            size_hint=(1, 0.1),
         )
-        self.status_lbl.bind(size=self._update_text_width)
+        self.title_lbl.bind(size=self._update_text_width)
+
+        # Statuszeile (groß, farbig, vorgerendert)
+        self.status_line = StatusLine(size_hint=(1, 0.3))
 
         # Detail-Label (Name, Typ, Gründe, Notizen)
         self.detail_lbl = Label(
@@ -28,39 +95,143 @@ class GateView(Screen):
             font_size="22sp",
             halign="center",
             valign="top",
-            size_hint=(1, 0.5),
+            size_hint=(1, 0.6),
         )
         self.detail_lbl.bind(size=self._update_text_width)
 
+        self.add_widget(self.title_lbl)
+        self.add_widget(self.status_line)
+        self.add_widget(self.detail_lbl)
+        self.show_result(waiting_result())
+
+    def _update_text_width(self, instance, size):
+        """Sorgt für automatischen Zeilenumbruch."""
+        instance.text_size = (instance.width - 20, None)
+
+    def show_message(self, msg):
+        """Zeigt eine Meldung des Lesegeräts (z.B. Lesefehler) in der Titelzeile."""
+        self.title_lbl.text = f"{self.title}: {msg}" if self.title else msg
+
+    def show_result(self, result):
+        """Zeigt ein GateResult (siehe ui/results.py)."""
+        self.status_line.set(result.status, result.color)
+        details = "\n".join(result.details)
+        if details != self.detail_lbl.text:   # gleicher Text -> kein neues Layout
+            self.detail_lbl.text = details
+        self._reset_event.cancel()
+        if self.reset_after and result.t0 is not None:
+            self._reset_event()
+
+    def reset(self, *_):
+        """Zurück in den Ruhezustand."""
+        self.show_result(waiting_result())
+
+
+class GateView(Screen):
+    """
+    Scan-Bildschirm mit einer Ergebnis-Spur pro Lesegerät.
+    Ergebnisse werden gesammelt und einmal pro Frame gezeichnet: kommen
+    mehrere Scans einer Spur zwischen zwei Frames, wird nur der letzte
+    angezeigt. Die Zeit vom Lesen der UID bis zum ersten Frame mit dem
+    Ergebnis (Tap bis Pixel) geht in die Metrik gate_stage_seconds{stage="render"}.
+    """
+
+    def __init__(self, switch_to_home, reset_after=None, **kwargs):
+        """
+        Parameter:
+        - switch_to_home: Callback für den Zurück-Button
+        - reset_after:    Sekunden bis zur Rückkehr auf "Warte auf Karte..."
+                          (None = Ergebnis bleibt stehen)
+        """
+        super().__init__(**kwargs)
+        self.name = "gate"
+        self.switch_to_home = switch_to_home
+        self.reset_after = reset_after
+        self._pending = {}      # Lesegerät -> letztes noch nicht gezeichnetes GateResult
+        self._flush_trigger = Clock.create_trigger(self._flush, -1)
+
+        # Statuszeilen vorab rendern, damit schon der erste Scan den Cache trifft
+        for text in STATUS_TEXTS:
+            for color in COLORS:
+                status_texture(text, color)
+
+        layout = BoxLayout(orientation="vertical", padding=20, spacing=20)
+
+        # Nebeneinander eine Ergebnis-Spur pro Lesegerät
+        self.lanes_box = BoxLayout(orientation="horizontal", spacing=20, size_hint=(1, 0.8))
+        self.lanes = {}     # Lesegerät -> ResultLane (None = noch kein Lesegerät bekannt)
+        self._add_lane(None)
+
         # Zurück-Button
         self.back_btn = Button(text="Zurück", font_size="24sp", size_hint=(1, 0.2))
         self.back_btn.bind(on_release=lambda *_: self.switch_to_home())
 
-        layout.add_widget(self.status_lbl)
-        layout.add_widget(self.detail_lbl)
+        layout.add_widget(self.lanes_box)
         layout.add_widget(self.back_btn)
 
         self.add_widget(layout)
 
-    def _update_text_width(self, instance, size):
-        """Sorgt für automatischen Zeilenumbruch."""
-        instance.text_size = (instance.width - 20, None)
+    def _add_lane(self, reader):
+        lane = ResultLane(title=reader or "", reset_after=self.reset_after)
+        self.lanes[reader] = lane
+        self.lanes_box.add_widget(lane)
+        return lane
+
+    def _remove_lane(self, reader):
+        lane = self.lanes.pop(reader, None)
+        if lane is not None:
+            self.lanes_box.remove_widget(lane)
+
+    def set_readers(self, readers):
+        """
+        Passt die Spuren an die angeschlossenen Lesegeräte an (Hotplug).
+        Ohne Lesegerät bleibt eine einzelne, unbenannte Spur stehen.
+        """
+        for reader in list(self.lanes):
+            if reader is not None and reader not in readers:
+                self._remove_lane(reader)
+        for reader in readers:
+            if reader not in self.lanes:
+                self._add_lane(reader)
+        if readers:
+            self._remove_lane(None)
+        elif not self.lanes:
+            self._add_lane(None)
+
+    def _lane(self, reader):
+        """Spur für ein Lesegerät (wird bei Bedarf angelegt)."""
+        lane = self.lanes.get(reader)
+        if lane is None:
+            if reader is None:
+                # Meldung ohne Lesegerät -> erste vorhandene Spur
+                return next(iter(self.lanes.values()), None) or self._add_lane(None)
+            self.set_readers([r for r in self.lanes if r is not None] + [reader])
+            lane = self.lanes[reader]
+        return lane
 
-    def show_result(self, msg, color="white"):
+    def show_message(self, msg, reader=None):
+        """Zeigt eine Meldung eines Lesegeräts in dessen Spur."""
+        self._lane(reader).show_message(msg)
+
+    def show_result(self, result, reader=None):
         """
-        Erwartetes Format: erste Zeile = Status (Zutritt erlaubt/verweigert),
-        Rest = Details.
+        Zeigt ein GateResult (siehe ui/results.py) in der Spur des Lesegeräts.
+        Gezeichnet wird gesammelt vor dem nächsten Frame.
         """
-        lines = msg.split("\n", 1)
-        status = lines[0]
-        details = lines[1] if len(lines) > 1 else ""
-
-        if color == "red":
-            self.status_lbl.color = (1, 0, 0, 1)
-        elif color == "green":
-            self.status_lbl.color = (0, 1, 0, 1)
-        else:
-            self.status_lbl.color = (1, 1, 1, 1)
-
-        self.status_lbl.text = status
-        self.detail_lbl.text = details
+        self._pending[reader] = result
+        self._flush_trigger()
+
+    def _flush(self, *_):
+        pending, self._pending = self._pending, {}
+        started = [result.t0 for result in pending.values() if result.t0 is not None]
+        for reader, result in pending.items():
+            self._lane(reader).show_result(result)
+        if started:
+            # läuft im nächsten Frame, also nachdem dieser gezeichnet wurde
+            Clock.schedule_once(lambda *_: self._record_render(started), 0)
+
+    def _record_render(self, started):
+        now = time.perf_counter()
+        render = STAGE_SECONDS.labels("render")
+        for t0 in started:
+            render.observe(now - t0)
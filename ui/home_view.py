@@ -72,6 +72,10 @@ class HomeView(Screen):
         team = TEAMS[self.team_idx]
         self.switch_to_gate(team)
 
+    def set_busy(self, busy):
+        """Sperrt den Start-Button, solange die App im Hintergrund noch startet."""
+        self.start_btn.disabled = busy
+
     def update_status(self, msg):
         """Aktualisiert den Text des Lesegerätstatus (z.B. 'Lesegerät erkannt')."""
         self.status_lbl.text = msg
@@ -0,0 +1,47 @@
+# ui/results.py
+# Anzeige-Daten eines Scans ohne Kivy: GateApp baut aus dem Verdict ein
+# GateResult, GateView zeigt es an. Die Statuszeile ist einer von wenigen
+# festen Texten, damit die Anzeige sie vorgerendert aus einem Cache holen
+# kann (siehe ui/gate_view.py).
+
+import time
+from collections import namedtuple
+
+# Feste Statuszeilen
+STATUS_ALLOWED = "Zutritt erlaubt"
+STATUS_DENIED = "Zutritt verweigert"
+STATUS_WAITING = "Warte auf Karte..."
+STATUS_TEXTS = (STATUS_ALLOWED, STATUS_DENIED, STATUS_WAITING)
+
+# Ergebnis für die Anzeige:
+# - status:   einer der STATUS_TEXTS
+# - color:    "green", "red" oder "white"
+# - details:  Zeilen unter dem Status (Name, Typ, Gründe, Notizen)
+# - t0:       time.perf_counter() beim Eingang des Scans (für Tap-bis-Pixel-Messung)
+GateResult = namedtuple("GateResult", "status color details t0")
+
+
+def verdict_result(verdict, uid_hex, t0=None):
+    """Baut das GateResult für ein Verdict (siehe decision.py)."""
+    t0 = t0 if t0 is not None else time.perf_counter()
+    card = verdict.card
+    if card is None:
+        return GateResult(
+            STATUS_DENIED, "red",
+            (f"Unbekannte Karte ({uid_hex})", "Grund: Karte nicht registriert"), t0,
+        )
+    card_type = card.card_type or "-"
+    notes = (f"Hinweis: {card.notes}",) if card.notes else ()
+    if verdict.allowed:
+        until = card.valid_until or "unbegrenzt"
+        return GateResult(
+            STATUS_ALLOWED, "green", (f"{card.name} ({card_type})", f"Gültig bis: {until}") + notes, t0,
+        )
+    return GateResult(
+        STATUS_DENIED, "red", (f"{card.name} ({card_type})", *verdict.reasons) + notes, t0,
+    )
+
+
+def waiting_result():
+    """Ruhezustand einer Spur."""
+    return GateResult(STATUS_WAITING, "white", (), None)